@@ -0,0 +1,103 @@
+"""Micro-benchmark of the session codecs against the original JSON encoding.
+
+Usage (from backend/):
+    python bench_session_codec.py
+    python bench_session_codec.py --history 200 --iterations 2000 --threshold 512
+
+Builds a session shaped like the ones /predict, /explain and /chat write
+(scalar fields including `top_k` and `probs`, plus a chat history). Each value
+is encoded separately, the same way `RedisSessionStore` stores it as a hash
+field or list entry. For every available codec the script reports the bytes
+stored and the encode/decode time per session. Codecs whose libraries are not
+installed are skipped.
+"""
+import argparse
+import json
+import time
+
+from utils import session_codec
+from utils.session_codec import JsonCodec, MsgpackCodec
+
+LABELS = ['glioma_tumor', 'meningioma_tumor', 'no_tumor', 'pituitary_tumor']
+
+
+def build_session(history_len):
+    probs = {'glioma_tumor': 0.91234567, 'meningioma_tumor': 0.05123456,
+             'no_tumor': 0.02345678, 'pituitary_tumor': 0.01296299}
+    fields = {
+        'created_at': time.time(),
+        'last_prediction': 'glioma_tumor',
+        'last_confidence': 0.91234567,
+        'top_k': sorted(([k, v] for k, v in probs.items()), key=lambda kv: kv[1], reverse=True),
+        'probs': probs,
+        'last_explanation': ('Gliomas arise from glial cells. The highlighted region shows an irregular, '
+                             'infiltrative mass with surrounding edema. ') * 6,
+    }
+    history = []
+    for i in range(history_len):
+        if i % 2:
+            history.append({'role': 'assistant', 'message': (
+                f'The scan was classified as {LABELS[i % 4]} with moderate confidence. '
+                'Please discuss these results with your physician, who can review the full imaging study.'),
+                'ts': time.time()})
+        else:
+            history.append({'role': 'user', 'message': f'What does {LABELS[i % 4]} mean for treatment?',
+                            'ts': time.time()})
+    return fields, history
+
+
+def legacy_blob(fields, history):
+    """The pre-hash session format: one JSON document with the history embedded."""
+    return json.dumps({**fields, 'history': history})
+
+
+def bench(codec, fields, history, iterations):
+    values = list(fields.values()) + history
+    encoded = [codec.encode(v) for v in values]
+    stored = sum(len(e) for e in encoded) + sum(len(k) for k in fields)
+
+    t0 = time.perf_counter()
+    for _ in range(iterations):
+        for v in values:
+            codec.encode(v)
+    encode_us = (time.perf_counter() - t0) * 1e6 / iterations
+
+    t0 = time.perf_counter()
+    for _ in range(iterations):
+        for e in encoded:
+            codec.decode(e)
+    decode_us = (time.perf_counter() - t0) * 1e6 / iterations
+    return stored, encode_us, decode_us
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--history', type=int, default=50, help='chat history entries per session')
+    parser.add_argument('--iterations', type=int, default=1000)
+    parser.add_argument('--threshold', type=int, default=1024, help='compression threshold in bytes')
+    args = parser.parse_args()
+
+    fields, history = build_session(args.history)
+    blob = legacy_blob(fields, history)
+    print(f"Session: {len(fields)} fields, {len(history)} history entries; "
+          f"legacy JSON blob {len(blob)} bytes")
+
+    codecs = [JsonCodec()]
+    for compression in (None, 'zstd', 'lz4'):
+        try:
+            codecs.append(MsgpackCodec(compression, threshold=args.threshold))
+        except RuntimeError as e:
+            print(f"skipping msgpack{'+' + compression if compression else ''}: {e}")
+
+    print(f"{'codec':<14}{'bytes':>10}{'vs json':>9}{'encode us':>12}{'decode us':>12}")
+    baseline = None
+    for codec in codecs:
+        stored, enc, dec = bench(codec, fields, history, args.iterations)
+        baseline = baseline or stored
+        print(f"{codec.name:<14}{stored:>10}{stored / baseline:>8.0%} {enc:>11.1f} {dec:>11.1f}")
+    if session_codec.msgpack is None:
+        print("Install msgpack (and optionally zstandard or lz4) to compare the binary codecs.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""Export the Keras classifier to a quantized TFLite model and compare accuracy.
+
+Usage (from backend/):
+    python export_tflite.py --quantization int8
+    python export_tflite.py --quantization dynamic --max-accuracy-drop 0.01
+
+INT8 quantization is calibrated on images from `brain tumor/Training`. Both the
+Keras model and the exported model are then scored on `brain tumor/Testing`,
+and the comparison is written next to the artifact as `<name>.eval.json`. If the
+accuracy drop exceeds --max-accuracy-drop, the script exits with status 1 so the
+artifact can be rejected. Serve the artifact with INFERENCE_BACKEND=tflite.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import tensorflow as tf
+from PIL import Image
+
+from utils.tflite_backend import TFLiteModel
+
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def list_images(data_dir):
+    """Return [(path, class_index)] with classes indexed by sorted sub-directory name (like flow_from_directory)."""
+    classes = sorted(d for d in os.listdir(data_dir) if os.path.isdir(os.path.join(data_dir, d)))
+    samples = []
+    for idx, cls in enumerate(classes):
+        cls_dir = os.path.join(data_dir, cls)
+        for fname in sorted(os.listdir(cls_dir)):
+            if fname.lower().endswith(IMAGE_EXTS):
+                samples.append((os.path.join(cls_dir, fname), idx))
+    return samples, classes
+
+
+def load_image(path, input_shape):
+    """Preprocess like /predict: RGB, resize to the model input, scale to [0, 1]."""
+    with Image.open(path) as img:
+        img = img.convert('RGB').resize((input_shape[1], input_shape[0]))
+        return np.asarray(img, dtype='float32') / 255.0
+
+
+def convert(model, quantization, calib_samples, input_shape):
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantization == 'int8':
+        def representative_dataset():
+            for path, _ in calib_samples:
+                yield [load_image(path, input_shape)[None]]
+
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    return converter.convert()
+
+
+def evaluate(predict_fn, samples, input_shape, batch_size):
+    """Return (accuracy, predicted class indices, mean ms per batch)."""
+    preds = []
+    elapsed = 0.0
+    for start in range(0, len(samples), batch_size):
+        chunk = samples[start:start + batch_size]
+        batch = np.stack([load_image(p, input_shape) for p, _ in chunk])
+        t0 = time.perf_counter()
+        out = predict_fn(batch)
+        elapsed += time.perf_counter() - t0
+        preds.extend(np.argmax(out, axis=-1).tolist())
+    labels = [y for _, y in samples]
+    accuracy = float(np.mean(np.asarray(preds) == np.asarray(labels))) if samples else 0.0
+    batches = max(1, (len(samples) + batch_size - 1) // batch_size)
+    return accuracy, preds, elapsed * 1000.0 / batches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default='models/models/model_selected.h5')
+    parser.add_argument('--output', default=None, help='defaults to the model path with a .tflite suffix')
+    parser.add_argument('--quantization', choices=['dynamic', 'int8'], default='dynamic')
+    parser.add_argument('--train-dir', default='brain tumor/Training')
+    parser.add_argument('--test-dir', default='brain tumor/Testing')
+    parser.add_argument('--calibration-samples', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--max-accuracy-drop', type=float, default=None)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.model):
+        print(f"Model not found: {args.model}")
+        sys.exit(1)
+    model = tf.keras.models.load_model(args.model)
+    input_shape = tuple(int(d) for d in model.inputs[0].shape[1:3])
+    print(f"Loaded {args.model} (input {input_shape})")
+
+    calib = []
+    if args.quantization == 'int8':
+        if not os.path.isdir(args.train_dir):
+            print(f"Calibration directory not found: {args.train_dir}")
+            sys.exit(1)
+        train_samples, _ = list_images(args.train_dir)
+        # fixed-seed random subset so repeated exports calibrate identically
+        rng = np.random.default_rng(0)
+        order = rng.permutation(len(train_samples))[:args.calibration_samples]
+        calib = [train_samples[i] for i in order]
+        print(f"Calibrating INT8 quantization on {len(calib)} training images")
+
+    tflite_bytes = convert(model, args.quantization, calib, input_shape)
+    output = args.output or os.path.splitext(args.model)[0] + '.tflite'
+    with open(output, 'wb') as f:
+        f.write(tflite_bytes)
+    print(f"Wrote {output} ({len(tflite_bytes) / 1024:.1f} KiB, {args.quantization})")
+
+    results = {
+        'model': args.model,
+        'tflite_model': output,
+        'quantization': args.quantization,
+        'calibration_samples': len(calib),
+        'keras_size_bytes': os.path.getsize(args.model),
+        'tflite_size_bytes': len(tflite_bytes),
+    }
+    if os.path.isdir(args.test_dir):
+        test_samples, classes = list_images(args.test_dir)
+        lite = TFLiteModel(output)
+        keras_acc, keras_preds, keras_ms = evaluate(
+            lambda x: model.predict(x, verbose=0), test_samples, input_shape, args.batch_size)
+        lite_acc, lite_preds, lite_ms = evaluate(lite.predict, test_samples, input_shape, args.batch_size)
+        agreement = float(np.mean(np.asarray(keras_preds) == np.asarray(lite_preds))) if test_samples else 0.0
+        results.update({
+            'test_samples': len(test_samples),
+            'classes': classes,
+            'keras_accuracy': keras_acc,
+            'tflite_accuracy': lite_acc,
+            'accuracy_drop': keras_acc - lite_acc,
+            'prediction_agreement': agreement,
+            'keras_ms_per_batch': keras_ms,
+            'tflite_ms_per_batch': lite_ms,
+        })
+        print(f"Keras accuracy:  {keras_acc:.4f} ({keras_ms:.1f} ms/batch)")
+        print(f"TFLite accuracy: {lite_acc:.4f} ({lite_ms:.1f} ms/batch)")
+        print(f"Accuracy drop:   {keras_acc - lite_acc:+.4f}, agreement {agreement:.4f}")
+    else:
+        print(f"Test directory not found, skipping accuracy comparison: {args.test_dir}")
+
+    eval_path = os.path.splitext(output)[0] + '.eval.json'
+    with open(eval_path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Saved comparison to {eval_path}")
+
+    if args.max_accuracy_drop is not None and results.get('accuracy_drop', 0.0) > args.max_accuracy_drop:
+        print(f"Rejected: accuracy drop exceeds {args.max_accuracy_drop}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,8 +2,12 @@
 
 Endpoints:
  - GET / -> serves a minimal static HTML frontend
- - POST /predict -> accepts form file `image`, returns JSON {label, confidence, cam_image (base64)}
+ - POST /predict -> accepts form file `image`, returns JSON {label, confidence, cam_job_id}
+   (`?wait_cam=true` returns cam_image (base64) inline instead, `?cam_format=url` a cam_url)
+ - GET /predict/{job_id}/cam -> background Grad-CAM result, `?wait=<seconds>` long-polls
+ - GET /outputs/{session_id}/cam.png -> the session's Grad-CAM PNG (ETag / 304)
  - POST /chat -> accepts JSON {message}, returns chat reply (LLM or rule-based)
+ - GET /metrics -> runtime statistics (inference batching, executor queue, ...)
 
 Run:
   uvicorn fastapi_app:app --host 0.0.0.0 --port 8000
@@ -13,7 +17,7 @@ import io
 import base64
 import json
 from fastapi import FastAPI, File, UploadFile, Request, Form
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, Response
 from fastapi.responses import FileResponse
 from fastapi import Header, HTTPException
 from fastapi.staticfiles import StaticFiles
@@ -22,7 +26,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from PIL import Image
 import numpy as np
 import uuid
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 import asyncio
 import pathlib
 import time
@@ -30,17 +34,13 @@ import logging
 import re
 import shutil
 import secrets
+import hashlib
 
 try:
     import cv2
 except Exception:
     cv2 = None
 
-try:
-    import openai
-except Exception:
-    openai = None
-
 # Import medical knowledge base
 try:
     from utils.medical_knowledge import get_tumor_analysis, get_medication_side_effects, get_lifestyle_recommendations
@@ -61,10 +61,41 @@ except Exception:
     def answer_question(q):
         return "I can help with brain tumor questions. Please ask a specific question."
 
+from utils.inference import CompiledModel, InferenceExecutor, MicroBatcher, build_ensemble_model
+from utils.gradcam import get_cam_engine
+from utils.cam_jobs import CamJobStore
+from utils.prediction_cache import PredictionCache, content_key, model_fingerprint
+from utils.tflite_backend import TFLiteModel
+from utils.session_store import CachedSessionStore, MemorySessionStore, RedisSessionStore
+from utils.session_codec import make_codec
+from utils.output_writer import OutputWriter
+from utils.prediction_index import PredictionIndex
+from utils.image_prep import prepare_upload
+from utils.retention import SAFE_SESSION_ID, OutputLayout, OutputManifest, RetentionManager
+from utils.explain_templates import ExplainTemplates
+from utils.knowledge_base import get_knowledge_base
+from utils.llm_client import LLMClient
+from utils.rate_limit import SlidingWindowLimiter
+from utils.redis_guard import CircuitBreaker, GuardedRedis, create_redis_client
+
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 OPENAI_MODEL = os.environ.get("OPENAI_MODEL", "gpt-3.5-turbo")
-if openai is not None and OPENAI_API_KEY:
-    openai.api_key = OPENAI_API_KEY
+OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL", "https://api.openai.com/v1")
+# Every LLM call gets LLM_TIMEOUT seconds in total (retries included). With LLM_HEDGE=1 a
+# second request is sent once the first is slower than LLM_HEDGE_AFTER_MS, or than the
+# observed p95 latency when that is unset.
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", "20"))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "2"))
+LLM_MAX_CONNECTIONS = int(os.environ.get("LLM_MAX_CONNECTIONS", "20"))
+LLM_HEDGE = os.environ.get("LLM_HEDGE", "0") in ['1', 'true', 'True']
+_hedge_after_ms = os.environ.get("LLM_HEDGE_AFTER_MS")
+LLM_CLIENT = None
+if OPENAI_API_KEY:
+    LLM_CLIENT = LLMClient(
+        OPENAI_API_KEY, model=OPENAI_MODEL, base_url=OPENAI_BASE_URL, timeout=LLM_TIMEOUT,
+        max_retries=LLM_MAX_RETRIES, max_connections=LLM_MAX_CONNECTIONS, hedge=LLM_HEDGE,
+        hedge_after=float(_hedge_after_ms) / 1000.0 if LLM_HEDGE and _hedge_after_ms else None,
+    )
 
 app = FastAPI()
 
@@ -93,6 +124,9 @@ USE_TORCH = False
 tf_model = None
 torch_model = None
 alt_tf_model = None
+alt_model_path = None
+# primary + alternate models folded into one graph when ENSEMBLE=1 (built after loading)
+ENSEMBLE = None
 
 # Allow quick imports for diagnostics/tests by setting SKIP_MODEL_LOAD=1 in the environment.
 SKIP_MODEL_LOAD = os.environ.get('SKIP_MODEL_LOAD', '0') == '1'
@@ -151,6 +185,7 @@ if USE_TF and model_path:
                 alt_path = os.path.join('models/models', fname)
                 try:
                     alt_tf_model = tf.keras.models.load_model(alt_path)
+                    alt_model_path = alt_path
                     print(f'Loaded alternate LIME model from {alt_path}')
                     break
                 except Exception:
@@ -164,21 +199,96 @@ if USE_TORCH and os.path.exists('models/models/model.pth'):
     except Exception:
         torch_model = None
 
-# In-memory per-session store (fallback): session_id -> { last_prediction, last_confidence, ... }
-SESSION_STORE: Dict[str, Dict[str, Any]] = {}
-
-# Redis async client (optional, used in production via docker-compose)
+# Redis async client (optional, used in production via docker-compose).
+# Bounded pool with short timeouts behind a circuit breaker: after REDIS_BREAKER_FAILURES
+# consecutive connection errors/timeouts every Redis call fails fast (callers use their
+# in-memory fallbacks) until a background ping succeeds.
 redis_client = None
+REDIS_BREAKER = None
+REDIS_MAX_CONNECTIONS = int(os.environ.get('REDIS_MAX_CONNECTIONS', '50'))
+REDIS_SOCKET_TIMEOUT = float(os.environ.get('REDIS_SOCKET_TIMEOUT', '0.25'))
+REDIS_CONNECT_TIMEOUT = float(os.environ.get('REDIS_CONNECT_TIMEOUT', '0.25'))
+REDIS_POOL_TIMEOUT = float(os.environ.get('REDIS_POOL_TIMEOUT', '0.5'))
+REDIS_BREAKER_FAILURES = int(os.environ.get('REDIS_BREAKER_FAILURES', '3'))
+REDIS_PROBE_INTERVAL = float(os.environ.get('REDIS_PROBE_INTERVAL', '2'))
 try:
-    import redis.asyncio as redis_asyncio
     REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
-    # create a redis client instance; we'll connect lazily
-    redis_client = redis_asyncio.from_url(REDIS_URL, decode_responses=True)
+    # create a redis client instance; we'll connect lazily. Responses stay bytes so
+    # binary session values (msgpack, compressed) round-trip; readers decode as needed.
+    _redis_raw = create_redis_client(
+        REDIS_URL,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        socket_timeout=REDIS_SOCKET_TIMEOUT,
+        connect_timeout=REDIS_CONNECT_TIMEOUT,
+        pool_timeout=REDIS_POOL_TIMEOUT,
+        decode_responses=False,
+    )
+    REDIS_BREAKER = CircuitBreaker(failure_threshold=REDIS_BREAKER_FAILURES)
+    redis_client = GuardedRedis(_redis_raw, REDIS_BREAKER)
 except Exception:
     redis_client = None
 
-# In-memory rate limit fallback store: (session_id, period) -> count
-LLM_RATE_STORE = {}
+# Per-session state: Redis hash + history list when Redis is configured, in-memory otherwise.
+# History keeps the newest SESSION_HISTORY_MAX entries; with SESSION_HISTORY_SPILL=1 older
+# entries are appended to outputs/<session_id>/history.jsonl instead of being dropped.
+SESSION_TTL = int(os.environ.get('SESSION_TTL', str(60 * 60 * 24)))
+SESSION_HISTORY_MAX = int(os.environ.get('SESSION_HISTORY_MAX', '200'))
+SESSION_HISTORY_SPILL = os.environ.get('SESSION_HISTORY_SPILL', '0') in ['1', 'true', 'True']
+SESSION_HISTORY_WINDOW = int(os.environ.get('SESSION_HISTORY_WINDOW', '50'))
+# Bounds for the in-memory fallback (LRU eviction beyond these; idle sessions expire after SESSION_TTL)
+SESSION_MAX_ENTRIES = int(os.environ.get('SESSION_MAX_ENTRIES', '10000'))
+SESSION_MAX_BYTES = int(os.environ.get('SESSION_MAX_BYTES', str(64 * 1024 * 1024)))
+SESSION_SWEEP_INTERVAL = float(os.environ.get('SESSION_SWEEP_INTERVAL', '60'))
+# In-process read-through cache of session fields in front of Redis, kept coherent across
+# workers by pub/sub invalidations (SESSION_CACHE_TTL is a backstop, in seconds)
+SESSION_CACHE_ENABLED = os.environ.get('SESSION_CACHE', '1') in ['1', 'true', 'True']
+SESSION_CACHE_TTL = float(os.environ.get('SESSION_CACHE_TTL', '30'))
+SESSION_CACHE_MAX = int(os.environ.get('SESSION_CACHE_MAX', '10000'))
+# Encoding of session values in Redis: json or msgpack; msgpack values of at least
+# SESSION_COMPRESS_THRESHOLD bytes are compressed with SESSION_COMPRESSION (none, zstd, lz4).
+# Existing values stay readable whichever codec is configured.
+SESSION_CODEC = os.environ.get('SESSION_CODEC', 'msgpack')
+SESSION_COMPRESSION = os.environ.get('SESSION_COMPRESSION', 'zstd')
+SESSION_COMPRESS_THRESHOLD = int(os.environ.get('SESSION_COMPRESS_THRESHOLD', '1024'))
+# session ids come from a client cookie and name output directories: anything but a
+# server-issued uuid4 is reissued
+_SAFE_SESSION_ID = SAFE_SESSION_ID
+
+
+def _spill_history(session_id: str, entries: list):
+    """Append history entries trimmed from the session to history.jsonl in its output directory."""
+    if not _SAFE_SESSION_ID.match(session_id):
+        return
+    path = OUTPUT_LAYOUT.session_dir(session_id) / 'history.jsonl'
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = ''.join(json.dumps(entry) + '\n' for entry in entries).encode('utf-8')
+    with open(path, 'ab') as f:
+        f.write(data)
+    _record_output_write(session_id, path, len(data))
+
+
+_history_spill = _spill_history if SESSION_HISTORY_SPILL else None
+# in-memory store: the only store without Redis, and the fallback while Redis is unreachable
+MEMORY_SESSIONS = MemorySessionStore(
+    ttl=SESSION_TTL,
+    history_max=SESSION_HISTORY_MAX,
+    spill=_history_spill,
+    max_sessions=SESSION_MAX_ENTRIES,
+    max_bytes=SESSION_MAX_BYTES,
+)
+if redis_client is not None:
+    SESSIONS = RedisSessionStore(
+        redis_client,
+        ttl=SESSION_TTL,
+        history_max=SESSION_HISTORY_MAX,
+        spill=_history_spill,
+        fallback=MEMORY_SESSIONS,
+        codec=make_codec(SESSION_CODEC, SESSION_COMPRESSION, SESSION_COMPRESS_THRESHOLD),
+    )
+    if SESSION_CACHE_ENABLED:
+        SESSIONS = CachedSessionStore(SESSIONS, _redis_raw, ttl=SESSION_CACHE_TTL, max_entries=SESSION_CACHE_MAX)
+else:
+    SESSIONS = MEMORY_SESSIONS
 
 # Logging
 logger = logging.getLogger('fastapi_app')
@@ -194,9 +304,252 @@ if USE_TF and tf_model is None and os.path.exists('models/model.h5'):
         logger.warning('Could not load model.h5 with FeatureRFModel wrapper: %s', e)
         # Model remains None; /predict will return error
 
+# Dedicated pool for CPU-heavy /predict stages (decode, model calls, Grad-CAM, PNG encoding)
+# so the event loop stays free for /chat, /session and static files.
+INFER_WORKERS = int(os.environ.get('INFER_WORKERS', str(min(4, os.cpu_count() or 1))))
+INFER_QUEUE_SIZE = int(os.environ.get('INFER_QUEUE_SIZE', '32'))
+INFER_EXECUTOR = InferenceExecutor(max_workers=INFER_WORKERS, max_queue=INFER_QUEUE_SIZE)
+
+# Background Grad-CAM jobs: /predict returns immediately and the CAM is fetched from
+# /predict/{job_id}/cam. A separate pool keeps CAM rendering from delaying predictions.
+CAM_WORKERS = int(os.environ.get('CAM_WORKERS', '1'))
+CAM_JOB_TTL = int(os.environ.get('CAM_JOB_TTL', '600'))
+CAM_MAX_WAIT = float(os.environ.get('CAM_MAX_WAIT', '30'))
+CAM_EXECUTOR = InferenceExecutor(max_workers=CAM_WORKERS, max_queue=INFER_QUEUE_SIZE, name='cam')
+CAM_JOBS = CamJobStore(CAM_EXECUTOR, ttl=CAM_JOB_TTL)
+
+# SQLite (WAL) index of every prediction: /explain and /admin/sessions read it instead of
+# parsing outputs/<session_id>/predict.json or walking outputs/.
+PREDICTION_INDEX_PATH = os.environ.get('PREDICTION_INDEX_PATH', 'outputs/predictions.db')
+try:
+    PREDICTION_INDEX = PredictionIndex(PREDICTION_INDEX_PATH)
+except Exception as e:
+    logging.warning(f"Prediction index unavailable ({PREDICTION_INDEX_PATH}): {e}")
+    PREDICTION_INDEX = None
+
+# Session artifact directories are sharded as outputs/<id[:2]>/<id>/ (old flat directories are
+# still read and get moved on the first manifest build). A manifest in the index database tracks
+# their sizes, and a background pass evicts the least recently written ones older than
+# OUTPUT_MAX_AGE_DAYS, beyond OUTPUT_MAX_BYTES in total, or (OUTPUT_EVICT_EXPIRED=1, Redis
+# sessions only) whose session expired more than OUTPUT_EXPIRED_GRACE seconds after their last write.
+OUTPUT_LAYOUT = OutputLayout('outputs')
+OUTPUT_MAX_BYTES = int(os.environ.get('OUTPUT_MAX_BYTES', str(10 * 1024 * 1024 * 1024)))
+OUTPUT_MAX_AGE_DAYS = float(os.environ.get('OUTPUT_MAX_AGE_DAYS', '30'))
+OUTPUT_EVICT_EXPIRED = os.environ.get('OUTPUT_EVICT_EXPIRED', '1') in ['1', 'true', 'True']
+OUTPUT_EXPIRED_GRACE = float(os.environ.get('OUTPUT_EXPIRED_GRACE', '3600'))
+OUTPUT_RETENTION_INTERVAL = float(os.environ.get('OUTPUT_RETENTION_INTERVAL', '300'))
+OUTPUT_MANIFEST = None
+RETENTION = None
+try:
+    OUTPUT_MANIFEST = OutputManifest(PREDICTION_INDEX_PATH)
+except Exception as e:
+    logging.warning(f"Output manifest unavailable, retention disabled: {e}")
+
+
+def _record_output_write(session_id: str, path: pathlib.Path, delta: int):
+    """Writer hook (runs in the writer thread): account a written artifact in the manifest."""
+    if OUTPUT_MANIFEST is not None:
+        OUTPUT_MANIFEST.add(session_id, str(path.parent), delta)
+
+
+async def _session_is_live(session_id: str) -> Optional[bool]:
+    return await SESSIONS.exists(session_id)
+
+
+if OUTPUT_MANIFEST is not None:
+    RETENTION = RetentionManager(
+        OUTPUT_MANIFEST,
+        OUTPUT_LAYOUT,
+        max_bytes=OUTPUT_MAX_BYTES,
+        max_age=OUTPUT_MAX_AGE_DAYS * 86400,
+        # a memory store forgets sessions on restart, so only Redis can say a session expired
+        is_live=_session_is_live if OUTPUT_EVICT_EXPIRED and hasattr(SESSIONS, 'exists') else None,
+        expired_grace=OUTPUT_EXPIRED_GRACE,
+        # an evicted session leaves the prediction index too
+        on_evict=PREDICTION_INDEX.delete_session if PREDICTION_INDEX is not None else None,
+    )
+
+# Per-session artifacts (predict.json, cam.png) are written behind the response by a
+# background task; OUTPUT_MAX_PENDING bounds the files waiting in memory.
+OUTPUT_MAX_PENDING = int(os.environ.get('OUTPUT_MAX_PENDING', '1000'))
+OUTPUT_WRITER = OutputWriter('outputs', max_pending=OUTPUT_MAX_PENDING, layout=OUTPUT_LAYOUT,
+                             on_write=_record_output_write)
+# /predict returns the CAM inline as base64 (`inline`) or as a /outputs/<session_id>/cam.png
+# link (`url`); clients choose per request with ?cam_format=, this is the default.
+CAM_FORMAT = os.environ.get('CAM_FORMAT', 'inline')
+# cam.png is rewritten by later predictions in the same session, so clients revalidate (ETag)
+CAM_CACHE_CONTROL = os.environ.get('CAM_CACHE_CONTROL', 'private, no-cache')
+
+# Per-label medical knowledge (utils/medical_knowledge.json, or MEDICAL_KNOWLEDGE_PATH),
+# loaded once and keyed by the labels.json ids
+KNOWLEDGE_BASE = get_knowledge_base()
+
+# /explain reports and the /predict explanation messages depend only on the label and the
+# displayed confidence (0.1% steps); they are compiled once and rendered results kept in an LRU
+EXPLAIN_CACHE_SIZE = int(os.environ.get('EXPLAIN_CACHE_SIZE', '256'))
+EXPLAIN_TEMPLATES = ExplainTemplates(KNOWLEDGE_BASE, cache_size=EXPLAIN_CACHE_SIZE)
+
+# Admin endpoints (/admin/...) accept `Authorization: Bearer <ADMIN_TOKEN>` or HTTP Basic
+# ADMIN_USER:ADMIN_PASSWORD; with neither configured they are disabled.
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+ADMIN_USER = os.environ.get('ADMIN_USER')
+ADMIN_PASSWORD = os.environ.get('ADMIN_PASSWORD')
+
+# Micro-batching: concurrent /predict calls share one forward pass.
+# INFER_MAX_BATCH=1 effectively disables batching.
+INFER_MAX_BATCH = int(os.environ.get('INFER_MAX_BATCH', '8'))
+INFER_MAX_WAIT_MS = float(os.environ.get('INFER_MAX_WAIT_MS', '5'))
+# Model input size, resolved once at load time (falls back to 150x150 like the original scripts)
+MODEL_INPUT_SHAPE = (150, 150)
+if tf_model is not None:
+    try:
+        MODEL_INPUT_SHAPE = (int(tf_model.inputs[0].shape[1]), int(tf_model.inputs[0].shape[2]))
+    except Exception:
+        logger.warning('Could not read model input shape; using %s', MODEL_INPUT_SHAPE)
+
+# ENSEMBLE=1 folds the primary and LIME models into one graph that outputs the weighted
+# average of their probabilities, so /predict pays for a single model call.
+# ENSEMBLE_WEIGHTS is "primary,alternate" (normalised to sum to 1).
+ENSEMBLE_ENABLED = os.environ.get('ENSEMBLE', '0') in ['1', 'true', 'True']
+ENSEMBLE_WEIGHTS = os.environ.get('ENSEMBLE_WEIGHTS', '0.5,0.5')
+USED_MODEL = model_path if model_path is not None else None
+if ENSEMBLE_ENABLED and tf_model is not None and alt_tf_model is not None:
+    try:
+        _weights = [float(w) for w in ENSEMBLE_WEIGHTS.split(',') if w.strip()]
+        ENSEMBLE = build_ensemble_model([tf_model, alt_tf_model], _weights)
+        _total = sum(_weights)
+        USED_MODEL = 'ensemble(' + ', '.join(
+            f'{p}:{w / _total:.2f}' for p, w in zip([model_path, alt_model_path], _weights)
+        ) + ')'
+        logger.info('Serving %s', USED_MODEL)
+    except Exception as e:
+        ENSEMBLE = None
+        logger.warning('Ensemble disabled, serving the primary model only: %s', e)
+elif ENSEMBLE_ENABLED:
+    logger.warning('ENSEMBLE is set but no alternate LIME model was loaded; serving the primary model only')
+
+# INFERENCE_BACKEND=tflite serves /predict probabilities from a quantized export
+# (see export_tflite.py); Grad-CAM keeps using the Keras model.
+INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', 'keras').lower()
+TFLITE_MODEL_PATH = os.environ.get(
+    'TFLITE_MODEL_PATH',
+    os.path.splitext(model_path)[0] + '.tflite' if model_path else 'models/models/model_selected.tflite',
+)
+TFLITE_THREADS = int(os.environ.get('TFLITE_THREADS', '0')) or None
+tflite_model = None
+if INFERENCE_BACKEND == 'tflite' and tf_model is not None:
+    try:
+        tflite_model = TFLiteModel(TFLITE_MODEL_PATH, num_threads=TFLITE_THREADS)
+        if tflite_model.input_shape[:2] != MODEL_INPUT_SHAPE:
+            raise ValueError(f'input shape {tflite_model.input_shape} does not match the Keras model')
+        if ENSEMBLE is not None:
+            logger.warning('ENSEMBLE is ignored with INFERENCE_BACKEND=tflite')
+            ENSEMBLE = None
+        USED_MODEL = TFLITE_MODEL_PATH
+        logger.info('Serving predictions from TFLite model %s', TFLITE_MODEL_PATH)
+    except Exception as e:
+        tflite_model = None
+        logger.warning('TFLite backend unavailable, using Keras: %s', e)
+
+# Keras models are served through a traced tf.function with a fixed input signature rather
+# than model.predict (INFER_COMPILE=0 disables, INFER_XLA=1 adds XLA compilation). Each one
+# is checked against predict at startup and falls back to predict if the outputs differ.
+INFER_COMPILE = os.environ.get('INFER_COMPILE', '1') in ['1', 'true', 'True']
+INFER_XLA = os.environ.get('INFER_XLA', '0') in ['1', 'true', 'True']
+COMPILED_MODELS: Dict[str, CompiledModel] = {}
+if INFER_COMPILE and tflite_model is None:
+    for _name, _model in (('primary', tf_model), ('ensemble', ENSEMBLE)):
+        if _model is None:
+            continue
+        try:
+            _compiled = CompiledModel(_model, jit_compile=INFER_XLA, name=_name)
+            _compiled.verify(atol=1e-4 if INFER_XLA else 1e-5)
+            COMPILED_MODELS[_name] = _compiled
+            logger.info('Compiled %s model (xla=%s, max diff vs predict %.2e)', _name, INFER_XLA, _compiled.max_abs_diff)
+        except Exception as e:
+            logger.warning('Serving %s model through predict: %s', _name, e)
+
+# SERVING_MODE=fused serves probabilities and the Grad-CAM heatmap from one tape-recorded
+# forward pass (GradCamEngine.predict_with_cam); 'split' runs predict and Grad-CAM separately.
+SERVING_MODE = os.environ.get('SERVING_MODE', 'split').lower()
+PREDICT_BATCHER = None
+if tf_model is not None:
+    cam_engine = None
+    # build the Grad-CAM engine at startup so the first request doesn't pay for it
+    try:
+        cam_engine = get_cam_engine(tf_model)
+    except Exception as e:
+        logger.warning('Grad-CAM engine unavailable: %s', e)
+
+    if SERVING_MODE == 'fused' and (ENSEMBLE is not None or tflite_model is not None):
+        # the fused pass runs the primary Keras model only
+        logger.warning('Fused serving is not available with ENSEMBLE or the TFLite backend; using split mode')
+        SERVING_MODE = 'split'
+    elif SERVING_MODE == 'fused' and cam_engine is not None:
+        try:
+            # the fused path must reproduce model.predict's probabilities
+            probe = np.random.default_rng(0).random((1,) + tuple(tf_model.inputs[0].shape[1:])).astype('float32')
+            fused_probs, _ = cam_engine.predict_with_cam(probe)
+            if not np.allclose(fused_probs, tf_model.predict(probe, verbose=0), atol=1e-5):
+                raise ValueError('fused probabilities differ from model.predict')
+        except Exception as e:
+            logger.warning('Fused serving disabled, falling back to split mode: %s', e)
+            SERVING_MODE = 'split'
+    elif SERVING_MODE == 'fused':
+        SERVING_MODE = 'split'
+
+    if SERVING_MODE == 'fused':
+        batch_fn = cam_engine.predict_with_cam
+    elif tflite_model is not None:
+        batch_fn = tflite_model.predict
+    else:
+        serving_name = 'ensemble' if ENSEMBLE is not None else 'primary'
+        serving_model = ENSEMBLE if ENSEMBLE is not None else tf_model
+        batch_fn = COMPILED_MODELS.get(serving_name) or (lambda x: serving_model.predict(x, verbose=0))
+    PREDICT_BATCHER = MicroBatcher(
+        batch_fn,
+        max_batch_size=INFER_MAX_BATCH,
+        max_wait_ms=INFER_MAX_WAIT_MS,
+        name='tf_model',
+        executor=INFER_EXECUTOR,
+    )
+    logger.info('Serving mode: %s', SERVING_MODE)
+
+# Content-addressed /predict cache: sha256(upload) + fingerprint of the loaded model files.
+# In-process LRU (byte budget + TTL) with an optional Redis tier shared by all workers.
+PREDICT_CACHE_ENABLED = os.environ.get('PREDICT_CACHE', '1') in ['1', 'true', 'True']
+PREDICT_CACHE_BYTES = int(os.environ.get('PREDICT_CACHE_BYTES', str(64 * 1024 * 1024)))
+PREDICT_CACHE_TTL = int(os.environ.get('PREDICT_CACHE_TTL', '3600'))
+PREDICT_CACHE_REDIS = os.environ.get('PREDICT_CACHE_REDIS', '1') in ['1', 'true', 'True']
+PREDICTION_CACHE = None
+MODEL_FINGERPRINT = None
+if tf_model is not None:
+    try:
+        _fp_paths = [model_path if model_path is not None else 'models/model.h5']
+        if ENSEMBLE is not None:
+            _fp_paths.append(alt_model_path)
+        if tflite_model is not None:
+            _fp_paths.append(TFLITE_MODEL_PATH)
+        MODEL_FINGERPRINT = model_fingerprint(_fp_paths, extra=USED_MODEL or '')
+    except Exception as e:
+        logging.warning(f"Could not fingerprint model files: {e}")
+if PREDICT_CACHE_ENABLED and MODEL_FINGERPRINT is not None:
+    try:
+        PREDICTION_CACHE = PredictionCache(
+            max_bytes=PREDICT_CACHE_BYTES,
+            ttl=PREDICT_CACHE_TTL,
+            redis_client=redis_client if PREDICT_CACHE_REDIS else None,
+        )
+    except Exception as e:
+        logger.warning('Prediction cache disabled: %s', e)
+
 # LLM security/config
 LLM_ENABLED = os.environ.get('LLM_ENABLED', '1') in ['1', 'true', 'True']
 LLM_RATE_LIMIT_PER_MIN = int(os.environ.get('LLM_RATE_LIMIT_PER_MIN', '6'))
+# Per-session /predict quota (0 disables it)
+PREDICT_RATE_LIMIT_PER_MIN = int(os.environ.get('PREDICT_RATE_LIMIT_PER_MIN', '0'))
+LLM_LIMITER = SlidingWindowLimiter(LLM_RATE_LIMIT_PER_MIN, 60, redis_client, prefix='llm_rl:', name='llm')
+PREDICT_LIMITER = SlidingWindowLimiter(PREDICT_RATE_LIMIT_PER_MIN, 60, redis_client, prefix='predict_rl:', name='predict')
 
 _EMAIL_RE = re.compile(r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+")
 _SSN_RE = re.compile(r"\b\d{3}-\d{2}-\d{4}\b")
@@ -219,58 +572,11 @@ def _contains_pii(text: str) -> bool:
 
 
 async def _llm_check_and_increment(session_id: str) -> bool:
-    """Return True if under rate limit, increment counter. Use Redis if available, otherwise in-memory fallback."""
-    if session_id is None:
-        session_id = 'anon'
-    period = int(time.time() // 60)
-    if redis_client is not None:
-        try:
-            key = f"llm_rl:{session_id}:{period}"
-            n = await redis_client.incr(key)
-            if n == 1:
-                await redis_client.expire(key, 70)
-            logger.debug('LLM rate key %s -> %s', key, n)
-            return n <= LLM_RATE_LIMIT_PER_MIN
-        except Exception:
-            # fallback to in-memory if Redis errors
-            pass
-
-    # in-memory fallback
-    key = (session_id, period)
-    cnt = LLM_RATE_STORE.get(key, 0) + 1
-    LLM_RATE_STORE[key] = cnt
-    # simple cleanup: remove old keys occasionally
-    if len(LLM_RATE_STORE) > 10000:
-        nowp = int(time.time() // 60)
-        for k in list(LLM_RATE_STORE.keys()):
-            if k[1] < nowp - 2:
-                del LLM_RATE_STORE[k]
-    return cnt <= LLM_RATE_LIMIT_PER_MIN
-
-
-async def _redis_get_session(session_id: str) -> Dict[str, Any]:
-    """Retrieve session dict from Redis or return {} if not present."""
-    if redis_client is None:
-        return {}
-    try:
-        key = f"session:{session_id}"
-        raw = await redis_client.get(key)
-        if not raw:
-            return {}
-        return json.loads(raw)
-    except Exception:
-        return {}
-
-
-async def _redis_set_session(session_id: str, data: Dict[str, Any], ttl: int = 60 * 60 * 24):
-    """Store session dict into Redis with TTL (seconds)."""
-    if redis_client is None:
-        return
-    try:
-        key = f"session:{session_id}"
-        await redis_client.set(key, json.dumps(data), ex=ttl)
-    except Exception:
-        return
+    """Return True if the session is under the LLM rate limit (and count this call)."""
+    result = await LLM_LIMITER.hit(session_id or 'anon')
+    if not result.allowed:
+        logger.debug('LLM rate limit hit for %s (retry in %.1fs)', session_id, result.retry_after)
+    return result.allowed
 
 
 # Safe, non-diagnostic explanations for labels. Keep short, non-medical and include disclaimer.
@@ -362,82 +668,11 @@ def _rule_explanation(label: str, confidence: float) -> str:
 
 def _split_explanation_to_messages(label: str, confidence: float, medical_analysis: dict) -> list:
     """Split the medical explanation into separate chat messages (one by one)."""
-    messages = []
-    conf_percent = confidence * 100
-    
-    # Message 1: Tumor Detection Confidence
-    msg1 = f"📊 **TUMOR DETECTION CONFIDENCE (Model Accuracy)**\n\n"
-    msg1 += f"Confidence Score: {conf_percent:.1f}%\n\n"
-    msg1 += f"• What this means: The AI model has analyzed your brain MRI and is {conf_percent:.1f}% confident in its assessment.\n"
-    msg1 += f"• Higher percentage = Higher certainty in the prediction\n"
-    msg1 += f"• ⚠️ Important: This is NOT a medical diagnosis - professional evaluation is always needed."
-    messages.append({'type': 'analysis', 'text': msg1})
-    
-    # Message 2: Disease Information
-    msg2 = f"🔍 **DISEASE INFORMATION**\n\n"
-    detected_condition = medical_analysis.get('name', label) if medical_analysis else label
-    msg2 += f"Detected Condition: {detected_condition}\n\n"
-    
-    if (detected_condition.lower() == 'no tumor') or ('normal' in detected_condition.lower()):
-        msg2 += f"Description: The brain MRI scan shows no detectable tumor.\n"
-        msg2 += f"Classification: Normal brain tissue detected\n\n"
-        msg2 += f"✅ Key Information:\n"
-        msg2 += f"• Status: Normal brain tissue detected\n"
-        msg2 += f"• Note: This is a positive result indicating normal brain structure"
-    else:
-        msg2 += f"Description: {medical_analysis.get('description', 'Brain abnormality detected')}\n\n"
-        msg2 += f"📋 Classification Details:\n"
-        msg2 += f"• Tumor Type: {detected_condition}\n"
-        msg2 += f"• Confidence: {conf_percent:.1f}%"
-    messages.append({'type': 'disease', 'text': msg2})
-    
-    # Message 3: Symptoms & Warning Signs
-    msg3 = f"⚠️ **COMMON SYMPTOMS & WARNING SIGNS**\n\n"
-    if (detected_condition.lower() == 'no tumor') or ('normal' in detected_condition.lower()):
-        msg3 += f"STATUS: No tumor-related symptoms expected\n"
-        msg3 += f"Normal brain tissue indicates no pathology detected\n\n"
-        msg3 += f"Important Notes:\n"
-        msg3 += f"• Not all patients experience all symptoms\n"
-        msg3 += f"• Symptoms depend on tumor location, size, and type\n"
-        msg3 += f"• Presence of symptoms doesn't confirm diagnosis\n"
-        msg3 += f"• Absence of symptoms doesn't mean it's not serious"
-    else:
-        msg3 += f"Potential Symptoms (if tumor confirmed):\n"
-        msg3 += f"• Headaches\n"
-        msg3 += f"• Vision problems\n"
-        msg3 += f"• Balance and coordination issues\n"
-        msg3 += f"• Nausea or vomiting\n\n"
-        msg3 += f"Important Notes:\n"
-        msg3 += f"• Not all patients experience all symptoms\n"
-        msg3 += f"• Symptoms depend on tumor location, size, and type"
-    messages.append({'type': 'symptoms', 'text': msg3})
-    
-    # Message 4: Side Effects & Treatment
-    msg4 = f"💊 **POTENTIAL SIDE EFFECTS & TREATMENT CONSIDERATIONS**\n\n"
-    msg4 += f"Treatment Selection depends on:\n"
-    msg4 += f"• Tumor size, location, and grade\n"
-    msg4 += f"• Patient age and overall health\n"
-    msg4 += f"• Patient preferences\n\n"
-    msg4 += f"Available Treatment Options:\n"
-    msg4 += f"• Surgery\n"
-    msg4 += f"• Radiation therapy\n"
-    msg4 += f"• Chemotherapy\n"
-    msg4 += f"• Clinical trials\n\n"
-    msg4 += f"Note: Multiple treatment options may be available. Your doctor will recommend the best approach for your specific case."
-    messages.append({'type': 'treatment', 'text': msg4})
-    
-    # Message 5: Doctor Recommendations
-    msg5 = f"👨‍⚕️ **URGENT: DOCTOR VISIT RECOMMENDATIONS**\n\n"
-    msg5 += f"Next Steps:\n"
-    msg5 += f"1. Consult with a Neurologist or Neurosurgeon\n"
-    msg5 += f"2. Have your MRI reviewed by a Radiologist\n"
-    msg5 += f"3. Discuss additional imaging if needed\n"
-    msg5 += f"4. Create a personalized treatment plan\n\n"
-    msg5 += f"⚠️ Disclaimer:\n"
-    msg5 += f"This AI analysis is a supplementary tool ONLY. Always consult qualified medical professionals for diagnosis and treatment. This report should not replace professional medical advice."
-    messages.append({'type': 'recommendation', 'text': msg5})
-    
-    return messages
+    medical_analysis = medical_analysis or {}
+    detected_condition = medical_analysis.get('name', label)
+    description = medical_analysis.get('description', 'Brain abnormality detected')
+    return EXPLAIN_TEMPLATES.messages(label, detected_condition, EXPLAIN_TEMPLATES.confidence_text(confidence),
+                                      description)
 
 
 def _build_explanation_prompt(label_idx: str, label_name: str, confidence: float, top_k: list, probs_map: dict):
@@ -456,9 +691,9 @@ def _build_explanation_prompt(label_idx: str, label_name: str, confidence: float
     return prompt
 
 
-def llm_explanation(label_idx: str, label_name: str, confidence: float, top_k: list, probs_map: dict) -> str:
+async def llm_explanation(label_idx: str, label_name: str, confidence: float, top_k: list, probs_map: dict) -> str:
     """Generate a safe, non-diagnostic explanation using OpenAI. Falls back to rule-based explanation on error."""
-    if openai is None or OPENAI_API_KEY is None:
+    if LLM_CLIENT is None:
         return _rule_explanation(label_name, confidence)
 
     system_prompt = (
@@ -466,39 +701,40 @@ def llm_explanation(label_idx: str, label_name: str, confidence: float, top_k: l
     )
     user_prompt = _build_explanation_prompt(label_idx, label_name, confidence, top_k, probs_map)
     try:
-        resp = openai.ChatCompletion.create(
-            model=OPENAI_MODEL,
-            messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}],
+        return await LLM_CLIENT.chat(
+            [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}],
             max_tokens=200,
             temperature=0.2,
         )
-        return resp['choices'][0]['message']['content'].strip()
     except Exception:
         return _rule_explanation(label_name, confidence)
 
 
+def _session_cookie(request: Request) -> Optional[str]:
+    """Return the session_id cookie, or None if it is missing or not a safe id."""
+    sid = request.cookies.get('session_id')
+    if sid and _SAFE_SESSION_ID.match(sid):
+        return sid
+    return None
+
+
 async def _get_or_create_session_id(request: Request) -> str:
     """Return existing session_id from cookie or create a new one and persist an empty session.
 
     Uses Redis if available, otherwise falls back to in-memory store.
     """
-    sid = request.cookies.get('session_id')
+    sid = _session_cookie(request)
     if sid:
         return sid
     sid = str(uuid.uuid4())
-    # initialize an empty session in Redis or fallback store
-    initial = {'history': []}
-    if redis_client is not None:
-        await _redis_set_session(sid, initial)
-    else:
-        SESSION_STORE.setdefault(sid, initial)
+    await SESSIONS.create(sid)
     return sid
 
 
-def _build_prediction_qa(label: str, confidence: float, top_k: list) -> list:
+async def _build_prediction_qa(label: str, confidence: float, top_k: list) -> list:
     """Return a short list of suggested user questions and LLM-like answers for the given prediction.
 
-    Uses the configured LLM when available; falls back to rule-based answers.
+    Uses the configured LLM when available (all questions concurrently); falls back to rule-based answers.
     """
     questions = [
         "What does this result mean?",
@@ -506,21 +742,21 @@ def _build_prediction_qa(label: str, confidence: float, top_k: list) -> list:
         "What are safe next steps?",
         "What symptoms or signs are associated with this tumor type?"
     ]
-    qa = []
-    for q in questions:
+
+    async def answer(q):
         try:
-            if openai is not None and OPENAI_API_KEY is not None:
+            if LLM_CLIENT is not None:
                 try:
                     # use llm_chat to keep answers consistent with assistant persona
-                    ans = llm_chat(q + f" Context: prediction {label} (confidence {confidence:.2f}).", last_pred=label, last_conf=confidence)
+                    return await llm_chat(q + f" Context: prediction {label} (confidence {confidence:.2f}).", last_pred=label, last_conf=confidence)
                 except Exception:
-                    ans = rule_based_chat(q, last_pred=label, last_conf=confidence)
-            else:
-                ans = rule_based_chat(q, last_pred=label, last_conf=confidence)
+                    return rule_based_chat(q, last_pred=label, last_conf=confidence)
+            return rule_based_chat(q, last_pred=label, last_conf=confidence)
         except Exception:
-            ans = "I can help explain model outputs. Please consult a clinician for medical advice."
-        qa.append({'question': q, 'answer': ans})
-    return qa
+            return "I can help explain model outputs. Please consult a clinician for medical advice."
+
+    answers = await asyncio.gather(*(answer(q) for q in questions))
+    return [{'question': q, 'answer': ans} for q, ans in zip(questions, answers)]
 
 
 def pil_to_base64(img: Image.Image):
@@ -529,32 +765,6 @@ def pil_to_base64(img: Image.Image):
     return base64.b64encode(buf.getvalue()).decode('utf-8')
 
 
-def _is_grayscale_like(pil: Image.Image) -> bool:
-    """Check if the image is mostly grayscale (low color variance) - validation for MRI."""
-    try:
-        arr = np.array(pil.resize((256, 256)))
-        if arr.ndim == 2:
-            # Single channel - definitely grayscale (valid MRI)
-            return True
-        if arr.shape[2] < 3:
-            return False
-        
-        r, g, b = arr[:, :, 0].astype(float), arr[:, :, 1].astype(float), arr[:, :, 2].astype(float)
-        diff_rg = np.abs(r - g).mean()
-        diff_rb = np.abs(r - b).mean()
-        diff_gb = np.abs(g - b).mean()
-        
-        # Medical MRI images must be mostly grayscale
-        # Threshold: 30 allows for slight color variations due to image conversion
-        is_grayscale = diff_rg < 30 and diff_rb < 30 and diff_gb < 30
-        
-        return is_grayscale
-    except Exception:
-        return False
-
-
-
-
 def _analyze_image_texture(pil: Image.Image) -> dict:
     """Analyze image texture characteristics typical of medical imaging."""
     try:
@@ -632,57 +842,6 @@ def _detect_brain_structures(pil: Image.Image) -> bool:
         return False
 
 
-def _is_brain_image(pil: Image.Image) -> bool:
-    """Check if the uploaded image is a valid brain MRI scan.
-    
-    Simple validation:
-    1. Must be grayscale-like (MRI requirement)
-    2. Must have reasonable size
-    3. Must have reasonable contrast
-    
-    Returns True for valid brain MRI images, False otherwise.
-    """
-    try:
-        # Step 1: Must be grayscale-like
-        if not _is_grayscale_like(pil):
-            logging.debug("Image rejected: Not grayscale-like")
-            return False
-        
-        # Step 2: Check image dimensions are reasonable
-        width, height = pil.size
-        
-        # Minimum reasonable size
-        if width < 64 or height < 64:
-            logging.debug(f"Image rejected: Too small ({width}x{height})")
-            return False
-        
-        # Maximum reasonable size (shouldn't be huge)
-        if width > 2000 or height > 2000:
-            logging.debug(f"Image rejected: Too large ({width}x{height})")
-            return False
-        
-        # Step 3: Check contrast - medical images should have reasonable contrast
-        gray = pil.convert('L')
-        arr = np.array(gray).astype('float32')
-        std_val = np.std(arr)
-        
-        # Very low contrast images are likely not medical scans
-        if std_val < 5:
-            logging.debug(f"Image rejected: Very low contrast (std={std_val:.1f})")
-            return False
-        
-        logging.info("Image validated as brain MRI")
-        return True
-        
-    except Exception as e:
-        logging.error(f"Error validating brain image: {e}")
-        return False
-        
-    except Exception as e:
-        logging.error(f"Error in brain image validation: {e}")
-        return False
-
-
 def _has_focus_area(pil: Image.Image) -> bool:
     """Check whether the central/focus area of the image contains MRI brain structures.
 
@@ -707,6 +866,66 @@ def _has_focus_area(pil: Image.Image) -> bool:
         return False
 
 
+def _compute_cam_b64(pil: Image.Image, arr: np.ndarray, batched: np.ndarray, pred_idx: int, heatmap=None) -> str:
+    """Return the Grad-CAM overlay for `pred_idx` as base64 PNG (original image on failure).
+
+    Pass `heatmap` when it was already produced by the fused serving pass. Blocking
+    (forward/backward pass plus PNG encoding): call it through INFER_EXECUTOR.
+    """
+    try:
+        if heatmap is None:
+            heatmap = get_cam_engine(tf_model).heatmap(batched, pred_idx)[0]
+        hm = heatmap - heatmap.min()
+        if hm.max() > 0:
+            hm = hm / hm.max()
+        hm_resized = cv2.resize(hm, (arr.shape[1], arr.shape[0]))
+        heatmap_color = cv2.applyColorMap((hm_resized * 255).astype('uint8'), cv2.COLORMAP_JET)
+        heatmap_color = cv2.cvtColor(heatmap_color, cv2.COLOR_BGR2RGB)
+        overlay = (0.4 * heatmap_color / 255.0 + 0.6 * arr).clip(0, 1)
+        cam_pil = Image.fromarray((overlay * 255).astype('uint8'))
+        return pil_to_base64(cam_pil)
+    except Exception:
+        # fallback to original image base64
+        return pil_to_base64(pil)
+
+
+async def _save_cam(session_id: str, cam_b64: Optional[str]):
+    """Queue the CAM overlay for outputs/<session_id>/cam.png."""
+    if not cam_b64:
+        return
+    try:
+        await OUTPUT_WRITER.submit(session_id, 'cam.png', base64.b64decode(cam_b64))
+    except Exception as e:
+        logger.warning('Failed to queue CAM for session %s: %s', session_id, e)
+
+
+async def _persist_prediction(session_id: str, body: dict, save_cam: bool):
+    """Queue outputs/<session_id>/predict.json (compact, referencing the CAM by path) and the CAM PNG."""
+    try:
+        record = {k: v for k, v in body.items() if k != 'cam_image'}
+        record['cam_path'] = str(OUTPUT_WRITER.path(session_id, 'cam.png'))
+        await OUTPUT_WRITER.submit(session_id, 'predict.json',
+                                   json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+        if save_cam:
+            await _save_cam(session_id, body.get('cam_image'))
+    except Exception:
+        # don't fail the request if disk persistence fails
+        pass
+
+
+def _cam_url(session_id: str) -> str:
+    return f'/outputs/{session_id}/cam.png'
+
+
+def _with_cam_url(body: dict, session_id: str) -> dict:
+    """Return a copy of a /predict body with the inline base64 CAM replaced by its URL."""
+    body = dict(body)
+    has_cam = body.get('cam_image') is not None or body.get('cam_job_id') is not None
+    body['cam_image'] = None
+    body['cam_url'] = _cam_url(session_id) if has_cam else None
+    return body
+
+
 def rule_based_chat(message, last_pred=None, last_conf=None):
     """Enhanced chat that understands questions better and provides ChatGPT-like responses."""
     msg = message or ''
@@ -723,16 +942,8 @@ def rule_based_chat(message, last_pred=None, last_conf=None):
             return f'To answer your question about brain MRI analysis, I first need you to upload a brain MRI image. Once you upload an image, I can analyze it and answer questions like: "{message}". Please upload a valid brain MRI image first.'
         return 'No prediction available yet. Please upload a brain MRI image first, then I can answer your questions about it.'
     
-    # Try enhanced brain tumor knowledge base for comprehensive answers
-    if HAS_BRAIN_TUMOR_KB:
-        try:
-            answer = answer_question(message)
-            if answer and "specific question" not in answer.lower() and len(answer) > 20:
-                return answer
-        except Exception:
-            pass
-    
     conf_percent = last_conf * 100 if last_conf is not None else 0
+    knowledge = KNOWLEDGE_BASE.get(last_pred)
     
     # ===== GREETING & FRIENDLY RESPONSES =====
     if any(word in msg_lower for word in ['hi ', 'hello', 'hey', 'greetings', 'how are']):
@@ -746,16 +957,9 @@ def rule_based_chat(message, last_pred=None, last_conf=None):
         return f'I detected **{last_pred}** in your brain MRI scan with **{conf_percent:.1f}% confidence**. This means the model assessed the image and identified this tumor type as the most likely diagnosis based on the scan patterns.'
     
     if any(phrase in msg_lower for phrase in ['what does it mean', 'what does this mean', 'what is this', 'explain the result']):
-        if 'glioma' in last_pred.lower():
-            return f'**{last_pred}** is a type of brain tumor that originates from glial cells (supporting cells in the brain). Gliomas can vary in grade and severity, ranging from low-grade (slow-growing) to high-grade (aggressive). The exact treatment depends on the grade, size, and location.'
-        elif 'meningioma' in last_pred.lower():
-            return f'**{last_pred}** is a tumor of the meninges - the protective membranes surrounding the brain and spinal cord. Most meningiomas are benign (non-cancerous) and slow-growing. However, treatment may still be needed depending on size and location.'
-        elif 'pituitary' in last_pred.lower():
-            return f'**{last_pred}** originates from the pituitary gland, a small but important gland at the base of the brain. These tumors can affect hormone production and may cause various symptoms. Treatment options include medication, surgery, or radiation depending on the tumor size and type.'
-        elif 'no_tumor' in last_pred.lower() or 'no tumor' in last_pred.lower():
-            return f'The scan shows **{last_pred}** - meaning no detectable tumor was found. This is a positive result indicating normal brain tissue without apparent pathology based on the model\'s analysis.'
-        else:
-            return f'The predicted diagnosis is **{last_pred}**. This is the model\'s assessment of what it identified in the MRI scan. For detailed medical interpretation, please consult with a neurologist or radiologist.'
+        if knowledge is not None and knowledge.chat.get('meaning'):
+            return knowledge.chat['meaning'].format(label=last_pred)
+        return f'The predicted diagnosis is **{last_pred}**. This is the model\'s assessment of what it identified in the MRI scan. For detailed medical interpretation, please consult with a neurologist or radiologist.'
     
     # ===== CONFIDENCE/ACCURACY QUESTIONS =====
     if any(phrase in msg_lower for phrase in ['how confident', 'how sure', 'how accurate', 'confidence level', 'how reliable', 'is it accurate']):
@@ -764,25 +968,15 @@ def rule_based_chat(message, last_pred=None, last_conf=None):
     
     # ===== SYMPTOMS QUESTIONS =====
     if any(phrase in msg_lower for phrase in ['symptoms', 'signs', 'what are symptoms', 'what causes symptoms', 'will i have', 'can cause', 'common symptoms']):
-        if 'glioma' in last_pred.lower():
-            return f'**{last_pred}** commonly presents with: headaches, seizures, vision changes, difficulty with balance, cognitive changes, or speech difficulties. Symptoms depend on tumor location and size. However, not all patients experience symptoms. **Important**: Always consult a neurologist about your specific symptoms.'
-        elif 'meningioma' in last_pred.lower():
-            return f'**{last_pred}** may cause: headaches, vision problems, hearing issues, balance difficulties, or cognitive changes. Many meningiomas grow slowly and may not cause symptoms initially. **Please consult a neurologist to discuss whether your symptoms match this prediction.**'
-        elif 'pituitary' in last_pred.lower():
-            return f'**{last_pred}** can cause: hormonal imbalances, headaches, vision loss (especially peripheral vision), fatigue, or sexual dysfunction. Symptoms depend on which hormones are affected. **Consult an endocrinologist or neurologist for symptom evaluation and management.**'
-        else:
-            return f'Symptoms related to {last_pred} vary by individual. Please consult a healthcare professional to discuss your specific symptoms and how they relate to this diagnosis.'
+        if knowledge is not None and knowledge.chat.get('symptoms'):
+            return knowledge.chat['symptoms'].format(label=last_pred)
+        return f'Symptoms related to {last_pred} vary by individual. Please consult a healthcare professional to discuss your specific symptoms and how they relate to this diagnosis.'
     
     # ===== TREATMENT QUESTIONS =====
     if any(phrase in msg_lower for phrase in ['treatment', 'cure', 'how to treat', 'what is the treatment', 'surgery', 'therapy', 'medication', 'how to fix', 'how can it be treated']):
-        if 'glioma' in last_pred.lower():
-            return f'Treatment for **{last_pred}** typically involves: 1) **Surgery** - to remove or biopsy the tumor, 2) **Radiation therapy** - to target cancer cells, 3) **Chemotherapy** - systemic drug treatment, or combinations of these. The best approach depends on grade, size, and location. **You must discuss with an oncologist and neurosurgeon for a personalized treatment plan.**'
-        elif 'meningioma' in last_pred.lower():
-            return f'Treatment for **{last_pred}** may include: 1) **Observation** - if it\'s small and not causing symptoms, 2) **Surgery** - if it\'s growing or symptomatic, 3) **Radiation therapy** - in certain cases. Many meningiomas can be managed conservatively. **Consult a neurosurgeon to determine the best approach for your case.**'
-        elif 'pituitary' in last_pred.lower():
-            return f'Treatment for **{last_pred}** options include: 1) **Medication** - to control hormone levels, 2) **Surgery** - if the tumor is large or causing vision problems, 3) **Radiation therapy** - in some cases. **An endocrinologist and neurosurgeon can determine the best treatment strategy for you.**'
-        else:
-            return f'Treatment options for {last_pred} vary based on many factors. **Please consult with a qualified neurologist or oncologist to discuss the best treatment approach for your specific case.**'
+        if knowledge is not None and knowledge.chat.get('treatment'):
+            return knowledge.chat['treatment'].format(label=last_pred)
+        return f'Treatment options for {last_pred} vary based on many factors. **Please consult with a qualified neurologist or oncologist to discuss the best treatment approach for your specific case.**'
     
     # ===== PROGNOSIS/OUTCOME QUESTIONS =====
     if any(phrase in msg_lower for phrase in ['prognosis', 'survive', 'survival rate', 'outcome', 'how serious', 'will i be ok', 'recovery', 'long term', 'life expectancy']):
@@ -804,6 +998,15 @@ def rule_based_chat(message, last_pred=None, last_conf=None):
     if any(phrase in msg_lower for phrase in ['difference between', 'vs', 'versus', 'compare', 'what\'s the difference']):
         return f'To compare {last_pred} with other tumor types, I\'d be happy to help! Could you specify which tumor type you\'d like to compare it with? I can explain differences between glioma, meningioma, pituitary tumors, etc.'
     
+    # Generic brain tumor Q&A once no label-specific answer matched
+    if HAS_BRAIN_TUMOR_KB:
+        try:
+            answer = answer_question(message)
+            if answer and "specific question" not in answer.lower() and len(answer) > 20:
+                return answer
+        except Exception:
+            pass
+    
     # ===== GENERAL Q&A FALLBACK =====
     # If we don't match specific patterns, try to be helpful anyway
     if any(word in msg_lower for word in ['what', 'how', 'why', 'can', 'will', 'should', 'is']):
@@ -813,9 +1016,9 @@ def rule_based_chat(message, last_pred=None, last_conf=None):
     return f'You have **{last_pred}** detected in your scan with **{conf_percent:.1f}% confidence**. Feel free to ask me anything about this result - I can explain what it means, discuss treatment options, symptoms, prognosis, or anything else you\'d like to know. What would you like to learn about?'
 
 
-def llm_chat(message: str, last_pred: str = None, last_conf: float = None) -> str:
+async def llm_chat(message: str, last_pred: str = None, last_conf: float = None) -> str:
     """Call OpenAI ChatCompletion to answer the user's message, using last prediction as context."""
-    if openai is None or OPENAI_API_KEY is None:
+    if LLM_CLIENT is None:
         raise RuntimeError("OpenAI not configured")
 
     # Strong system prompt with tumor-specific context
@@ -867,16 +1070,14 @@ def llm_chat(message: str, last_pred: str = None, last_conf: float = None) -> st
     user_content = context + "\n\nUser's question: " + message
 
     try:
-        resp = openai.ChatCompletion.create(
-            model=OPENAI_MODEL,
-            messages=[
+        reply = await LLM_CLIENT.chat(
+            [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_content}
             ],
             max_tokens=500,
             temperature=0.3,  # Slightly higher for better explanation quality
         )
-        reply = resp['choices'][0]['message']['content'].strip()
         
         # Ensure safety disclaimer is included
         if "consult" not in reply.lower() and "professional" not in reply.lower():
@@ -888,6 +1089,61 @@ def llm_chat(message: str, last_pred: str = None, last_conf: float = None) -> st
         raise RuntimeError(f"OpenAI request failed: {e}")
 
 
+async def _index_prediction(session_id: str, label: str, confidence: float, top_k=None, probs=None):
+    if PREDICTION_INDEX is None:
+        return
+    try:
+        await asyncio.to_thread(PREDICTION_INDEX.record, session_id, label, confidence, MODEL_FINGERPRINT,
+                                str(OUTPUT_WRITER.session_dir(session_id)), top_k, probs)
+    except Exception as e:
+        logging.warning(f"Failed to index prediction for session {session_id}: {e}")
+
+
+async def _record_prediction(session_id: str, label: str, confidence: float, top_k=None, probs=None):
+    """Store the prediction as the session's last prediction (session store and prediction index)
+    and append its summary to the history."""
+    summary_text = f"Prediction: {label} (confidence: {confidence:.4f})"
+
+    async def _update_session():
+        try:
+            await SESSIONS.update(
+                session_id,
+                {'last_prediction': label, 'last_confidence': confidence, 'top_k': top_k, 'probs': probs},
+                [{'role': 'assistant', 'message': summary_text}],
+            )
+        except Exception as e:
+            logging.warning(f"Failed to append assistant message: {e}")
+
+    await asyncio.gather(_update_session(), _index_prediction(session_id, label, confidence, top_k, probs))
+
+
+async def _cached_prediction(cache_key: str, wait_cam: bool):
+    """Return a cached /predict response body (without session fields) or None on a miss.
+
+    If the CAM is still rendering, `cam_job_id` names its (shared) job; with `wait_cam`
+    the job is awaited like an inline CAM would be on a miss.
+    """
+    cached = await PREDICTION_CACHE.get(cache_key)
+    if cached is None:
+        return None
+    if cached.get('cam_image') is None:
+        # the CAM may still be rendering (or finished after the entry was cached)
+        job = CAM_JOBS.get(cached.get('cam_job_id') or '')
+        if job is None or job.status == 'failed':
+            return None
+        if wait_cam:
+            job = await CAM_JOBS.wait(job.job_id, CAM_MAX_WAIT)
+        if job.status == 'done':
+            cached['cam_image'] = job.result
+            cached['cam_job_id'] = None
+        elif wait_cam:
+            return None
+    else:
+        cached['cam_job_id'] = None
+    cached['cached'] = True
+    return cached
+
+
 @app.get('/', response_class=HTMLResponse)
 async def index(request: Request):
     intro_path = os.path.join(TEMPLATES_DIR, 'neuro_intro.html')
@@ -919,131 +1175,98 @@ async def index(request: Request):
 
 
 @app.post('/predict')
-async def predict(request: Request, image: UploadFile = File(...)):
+async def predict(request: Request, image: UploadFile = File(...), wait_cam: bool = False,
+                  cam_format: str = CAM_FORMAT):
+    """Classify an uploaded MRI.
+
+    By default the Grad-CAM overlay is rendered in the background and the response carries
+    `cam_job_id`; fetch it from `/predict/{cam_job_id}/cam`. Pass `?wait_cam=true` to get
+    `cam_image` inline in this response instead.
+
+    With `?cam_format=url` the response carries `cam_url` (`/outputs/<session_id>/cam.png`)
+    instead of the base64 `cam_image`; with a background job the URL serves the image once
+    the job is done.
+    """
+    if cam_format not in ('inline', 'url'):
+        return JSONResponse({'error': 'invalid_cam_format', 'message': 'cam_format must be inline or url.'},
+                            status_code=400)
+    if PREDICT_RATE_LIMIT_PER_MIN > 0:
+        client_key = request.cookies.get('session_id') or (request.client.host if request.client else 'anon')
+        quota = await PREDICT_LIMITER.hit(client_key)
+        if not quota.allowed:
+            return JSONResponse(
+                {'error': 'rate_limited', 'message': 'Prediction quota exceeded. Please try again later.'},
+                status_code=429,
+                headers={'Retry-After': str(max(1, int(quota.retry_after + 0.999)))},
+            )
     try:
         contents = await image.read()
-        pil = Image.open(io.BytesIO(contents)).convert('RGB')
 
         # Prefer TF model if available
         global last_prediction, last_confidence
         if tf_model is not None:
-            # Early MRI detection: reject non-MRI images before running the model
-            try:
-                if not _is_brain_image(pil):
-                    sid = await _get_or_create_session_id(request)
-                    resp_nb = {
-                        'is_brain': False,
-                        'message': 'Please upload a valid brain MRI image. Only grayscale MRI scans are supported.',
-                        'models_evaluation': MODELS_EVAL,
-                        'session_id': sid,
-                    }
-                    response = JSONResponse(resp_nb, status_code=400)
-                    # Save invalid message in session
-                    try:
-                        if redis_client is not None:
-                            s = await _redis_get_session(sid)
-                            s['last_prediction'] = resp_nb['message']
-                            s['last_confidence'] = 0.0
-                            await _redis_set_session(sid, s)
-                        else:
-                            SESSION_STORE.setdefault(sid, {})['last_prediction'] = resp_nb['message']
-                            SESSION_STORE.setdefault(sid, {})['last_confidence'] = 0.0
-                    except Exception as e:
-                        logging.warning(f"Failed to save invalid prediction to session: {e}")
-                    response.set_cookie('session_id', sid, httponly=True)
+            # repeated upload of the same scan: only redo the session bookkeeping
+            cache_key = None
+            if PREDICTION_CACHE is not None:
+                cache_key = content_key(contents, MODEL_FINGERPRINT)
+                cached = await _cached_prediction(cache_key, wait_cam)
+                if cached is not None:
+                    session_id = await _get_or_create_session_id(request)
+                    cached['session_id'] = session_id
+                    cam_job_id = cached.get('cam_job_id')
+                    # a still-rendering CAM is copied to this session's outputs when its job finishes
+                    if cam_job_id is not None and not CAM_JOBS.add_done_callback(
+                            cam_job_id, lambda b64, sid=session_id: _save_cam(sid, b64)):
+                        job = CAM_JOBS.get(cam_job_id)
+                        if job is not None and job.status == 'done':
+                            cached['cam_image'] = job.result
+                            cached['cam_job_id'] = cam_job_id = None
+                    await _persist_prediction(session_id, cached, save_cam=cam_job_id is None)
+                    await _record_prediction(session_id, cached['label'], cached['confidence'],
+                                             cached.get('top_k'), cached.get('probs'))
+                    if cam_format == 'url':
+                        cached = _with_cam_url(cached, session_id)
+                    response = JSONResponse(cached)
+                    response.set_cookie('session_id', session_id, httponly=True)
                     return response
-                # ensure the MRI is focused/centered on the brain region
-                try:
-                    # Disabled focus check to allow prediction on any brain image
-                    # if not _has_focus_area(pil):
-                    #     sid = await _get_or_create_session_id(request)
-                    #     resp_nb = {
-                    #         'is_brain': True,
-                    #         'message': 'invalid image',
-                    #         'models_evaluation': MODELS_EVAL,
-                    #         'session_id': sid,
-                    #     }
-                    #     response = JSONResponse(resp_nb, status_code=400)
-                    #     # Save invalid message in session
-                    #     try:
-                    #         if redis_client is not None:
-                    #             s = await _redis_get_session(sid)
-                    #             s['last_prediction'] = resp_nb['message']
-                    #             s['last_confidence'] = 0.0
-                    #             await _redis_set_session(sid, s)
-                    #         else:
-                    #             SESSION_STORE.setdefault(sid, {})['last_prediction'] = resp_nb['message']
-                    #             SESSION_STORE.setdefault(sid, {})['last_confidence'] = 0.0
-                    #     except Exception as e:
-                    #         logging.warning(f"Failed to save invalid prediction to session: {e}")
-                    #     response.set_cookie('session_id', sid, httponly=True)
-                    #     return response
-                    pass
-                except Exception:
-                    pass
-            except Exception:
-                # on error in validation, treat as invalid image
+
+            input_shape = MODEL_INPUT_SHAPE
+            # Single decode: validation statistics and the model tensor come from one stage
+            prep = await INFER_EXECUTOR.run(prepare_upload, contents, input_shape)
+            pil = prep['pil']
+            # Early MRI detection: reject non-MRI images before running the model
+            # (the _has_focus_area check stays disabled to allow prediction on any brain image)
+            if not prep['is_brain']:
+                message = ('Please upload a valid brain MRI image. Only grayscale MRI scans are supported.'
+                           if prep['error'] is None else 'invalid image')
                 sid = await _get_or_create_session_id(request)
                 resp_nb = {
                     'is_brain': False,
-                    'message': 'invalid image',
+                    'message': message,
                     'models_evaluation': MODELS_EVAL,
                     'session_id': sid,
                 }
                 response = JSONResponse(resp_nb, status_code=400)
                 # Save invalid message in session
                 try:
-                    if redis_client is not None:
-                        s = await _redis_get_session(sid)
-                        s['last_prediction'] = resp_nb['message']
-                        s['last_confidence'] = 0.0
-                        await _redis_set_session(sid, s)
-                    else:
-                        SESSION_STORE.setdefault(sid, {})['last_prediction'] = resp_nb['message']
-                        SESSION_STORE.setdefault(sid, {})['last_confidence'] = 0.0
+                    await SESSIONS.update(sid, {'last_prediction': resp_nb['message'], 'last_confidence': 0.0})
                 except Exception as e:
                     logging.warning(f"Failed to save invalid prediction to session: {e}")
                 response.set_cookie('session_id', sid, httponly=True)
                 return response
-            input_shape = None
-            try:
-                input_shape = (int(tf_model.inputs[0].shape[1]), int(tf_model.inputs[0].shape[2]))
-            except Exception:
-                input_shape = (150, 150)
 
-            arr = np.array(pil.resize(input_shape)).astype('float32') / 255.0
+            arr = prep['model_input']
             batched = np.expand_dims(arr, axis=0)
-            preds = tf_model.predict(batched, verbose=0)
+            fused_cam = None
+            if SERVING_MODE == 'fused':
+                preds, cams = await PREDICT_BATCHER.submit(arr)
+                fused_cam = cams[0]
+            else:
+                preds = await PREDICT_BATCHER.submit(arr)
             # normalize preds to 1D probs
             if preds is None:
                 return JSONResponse({'error': 'Model produced no output'}, status_code=500)
 
-            # If an alternate (LIME-trained) TF model is available, get its predictions and simple-average the probabilities
-            try:
-                if alt_tf_model is not None:
-                    alt_preds = alt_tf_model.predict(batched, verbose=0)
-                    # normalize alt_preds to shape (N, C)
-                    if alt_preds is not None:
-                        if alt_preds.ndim == 1 or (alt_preds.ndim == 2 and alt_preds.shape[-1] == 1):
-                            alt_probs = alt_preds.ravel()
-                            if alt_probs.size == 1:
-                                alt_probs = np.array([1 - alt_probs[0], alt_probs[0]])
-                        else:
-                            alt_probs = alt_preds[0]
-                        # ensure same length and average
-                        try:
-                            if alt_probs.shape == preds[0].shape:
-                                # use element-wise average of probability vectors
-                                probs = (preds[0] + alt_probs) / 2.0 if (preds.ndim > 1) else (preds + alt_probs) / 2.0
-                            else:
-                                # shapes differ — ignore alt model
-                                pass
-                        except Exception:
-                            pass
-            except Exception:
-                # ignore alternate model failures — continue with primary model
-                pass
-
             if preds.ndim == 1 or (preds.ndim == 2 and preds.shape[-1] == 1):
                 probs = preds.ravel()
                 # binary decision heuristic
@@ -1072,55 +1295,19 @@ async def predict(request: Request, image: UploadFile = File(...)):
                 top_k = []
                 probs_map = {}
 
-            # compute Grad-CAM using tf-keras-vis if available
-            cam_b64 = pil_to_base64(pil)
-            try:
-                from tf_keras_vis.gradcam import Gradcam
-                from tf_keras_vis.utils.scores import CategoricalScore
-                from tf_keras_vis.utils.model_modifiers import ReplaceToLinear
-                import tensorflow as tf
-                import cv2
-
-                score = CategoricalScore([pred_idx])
-                model_modifier = ReplaceToLinear()
-                penultimate_layer = None
-                for layer in reversed(tf_model.layers):
-                    try:
-                        if hasattr(layer, 'output') and len(layer.output.shape) == 4:
-                            penultimate_layer = layer.name
-                            break
-                    except Exception:
-                        continue
-
-                gradcam = Gradcam(tf_model, model_modifier=model_modifier)
-                cam = gradcam(score, batched, penultimate_layer=penultimate_layer)
-                heatmap = cam[0]
-                hm = heatmap - heatmap.min()
-                if hm.max() > 0:
-                    hm = hm / hm.max()
-                hm_resized = cv2.resize(hm, (arr.shape[1], arr.shape[0]))
-                heatmap_color = cv2.applyColorMap((hm_resized * 255).astype('uint8'), cv2.COLORMAP_JET)
-                heatmap_color = cv2.cvtColor(heatmap_color, cv2.COLOR_BGR2RGB)
-                overlay = (0.4 * heatmap_color / 255.0 + 0.6 * arr).clip(0, 1)
-                cam_pil = Image.fromarray((overlay * 255).astype('uint8'))
-                cam_b64 = pil_to_base64(cam_pil)
-            except Exception:
-                # fallback to original image base64
-                cam_b64 = pil_to_base64(pil)
-
-            # save into session store (Redis if available, otherwise in-memory)
             session_id = await _get_or_create_session_id(request)
-            try:
-                if redis_client is not None:
-                    s = await _redis_get_session(session_id)
-                    s['last_prediction'] = label
-                    s['last_confidence'] = confidence
-                    await _redis_set_session(session_id, s)
-                else:
-                    SESSION_STORE.setdefault(session_id, {})['last_prediction'] = label
-                    SESSION_STORE.setdefault(session_id, {})['last_confidence'] = confidence
-            except Exception as e:
-                logging.warning(f"Failed to save prediction to session: {e}")
+
+            # compute Grad-CAM overlay off the event loop, inline or as a background job
+            cam_b64 = None
+            cam_job_id = None
+            if wait_cam:
+                cam_b64 = await INFER_EXECUTOR.run(_compute_cam_b64, pil, arr, batched, pred_idx, fused_cam)
+            else:
+                async def on_done(b64, sid=session_id, key=cache_key):
+                    await _save_cam(sid, b64)
+                    if key is not None:
+                        await PREDICTION_CACHE.update(key, cam_image=b64, cam_job_id=None)
+                cam_job_id = CAM_JOBS.submit(_compute_cam_b64, pil, arr, batched, pred_idx, fused_cam, on_done=on_done)
 
             # Get comprehensive medical analysis
             medical_analysis = get_tumor_analysis(label, confidence)
@@ -1134,9 +1321,10 @@ async def predict(request: Request, image: UploadFile = File(...)):
                 'confidence': confidence,
                 'top_k': top_k,
                 'probs': probs_map,
-                'image_size': {'width': pil.width, 'height': pil.height},
+                'image_size': {'width': prep['width'], 'height': prep['height']},
                 'preprocessing': {'input_shape': input_shape, 'scale': 'pixel/255.0'},
                 'cam_image': cam_b64,
+                'cam_job_id': cam_job_id,
                 'session_id': session_id,
                 'explanation': None,
                 'explanation_messages': [],
@@ -1145,18 +1333,16 @@ async def predict(request: Request, image: UploadFile = File(...)):
                 'lifestyle_recommendations': lifestyle_recs
             }
 
-            # generate a safe explanation (LLM-enhanced if OPENAI configured)
+            # generate a safe explanation (LLM-enhanced if OPENAI configured) and the suggested
+            # Q&A; they are independent LLM round trips, so run them concurrently
+            label_idx = str(pred_idx) if 'pred_idx' in locals() else None
+            expl, qa = await asyncio.gather(
+                llm_explanation(label_idx, label, confidence, top_k, probs_map),
+                _build_prediction_qa(label, confidence, top_k),
+                return_exceptions=True,
+            )
             try:
-                label_idx = str(pred_idx) if 'pred_idx' in locals() else None
-                label_name = label
-                if openai is not None and OPENAI_API_KEY is not None:
-                    try:
-                        expl = llm_explanation(label_idx, label_name, confidence, top_k, probs_map)
-                    except Exception:
-                        expl = _rule_explanation(label_name, confidence)
-                else:
-                    expl = _rule_explanation(label_name, confidence)
-                resp['explanation'] = expl
+                resp['explanation'] = expl if isinstance(expl, str) else _rule_explanation(label, confidence)
                 
                 # Split explanation into conversational chat messages
                 resp['explanation_messages'] = _split_explanation_to_messages(label, confidence, medical_analysis)
@@ -1166,63 +1352,29 @@ async def predict(request: Request, image: UploadFile = File(...)):
 
             # include which model file was used and any evaluation summary available
             try:
-                resp['used_model'] = model_path if model_path is not None else None
+                resp['used_model'] = USED_MODEL
                 resp['models_evaluation'] = MODELS_EVAL
             except Exception:
                 resp['used_model'] = None
                 resp['models_evaluation'] = {}
 
             # add a short list of suggested Q&A (assistant-style answers) about the prediction
-            try:
-                resp['qa'] = _build_prediction_qa(label, confidence, top_k)
-            except Exception:
-                resp['qa'] = []
+            resp['qa'] = qa if isinstance(qa, list) else []
 
-            # persist predict outputs to disk under outputs/<session_id>/
-            try:
-                out_dir = pathlib.Path('outputs') / session_id
-                out_dir.mkdir(parents=True, exist_ok=True)
-                # write full JSON
-                with open(out_dir / 'predict.json', 'w', encoding='utf-8') as jf:
-                    json.dump(resp, jf, ensure_ascii=False, indent=2)
-                # write cam image as PNG (decode base64)
-                try:
-                    cam_bytes = base64.b64decode(cam_b64)
-                    with open(out_dir / 'cam.png', 'wb') as imf:
-                        imf.write(cam_bytes)
-                except Exception:
-                    # fallback: save original uploaded image
-                    pil.save(out_dir / 'cam.png')
-            except Exception:
-                # don't fail the request if disk persistence fails
-                pass
+            # persist predict outputs under outputs/<session_id>/ behind the response
+            # (background CAM jobs queue their own PNG)
+            await _persist_prediction(session_id, resp, save_cam=cam_job_id is None)
 
             # append an assistant message summarizing the prediction into the session history
-            try:
-                summary_text = f"Prediction: {label} (confidence: {confidence:.4f})"
-                try:
-                    if redis_client is not None:
-                        s = await _redis_get_session(session_id)
-                        hist = s.get('history', [])
-                        hist.append({'role': 'assistant', 'message': summary_text})
-                        s['history'] = hist
-                        s['last_prediction'] = label
-                        s['last_confidence'] = confidence
-                        await _redis_set_session(session_id, s)
-                    else:
-                        s = SESSION_STORE.setdefault(session_id, {})
-                        hist = s.get('history') or []
-                        hist.append({'role': 'assistant', 'message': summary_text})
-                        s['history'] = hist
-                        s['last_prediction'] = label
-                        s['last_confidence'] = confidence
-                except Exception as e:
-                    logging.warning(f"Failed to append assistant message: {e}")
-            except Exception:
-                pass
+            await _record_prediction(session_id, label, confidence, top_k, probs_map)
+
+            # cache everything except per-session fields for repeated uploads of the same scan
+            if cache_key is not None:
+                cacheable = {k: v for k, v in resp.items() if k != 'session_id'}
+                await PREDICTION_CACHE.set(cache_key, cacheable)
 
             # now create the response and set cookie
-            response = JSONResponse(resp)
+            response = JSONResponse(_with_cam_url(resp, session_id) if cam_format == 'url' else resp)
             response.set_cookie('session_id', session_id, httponly=True)
             return response
 
@@ -1239,13 +1391,97 @@ async def predict(request: Request, image: UploadFile = File(...)):
 
 
 
+@app.get('/predict/{job_id}/cam')
+async def predict_cam(job_id: str, wait: float = 0.0, cam_format: str = CAM_FORMAT):
+    """Return the Grad-CAM result of a background job; `wait` long-polls up to CAM_MAX_WAIT seconds.
+
+    With `?cam_format=url` only the job status is returned; load the image from the
+    `cam_url` given by /predict once the status is `done`.
+    """
+    job = await CAM_JOBS.wait(job_id, min(max(wait, 0.0), CAM_MAX_WAIT))
+    if job is None:
+        return JSONResponse({'error': 'unknown_job', 'message': 'No CAM job with this id (it may have expired).'}, status_code=404)
+    body = job.to_dict()
+    if job.status == 'done':
+        if cam_format != 'url':
+            body['cam_image'] = job.result
+        return JSONResponse(body)
+    if job.status == 'failed':
+        return JSONResponse(body, status_code=500)
+    return JSONResponse(body, status_code=202)
+
+
+# path -> ((inode, mtime_ns, size), etag): a file's content hash is computed once per version
+_FILE_ETAGS: Dict[str, Any] = {}
+
+
+def _strong_etag(data: bytes) -> str:
+    return '"' + hashlib.sha256(data).hexdigest()[:32] + '"'
+
+
+def _file_etag(path: pathlib.Path) -> Optional[str]:
+    """Content ETag of `path` (None if missing); atomic replaces give every version a new inode."""
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    version = (st.st_ino, st.st_mtime_ns, st.st_size)
+    known = _FILE_ETAGS.get(str(path))
+    if known is not None and known[0] == version:
+        return known[1]
+    try:
+        etag = _strong_etag(path.read_bytes())
+    except OSError:
+        return None
+    if len(_FILE_ETAGS) >= 4096:
+        _FILE_ETAGS.clear()
+    _FILE_ETAGS[str(path)] = (version, etag)
+    return etag
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    # If-None-Match uses weak comparison
+    return etag in (tag.strip().removeprefix('W/') for tag in if_none_match.split(','))
+
+
+@app.get('/outputs/{session_id}/cam.png')
+async def output_cam(session_id: str, request: Request):
+    """Serve a session's Grad-CAM overlay with a strong content ETag (304 on If-None-Match).
+
+    A CAM that is still queued for writing is served from memory, otherwise the file is
+    sent with FileResponse.
+    """
+    not_found = JSONResponse({'error': 'not_found', 'message': 'No CAM image for this session (yet).'}, status_code=404)
+    if not _SAFE_SESSION_ID.match(session_id):
+        return not_found
+    path = None
+    data = OUTPUT_WRITER.pending(session_id, 'cam.png')
+    if data is not None:
+        etag = _strong_etag(data)
+    else:
+        path = await asyncio.to_thread(OUTPUT_WRITER.find, session_id, 'cam.png')
+        etag = await asyncio.to_thread(_file_etag, path) if path is not None else None
+        if etag is None:
+            return not_found
+    headers = {'ETag': etag, 'Cache-Control': CAM_CACHE_CONTROL}
+    if _etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers=headers)
+    if data is not None:
+        return Response(data, media_type='image/png', headers=headers)
+    return FileResponse(path, media_type='image/png', headers=headers)
+
+
 @app.post('/chat')
 async def chat(req: Request):
     body = await req.json()
     msg = body.get('message')
     
     # Get or create session ID
-    session_id = req.cookies.get('session_id')
+    session_id = _session_cookie(req)
     if not session_id:
         session_id = str(uuid.uuid4())
     
@@ -1253,10 +1489,7 @@ async def chat(req: Request):
     last_pred = None
     last_conf = None
     if session_id:
-        if redis_client is not None:
-            s = await _redis_get_session(session_id)
-        else:
-            s = SESSION_STORE.get(session_id, {})
+        s = await SESSIONS.get_fields(session_id, 'last_prediction', 'last_confidence')
         last_pred = s.get('last_prediction')
         last_conf = s.get('last_confidence')
 
@@ -1272,19 +1505,7 @@ async def chat(req: Request):
                 if session_id:
                     entry_user = {'role': 'user', 'message': msg}
                     entry_assistant = {'role': 'assistant', 'message': reply}
-                    if redis_client is not None:
-                        s = await _redis_get_session(session_id)
-                        hist = s.get('history', [])
-                        hist.append(entry_user)
-                        hist.append(entry_assistant)
-                        s['history'] = hist
-                        await _redis_set_session(session_id, s)
-                    else:
-                        s = SESSION_STORE.setdefault(session_id, {})
-                        hist = s.get('history') or []
-                        hist.append(entry_user)
-                        hist.append(entry_assistant)
-                        s['history'] = hist
+                    await SESSIONS.update(session_id, history=[entry_user, entry_assistant])
                 response = JSONResponse({'reply': reply})
                 response.set_cookie('session_id', session_id, httponly=True)
                 return response
@@ -1295,19 +1516,7 @@ async def chat(req: Request):
                 if session_id:
                     entry_user = {'role': 'user', 'message': msg}
                     entry_assistant = {'role': 'assistant', 'message': reply}
-                    if redis_client is not None:
-                        s = await _redis_get_session(session_id)
-                        hist = s.get('history', [])
-                        hist.append(entry_user)
-                        hist.append(entry_assistant)
-                        s['history'] = hist
-                        await _redis_set_session(session_id, s)
-                    else:
-                        s = SESSION_STORE.setdefault(session_id, {})
-                        hist = s.get('history') or []
-                        hist.append(entry_user)
-                        hist.append(entry_assistant)
-                        s['history'] = hist
+                    await SESSIONS.update(session_id, history=[entry_user, entry_assistant])
                 response = JSONResponse({'reply': reply})
                 response.set_cookie('session_id', session_id, httponly=True)
                 return response
@@ -1326,10 +1535,10 @@ async def chat(req: Request):
             logger.info('Rate limit exceeded for session %s', session_id)
             reply = 'Rate limit exceeded. Please try again later.'
         else:
-            use_llm = LLM_ENABLED and openai is not None and OPENAI_API_KEY is not None
+            use_llm = LLM_ENABLED and LLM_CLIENT is not None
             if use_llm:
                 try:
-                    reply = llm_chat(msg, last_pred, last_conf)
+                    reply = await llm_chat(msg, last_pred, last_conf)
                 except Exception as e:
                     logger.warning('LLM call failed: %s', e)
                     reply = rule_based_chat(msg, last_pred, last_conf)
@@ -1340,29 +1549,7 @@ async def chat(req: Request):
     if session_id:
         entry_user = {'role': 'user', 'message': msg}
         entry_assistant = {'role': 'assistant', 'message': reply}
-        if redis_client is not None:
-            s = await _redis_get_session(session_id)
-            hist = s.get('history', [])
-            hist.append(entry_user)
-            hist.append(entry_assistant)
-            s['history'] = hist
-            # keep last_prediction/last_confidence if present
-            if last_pred is not None:
-                s['last_prediction'] = last_pred
-            if last_conf is not None:
-                s['last_confidence'] = last_conf
-            await _redis_set_session(session_id, s)
-        else:
-            s = SESSION_STORE.setdefault(session_id, {})
-            hist = s.get('history') or []
-            hist.append(entry_user)
-            hist.append(entry_assistant)
-            s['history'] = hist
-            # Keep prediction in session
-            if last_pred is not None:
-                s['last_prediction'] = last_pred
-            if last_conf is not None:
-                s['last_confidence'] = last_conf
+        await SESSIONS.update(session_id, history=[entry_user, entry_assistant])
 
     response = JSONResponse({'reply': reply})
     response.set_cookie('session_id', session_id, httponly=True)
@@ -1370,15 +1557,16 @@ async def chat(req: Request):
 
 
 @app.get('/session')
-async def get_session(request: Request):
-    """Return the session object for the requesting client (based on cookie)."""
-    session_id = request.cookies.get('session_id')
+async def get_session(request: Request, limit: int = SESSION_HISTORY_WINDOW):
+    """Return the session object for the requesting client (based on cookie).
+
+    `history` holds only the `limit` most recent entries (at most SESSION_HISTORY_MAX).
+    """
+    session_id = _session_cookie(request)
     if not session_id:
         return JSONResponse({'error': 'no session'}, status_code=404)
-    if redis_client is not None:
-        s = await _redis_get_session(session_id)
-    else:
-        s = SESSION_STORE.get(session_id, {})
+    limit = max(1, min(limit, SESSION_HISTORY_MAX))
+    s = await SESSIONS.get(session_id, limit=limit)
     return JSONResponse({'session_id': session_id, 'session': s})
 
 
@@ -1388,38 +1576,29 @@ async def explain(request: Request):
     
     Only works for valid brain MRI predictions - rejects invalid images and non-medical images.
     """
-    session_id = request.cookies.get('session_id')
+    session_id = _session_cookie(request)
     if not session_id:
         return JSONResponse({'error': 'no session'}, status_code=400)
 
-    # rate-limit LLM usage per session
-    allowed = await _llm_check_and_increment(session_id)
-    if not allowed:
-        return JSONResponse({'error': 'rate_limited', 'message': 'Rate limit exceeded. Please try again later.'}, status_code=429)
-
     # fetch last prediction info from session or outputs file
-    if redis_client is not None:
-        s = await _redis_get_session(session_id)
-    else:
-        s = SESSION_STORE.get(session_id, {})
+    s = await SESSIONS.get_fields(session_id, 'last_prediction', 'last_confidence', 'top_k', 'probs')
 
     last_pred = s.get('last_prediction')
     last_conf = s.get('last_confidence')
     top_k = s.get('top_k')
     probs_map = s.get('probs')
 
-    # try to read persisted predict.json for richer context
-    try:
-        pj = pathlib.Path('outputs') / session_id / 'predict.json'
-        if pj.exists():
-            with open(pj, 'r', encoding='utf-8') as f:
-                pjdata = json.load(f)
-                last_pred = last_pred or pjdata.get('label')
-                last_conf = last_conf or pjdata.get('confidence')
-                top_k = top_k or pjdata.get('top_k')
-                probs_map = probs_map or pjdata.get('probs')
-    except Exception:
-        pass
+    # fill gaps (e.g. an expired session) from the prediction index
+    if PREDICTION_INDEX is not None and not (last_pred and last_conf and top_k and probs_map):
+        try:
+            indexed = await asyncio.to_thread(PREDICTION_INDEX.latest, session_id)
+        except Exception:
+            indexed = None
+        if indexed is not None:
+            last_pred = last_pred or indexed.get('label')
+            last_conf = last_conf or indexed.get('confidence')
+            top_k = top_k or indexed.get('top_k')
+            probs_map = probs_map or indexed.get('probs')
 
     if not last_pred:
         return JSONResponse({'error': 'no_prediction', 'message': 'No prior prediction found for this session. Please upload a brain MRI image first.'}, status_code=400)
@@ -1429,439 +1608,36 @@ async def explain(request: Request):
         return JSONResponse({'error': 'invalid_image', 'message': 'Invalid image - comprehensive explanation only available for valid brain MRI images.'}, status_code=400)
 
     # Only allow explanations for actual tumor types or no_tumor
-    valid_predictions = ['glioma_tumor', 'meningioma_tumor', 'pituitary_tumor', 'no_tumor']
-    if last_pred.lower() not in valid_predictions:
+    label = KNOWLEDGE_BASE.canonical(last_pred)
+    if label is None or label not in EXPLAIN_TEMPLATES:
         return JSONResponse({'error': 'invalid_prediction', 'message': 'Invalid prediction type - comprehensive explanation only available for brain tumor classifications.'}, status_code=400)
 
-    # Build comprehensive explanation with all required details
-    conf_percent = (last_conf or 0) * 100
-    
-    # 1. TUMOR PERCENTAGE (Confidence Score)
-    tumor_percentage = {
-        'confidence': f"{conf_percent:.1f}%",
-        'interpretation': f"Model confidence in this prediction is {conf_percent:.1f}%"
-    }
-    
-    # 2. DISEASE INFORMATION - Define for each tumor type
-    disease_info = {}
-    if 'glioma' in last_pred.lower():
-        disease_info = {
-            'name': 'Glioma Tumor',
-            'description': 'Glioma is a type of brain tumor that originates from glial cells (supportive cells of the brain and nervous system).',
-            'types': 'Can be classified as low-grade (slow-growing) or high-grade (aggressive)',
-            'prevalence': 'Most common type of primary brain tumor',
-            'origin': 'Arises from astrocytes, oligodendrocytes, or ependymal cells'
-        }
-    elif 'meningioma' in last_pred.lower():
-        disease_info = {
-            'name': 'Meningioma Tumor',
-            'description': 'Meningioma is a tumor arising from the meninges - the protective membranes surrounding the brain and spinal cord.',
-            'types': 'Typically benign (non-cancerous) but can be atypical or malignant',
-            'prevalence': 'Accounts for about 30% of primary brain tumors',
-            'origin': 'Arises from the dura mater, arachnoid mater layers'
-        }
-    elif 'pituitary' in last_pred.lower():
-        disease_info = {
-            'name': 'Pituitary Tumor',
-            'description': 'Pituitary tumor originates from the pituitary gland - a small gland at the base of the brain that regulates hormones.',
-            'types': 'Can be hormone-secreting (functional) or non-secreting (non-functional)',
-            'prevalence': 'Accounts for 10-15% of primary brain tumors',
-            'origin': 'Arises from pituitary gland cells'
-        }
-    elif 'no_tumor' in last_pred.lower() or 'no tumor' in last_pred.lower():
-        disease_info = {
-            'name': 'No Tumor Detected',
-            'description': 'The brain MRI scan shows no detectable tumor.',
-            'status': 'Normal brain tissue detected',
-            'note': 'This is a positive result indicating normal brain structure'
-        }
-    
-    # 3. SYMPTOMS - Define for each tumor type
-    symptoms = {}
-    if 'glioma' in last_pred.lower():
-        symptoms = {
-            'common': ['Headaches (often progressive)', 'Seizures', 'Vision or hearing loss', 'Balance and coordination problems', 'Cognitive changes'],
-            'severe': ['Weakness or numbness in limbs', 'Difficulty speaking', 'Memory loss', 'Behavioral changes'],
-            'note': 'Symptoms depend on tumor location, size, and grade. Not all patients experience symptoms.'
-        }
-    elif 'meningioma' in last_pred.lower():
-        symptoms = {
-            'common': ['Headaches', 'Vision problems (especially peripheral)', 'Hearing loss', 'Nausea and vomiting'],
-            'severe': ['Weakness in arms or legs', 'Cognitive difficulties', 'Personality changes', 'Loss of balance'],
-            'note': 'Many slow-growing meningiomas may not cause symptoms initially.'
-        }
-    elif 'pituitary' in last_pred.lower():
-        symptoms = {
-            'hormonal': ['Excessive growth (acromegaly)', 'Excessive milk production', 'Irregular menstruation', 'Sexual dysfunction', 'Fatigue and weakness'],
-            'local': ['Headaches', 'Vision loss (especially peripheral)', 'Double vision'],
-            'note': 'Symptoms vary based on hormone type and tumor size.'
-        }
-    elif 'no_tumor' in last_pred.lower() or 'no tumor' in last_pred.lower():
-        symptoms = {
-            'status': 'No tumor-related symptoms expected',
-            'note': 'Normal brain tissue indicates no pathology detected'
-        }
-    
-    # 4. SIDE EFFECTS / TREATMENT SIDE EFFECTS
-    side_effects = {}
-    if 'glioma' in last_pred.lower():
-        side_effects = {
-            'surgery': ['Infection risk', 'Brain edema', 'Neurological deficits', 'Memory or speech issues', 'Bleeding'],
-            'radiation': ['Hair loss', 'Scalp irritation', 'Fatigue', 'Cognitive changes', 'Secondary cancer risk (long-term)'],
-            'chemotherapy': ['Nausea and vomiting', 'Hair loss', 'Bone marrow suppression', 'Infection risk', 'Cognitive effects'],
-            'note': 'Side effects vary based on treatment type and individual factors'
-        }
-    elif 'meningioma' in last_pred.lower():
-        side_effects = {
-            'surgery': ['Infection', 'Bleeding', 'Brain edema', 'Temporary neurological changes'],
-            'radiation': ['Hair loss', 'Fatigue', 'Skin irritation', 'Cognitive changes (rare)'],
-            'observation': ['Minimal side effects with monitoring approach'],
-            'note': 'Many meningiomas can be managed conservatively with observation'
-        }
-    elif 'pituitary' in last_pred.lower():
-        side_effects = {
-            'medication': ['Nausea', 'Fatigue', 'Dizziness', 'Hormonal imbalances'],
-            'surgery': ['Bleeding', 'Infection', 'Cerebrospinal fluid leak', 'Hormonal imbalances', 'Vision changes'],
-            'radiation': ['Fatigue', 'Hair loss', 'Cognitive changes (rare)', 'Secondary hormone deficiencies'],
-            'note': 'Specific side effects depend on treatment approach'
-        }
-    
-    # 5. DOCTOR RECOMMENDATION
-    doctor_recommendation = {
-        'urgency': 'Schedule appointment with a neurologist or neurosurgeon',
-        'recommendations': [
-            '1. Get professional medical evaluation from a qualified neurologist or radiologist',
-            '2. Share this MRI scan and analysis with your healthcare provider',
-            '3. Discuss treatment options if needed (surgery, radiation, medication, monitoring)',
-            f'4. Get a second opinion from another medical specialist',
-            '5. Ask about follow-up imaging schedule',
-            '6. Discuss symptom management strategies',
-            '7. Create a treatment plan with your medical team'
-        ],
-        'important_note': '⚠️ This is an AI-generated prediction and NOT a medical diagnosis. Professional medical evaluation is ESSENTIAL for proper diagnosis and treatment planning.',
-        'emergency': 'Seek emergency care if experiencing severe headaches, loss of consciousness, severe vision loss, or difficulty breathing.'
-    }
-    
-    # Compile comprehensive explanation with better formatting
-    comprehensive_explanation = f"""
-╔══════════════════════════════════════════════════════════════════════════════╗
-║          COMPREHENSIVE BRAIN MRI ANALYSIS REPORT                            ║
-║                     Professional Medical Analysis                           ║
-╚══════════════════════════════════════════════════════════════════════════════╝
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-📊 1. TUMOR DETECTION CONFIDENCE (Model Accuracy)
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-   Confidence Score: {tumor_percentage['confidence']}
-   
-   {tumor_percentage['interpretation']}
-   
-   • What this means: The AI model has analyzed your brain MRI and is 
-     {conf_percent:.1f}% confident in its assessment.
-   • Higher percentage = Higher certainty in the prediction
-   • However, this is NOT a medical diagnosis - professional evaluation needed
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-🔬 2. DISEASE INFORMATION
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-   Detected Condition: {disease_info.get('name', 'Unknown')}
-   
-   Description:
-   {disease_info.get('description', 'N/A')}
-   
-   {f"Classification: {disease_info.get('types', disease_info.get('status', 'N/A'))}" if 'types' in disease_info or 'status' in disease_info else ''}
-   {f"Source/Origin: {disease_info.get('origin', '')}" if 'origin' in disease_info else ''}
-   {f"Prevalence: {disease_info.get('prevalence', '')}" if 'prevalence' in disease_info else ''}
-   
-   Key Information:
-   {format_disease_details(disease_info)}
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-⚠️  3. COMMON SYMPTOMS & WARNING SIGNS
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-{format_symptoms_detailed(symptoms)}
-
-   Important Note:
-   • Not all patients experience all symptoms
-   • Symptoms depend on tumor location, size, and type
-   • Presence of symptoms doesn't confirm diagnosis
-   • Absence of symptoms doesn't mean it's not serious
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-💊 4. POTENTIAL SIDE EFFECTS & TREATMENT CONSIDERATIONS
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-{format_side_effects_detailed(side_effects)}
-
-   Treatment Selection:
-   • Treatment choice depends on: tumor size, location, grade, patient age, 
-     overall health, and patient preferences
-   • Multiple treatment options may be available
-   • Your doctor will recommend the best approach for your specific case
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-🏥 5. URGENT: DOCTOR VISIT RECOMMENDATIONS
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-   RECOMMENDED ACTION: {doctor_recommendation['urgency']}
-   
-   PRIORITY TASKS:
-   ✓ {doctor_recommendation['recommendations'][0] if len(doctor_recommendation['recommendations']) > 0 else ''}
-   ✓ {doctor_recommendation['recommendations'][1] if len(doctor_recommendation['recommendations']) > 1 else ''}
-   ✓ {doctor_recommendation['recommendations'][2] if len(doctor_recommendation['recommendations']) > 2 else ''}
-   ✓ {doctor_recommendation['recommendations'][3] if len(doctor_recommendation['recommendations']) > 3 else ''}
-   ✓ {doctor_recommendation['recommendations'][4] if len(doctor_recommendation['recommendations']) > 4 else ''}
-   ✓ {doctor_recommendation['recommendations'][5] if len(doctor_recommendation['recommendations']) > 5 else ''}
-   ✓ {doctor_recommendation['recommendations'][6] if len(doctor_recommendation['recommendations']) > 6 else ''}
-   
-   SPECIALIST TO CONSULT:
-   • Neurologist (specialist in nervous system disorders)
-   • Neurosurgeon (if surgery is considered)
-   • Oncologist (if cancer-related)
-   • Radiologist (for imaging interpretation)
-   
-   WHAT TO BRING TO YOUR APPOINTMENT:
-   • This MRI scan and analysis
-   • Any previous medical records
-   • List of current medications
-   • Family medical history
-   • Symptom diary
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-🚨 EMERGENCY WARNING SIGNS - SEEK IMMEDIATE MEDICAL ATTENTION
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-If you experience ANY of the following, go to the emergency room immediately:
-   • Severe, sudden headache (worst headache of your life)
-   • Loss of consciousness or fainting
-   • Severe vision loss or eye pain
-   • Difficulty breathing or swallowing
-   • Severe weakness or paralysis
-   • Uncontrollable seizures
-   • Severe confusion or inability to communicate
-   • Significant change in mental status
-   • Difficulty walking or loss of balance
-
-Call Emergency Services (911 or your local emergency number) if these occur.
-
-╔══════════════════════════════════════════════════════════════════════════════╗
-║                          IMPORTANT DISCLAIMERS                              ║
-╠══════════════════════════════════════════════════════════════════════════════╣
-║ ⚠️  CRITICAL LEGAL NOTICE:                                                   ║
-║                                                                              ║
-║ • This analysis is AI-generated and is NOT a medical diagnosis              ║
-║ • It is NOT a substitute for professional medical evaluation                ║
-║ • AI predictions can be incorrect - professional confirmation is ESSENTIAL  ║
-║ • Only a qualified medical professional can provide a diagnosis             ║
-║ • Treatment decisions MUST be made with your healthcare provider            ║
-║ • Do NOT delay seeking medical care based on this analysis                  ║
-║ • Always consult with a licensed physician or medical specialist            ║
-║ • This information is for educational purposes only                         ║
-║                                                                              ║
-║ Your health and safety are paramount. Seek professional medical advice.     ║
-╚══════════════════════════════════════════════════════════════════════════════╝
-
-Generated: {time.strftime('%Y-%m-%d %H:%M:%S')}
-Report Type: Comprehensive AI-Assisted Analysis
-Confidence Level: {conf_percent:.1f}%
-"""
-    
+    # the report depends only on the label and the displayed confidence; a client that
+    # already holds it gets a 304 before anything is rendered or appended to the history
+    confidence = EXPLAIN_TEMPLATES.confidence_text(last_conf)
+    headers = {'ETag': EXPLAIN_TEMPLATES.etag(label, confidence), 'Cache-Control': 'private, no-cache'}
+    if _etag_matches(request.headers.get('if-none-match'), headers['ETag']):
+        return Response(status_code=304, headers=headers)
+
+    # rate-limit LLM usage per session
+    allowed = await _llm_check_and_increment(session_id)
+    if not allowed:
+        return JSONResponse({'error': 'rate_limited', 'message': 'Rate limit exceeded. Please try again later.'}, status_code=429)
+
     # Store comprehensive report in session for future reference
     try:
-        entry = {'role': 'assistant', 'message': f"Comprehensive Explanation Report\n\n{comprehensive_explanation}"}
-        if redis_client is not None:
-            s = await _redis_get_session(session_id)
-            hist = s.get('history', [])
-            hist.append(entry)
-            s['history'] = hist
-            await _redis_set_session(session_id, s)
-        else:
-            s = SESSION_STORE.setdefault(session_id, {})
-            hist = s.get('history') or []
-            hist.append(entry)
-            s['history'] = hist
+        report = EXPLAIN_TEMPLATES.report(label, confidence, time.strftime('%Y-%m-%d %H:%M:%S'))
+        entry = {'role': 'assistant', 'message': f"Comprehensive Explanation Report\n\n{report}"}
+        await SESSIONS.update(session_id, history=[entry])
     except Exception as e:
         logger.error(f"Failed to store explain in history: {e}")
-    
+
     # Return detailed explanation as individual colored sections
-    detailed_sections = [
-        {
-            'type': 'analysis',
-            'title': '📊 TUMOR DETECTION CONFIDENCE',
-            'text': f"""Confidence Score: {tumor_percentage['confidence']}
+    return Response(EXPLAIN_TEMPLATES.body(label, confidence), media_type='application/json', headers=headers)
 
-{tumor_percentage['interpretation']}
 
-• What this means: The AI model has analyzed your brain MRI and is {conf_percent:.1f}% confident in its assessment.
-• Higher percentage = Higher certainty in the prediction
-• However, this is NOT a medical diagnosis - professional evaluation needed"""
-        },
-        {
-            'type': 'disease',
-            'title': '🔬 DISEASE INFORMATION',
-            'text': f"""Detected Condition: {disease_info.get('name', 'Unknown')}
 
-Description:
-{disease_info.get('description', 'N/A')}
 
-{f"Classification: {disease_info.get('types', disease_info.get('status', 'N/A'))}" if 'types' in disease_info or 'status' in disease_info else ''}
-{f"Source/Origin: {disease_info.get('origin', '')}" if 'origin' in disease_info else ''}
-{f"Prevalence: {disease_info.get('prevalence', '')}" if 'prevalence' in disease_info else ''}"""
-        },
-        {
-            'type': 'symptoms',
-            'title': '⚠️ COMMON SYMPTOMS & WARNING SIGNS',
-            'text': f"""{format_symptoms_detailed(symptoms)}
-
-Important Note:
-• Not all patients experience all symptoms
-• Symptoms depend on tumor location, size, and type
-• Presence of symptoms doesn't confirm diagnosis
-• Absence of symptoms doesn't mean it's not serious"""
-        },
-        {
-            'type': 'treatment',
-            'title': '💊 POTENTIAL SIDE EFFECTS & TREATMENT',
-            'text': f"""{format_side_effects_detailed(side_effects)}
-
-Treatment Selection:
-• Treatment choice depends on: tumor size, location, grade, patient age, overall health, and patient preferences
-• Multiple treatment options may be available
-• Your doctor will recommend the best approach for your specific case"""
-        },
-        {
-            'type': 'recommendation',
-            'title': '🏥 DOCTOR VISIT RECOMMENDATIONS',
-            'text': f"""RECOMMENDED ACTION: {doctor_recommendation['urgency']}
-
-PRIORITY TASKS:
-✓ Get professional medical evaluation from a qualified neurologist or radiologist
-✓ Share this MRI scan and analysis with your healthcare provider
-✓ Discuss treatment options if needed (surgery, radiation, medication, monitoring)
-✓ Get a second opinion from another medical specialist
-✓ Ask about follow-up imaging schedule
-✓ Discuss symptom management strategies
-✓ Create a treatment plan with your medical team
-
-SPECIALIST TO CONSULT:
-• Neurologist (specialist in nervous system disorders)
-• Neurosurgeon (if surgery is considered)
-• Oncologist (if cancer-related)
-• Radiologist (for imaging interpretation)
-
-⚠️ CRITICAL: This is an AI-generated prediction and NOT a medical diagnosis. Professional medical evaluation is ESSENTIAL."""
-        }
-    ]
-    
-    return JSONResponse({'explanation_sections': detailed_sections})
-
-
-def format_disease_details(info):
-    """Format disease information with better detail."""
-    details = []
-    if 'types' in info:
-        details.append(f"   • Type: {info['types']}")
-    if 'origin' in info:
-        details.append(f"   • Origin: {info['origin']}")
-    if 'prevalence' in info:
-        details.append(f"   • Prevalence: {info['prevalence']}")
-    if 'status' in info:
-        details.append(f"   • Status: {info['status']}")
-    if 'note' in info:
-        details.append(f"   • Note: {info['note']}")
-    return '\n'.join(details) if details else "   • No additional details available"
-
-
-def format_symptoms_detailed(symptoms):
-    """Format symptoms with detailed organization."""
-    if not symptoms or len(symptoms) == 0:
-        return "   No specific symptoms expected for this condition."
-    
-    result = []
-    if 'common' in symptoms:
-        result.append("   COMMON SYMPTOMS:")
-        for item in symptoms.get('common', []):
-            result.append(f"      □ {item}")
-    
-    if 'severe' in symptoms:
-        result.append("\n   SEVERE/URGENT SYMPTOMS:")
-        for item in symptoms.get('severe', []):
-            result.append(f"      □ {item}")
-    
-    if 'hormonal' in symptoms:
-        result.append("\n   HORMONAL SYMPTOMS:")
-        for item in symptoms.get('hormonal', []):
-            result.append(f"      □ {item}")
-    
-    if 'local' in symptoms:
-        result.append("\n   LOCAL SYMPTOMS:")
-        for item in symptoms.get('local', []):
-            result.append(f"      □ {item}")
-    
-    if 'status' in symptoms:
-        result.append(f"\n   STATUS: {symptoms['status']}")
-    
-    if 'note' in symptoms:
-        result.append(f"\n   {symptoms['note']}")
-    
-    return '\n'.join(result) if result else "   No specific symptoms listed"
-
-
-def format_side_effects_detailed(effects):
-    """Format side effects with detailed organization."""
-    if not effects or len(effects) == 0:
-        return "   • No treatment side effects expected for this condition."
-    
-    result = []
-    
-    if 'surgery' in effects:
-        result.append("   SURGICAL PROCEDURE SIDE EFFECTS:")
-        for item in effects.get('surgery', []):
-            result.append(f"      • {item}")
-    
-    if 'radiation' in effects:
-        result.append("\n   RADIATION THERAPY SIDE EFFECTS:")
-        for item in effects.get('radiation', []):
-            result.append(f"      • {item}")
-    
-    if 'chemotherapy' in effects:
-        result.append("\n   CHEMOTHERAPY SIDE EFFECTS:")
-        for item in effects.get('chemotherapy', []):
-            result.append(f"      • {item}")
-    
-    if 'medication' in effects:
-        result.append("\n   MEDICATION SIDE EFFECTS:")
-        for item in effects.get('medication', []):
-            result.append(f"      • {item}")
-    
-    if 'observation' in effects:
-        result.append("\n   MONITORING APPROACH:")
-        for item in effects.get('observation', []):
-            result.append(f"      • {item}")
-    
-    if 'note' in effects:
-        result.append(f"\n   Note: {effects['note']}")
-    
-    return '\n'.join(result) if result else "   • No specific side effects listed"
-
-
-def format_side_effects(effects):
-    """Helper to format side effects by category."""
-    result = []
-    for category, details in effects.items():
-        if category != 'note':
-            result.append(f"{category.upper().replace('_', ' ')}:")
-            if isinstance(details, list):
-                for item in details:
-                    result.append(f"  • {item}")
-            else:
-                result.append(f"  {details}")
-    if 'note' in effects:
-        result.append(f"\nNote: {effects['note']}")
-    return '\n'.join(result)
 
 
 
@@ -1880,6 +1656,65 @@ def format_side_effects(effects):
 
 
 
+@app.get('/metrics')
+async def metrics():
+    """Return runtime statistics for the inference pipeline."""
+    return JSONResponse({
+        'serving': {
+            'backend': 'tflite' if tflite_model is not None else 'keras',
+            'mode': SERVING_MODE,
+            'used_model': USED_MODEL,
+            'compiled': {name: m.stats() for name, m in COMPILED_MODELS.items()},
+        },
+        'inference': PREDICT_BATCHER.stats() if PREDICT_BATCHER is not None else None,
+        'executor': INFER_EXECUTOR.stats(),
+        'cam_executor': CAM_EXECUTOR.stats(),
+        'sessions': SESSIONS.stats(),
+        'redis': REDIS_BREAKER.stats() if REDIS_BREAKER is not None else None,
+        'rate_limits': {'llm': LLM_LIMITER.stats(), 'predict': PREDICT_LIMITER.stats()},
+        'cam_jobs': CAM_JOBS.stats(),
+        'outputs': OUTPUT_WRITER.stats(),
+        'prediction_index': PREDICTION_INDEX.stats() if PREDICTION_INDEX is not None else None,
+        'retention': RETENTION.stats() if RETENTION is not None else None,
+        'llm': LLM_CLIENT.stats() if LLM_CLIENT is not None else None,
+        'explain': {**EXPLAIN_TEMPLATES.stats(), 'messages': _explanation_messages.cache_info()._asdict()},
+        'prediction_cache': PREDICTION_CACHE.stats() if PREDICTION_CACHE is not None else None,
+    })
+
+
+_BACKGROUND_TASKS = []
+
+
+async def _manage_outputs():
+    """Import outputs/ written by older versions once (manifest, then index), then run retention."""
+    if OUTPUT_MANIFEST is not None and not await asyncio.to_thread(OUTPUT_MANIFEST.is_built):
+        await asyncio.to_thread(OUTPUT_MANIFEST.build, OUTPUT_LAYOUT)
+    if PREDICTION_INDEX is not None and await asyncio.to_thread(PREDICTION_INDEX.is_empty):
+        await asyncio.to_thread(PREDICTION_INDEX.backfill, 'outputs')
+    if RETENTION is not None:
+        await RETENTION.run(OUTPUT_RETENTION_INTERVAL)
+
+
+@app.on_event('startup')
+async def _start_background_tasks():
+    _BACKGROUND_TASKS.append(asyncio.create_task(OUTPUT_WRITER.run()))
+    _BACKGROUND_TASKS.append(asyncio.create_task(_manage_outputs()))
+    _BACKGROUND_TASKS.append(asyncio.create_task(MEMORY_SESSIONS.run_sweeper(SESSION_SWEEP_INTERVAL)))
+    if REDIS_BREAKER is not None:
+        _BACKGROUND_TASKS.append(asyncio.create_task(REDIS_BREAKER.run_probe(_redis_raw.ping, REDIS_PROBE_INTERVAL)))
+    if isinstance(SESSIONS, CachedSessionStore):
+        _BACKGROUND_TASKS.append(asyncio.create_task(SESSIONS.run_subscriber()))
+
+
+@app.on_event('shutdown')
+async def _stop_background_tasks():
+    for task in _BACKGROUND_TASKS:
+        task.cancel()
+    _BACKGROUND_TASKS.clear()
+    # write whatever is still queued before the process exits
+    await OUTPUT_WRITER.flush()
+    if LLM_CLIENT is not None:
+        await LLM_CLIENT.aclose()
 
 
 @app.get('/predict/batch')
@@ -1913,15 +1748,9 @@ async def predict_batch(include_qa: bool = False):
                 if v == label:
                     label_idx = k
                     break
-            if openai is not None and OPENAI_API_KEY is not None:
-                try:
-                    expl = llm_explanation(label_idx or '', label, confidence, top_k, probs_map)
-                except Exception:
-                    expl = _rule_explanation(label, confidence)
-            else:
-                expl = _rule_explanation(label, confidence)
+            explain_task = asyncio.ensure_future(llm_explanation(label_idx or '', label, confidence, top_k, probs_map))
         except Exception:
-            expl = _rule_explanation(label, confidence)
+            explain_task = None
 
         # medical knowledge enrichment
         try:
@@ -1937,11 +1766,15 @@ async def predict_batch(include_qa: bool = False):
         except Exception:
             lifestyle_recs = []
 
-        # build QA if requested (function handles LLM availability)
+        # build QA if requested (function handles LLM availability), concurrently with the explanation
         try:
-            qa = _build_prediction_qa(label, confidence, top_k) if include_qa else []
+            qa = await _build_prediction_qa(label, confidence, top_k) if include_qa else []
         except Exception:
             qa = []
+        try:
+            expl = await explain_task if explain_task is not None else _rule_explanation(label, confidence)
+        except Exception:
+            expl = _rule_explanation(label, confidence)
 
         out_rec = {
             'model_type': 'tensorflow',
@@ -1958,7 +1791,7 @@ async def predict_batch(include_qa: bool = False):
             'medication_side_effects': medication_effects,
             'lifestyle_recommendations': lifestyle_recs,
             'qa': qa,
-            'used_model': model_path if 'model_path' in globals() else None,
+            'used_model': USED_MODEL,
             'models_evaluation': MODELS_EVAL or {}
         }
 
@@ -1967,6 +1800,57 @@ async def predict_batch(include_qa: bool = False):
     return JSONResponse({'count': len(out_list), 'predictions': out_list})
 
 
+def _admin_error(authorization: Optional[str]) -> Optional[JSONResponse]:
+    """Return an error response unless `authorization` carries valid admin credentials."""
+    if not ADMIN_TOKEN and not (ADMIN_USER and ADMIN_PASSWORD):
+        return JSONResponse({'error': 'admin_disabled',
+                             'message': 'Set ADMIN_TOKEN or ADMIN_USER/ADMIN_PASSWORD to enable admin endpoints.'},
+                            status_code=403)
+    scheme, _, credentials = (authorization or '').partition(' ')
+    scheme = scheme.lower()
+    credentials = credentials.strip()
+    if scheme == 'bearer' and ADMIN_TOKEN:
+        if secrets.compare_digest(credentials.encode(), ADMIN_TOKEN.encode()):
+            return None
+    elif scheme == 'basic' and ADMIN_USER and ADMIN_PASSWORD:
+        try:
+            user, _, password = base64.b64decode(credentials).decode('utf-8').partition(':')
+        except Exception:
+            user, password = '', ''
+        user_ok = secrets.compare_digest(user.encode(), ADMIN_USER.encode())
+        password_ok = secrets.compare_digest(password.encode(), ADMIN_PASSWORD.encode())
+        if user_ok and password_ok:
+            return None
+    return JSONResponse({'error': 'unauthorized', 'message': 'Invalid or missing admin credentials.'},
+                        status_code=401, headers={'WWW-Authenticate': 'Bearer, Basic realm="admin"'})
+
+
+@app.get('/admin/sessions')
+async def admin_sessions(limit: int = 100, before: Optional[float] = None, label: Optional[str] = None,
+                         authorization: Optional[str] = Header(None)):
+    """List sessions by latest prediction, newest first, from the prediction index.
+
+    Page with `?before=<next_before>` from the previous page; filter with `?label=`.
+    """
+    error = _admin_error(authorization)
+    if error is not None:
+        return error
+    if PREDICTION_INDEX is None:
+        return JSONResponse({'error': 'index_unavailable', 'message': 'Prediction index is not available.'}, status_code=503)
+    limit = min(max(1, limit), 1000)
+    rows = await asyncio.to_thread(PREDICTION_INDEX.list_sessions, limit, before, label)
+    sessions = [{
+        'session_id': r['session_id'],
+        'label': r['label'],
+        'confidence': r['confidence'],
+        'updated_at': r['updated_at'],
+        'model_fingerprint': r['model_fingerprint'],
+        'artifact_path': r['artifact_path'],
+    } for r in rows]
+    next_before = sessions[-1]['updated_at'] if len(sessions) == limit else None
+    return JSONResponse({'sessions': sessions, 'next_before': next_before})
+
+
 # Mount the frontend static files
 app.mount('/frontend', StaticFiles(directory='../frontend'), name='frontend')
 
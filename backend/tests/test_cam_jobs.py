@@ -0,0 +1,84 @@
+import asyncio
+
+from utils.cam_jobs import CamJobStore
+from utils.inference import InferenceExecutor
+
+
+def test_job_result_is_available_after_long_poll():
+    store = CamJobStore(InferenceExecutor(max_workers=1, max_queue=4))
+
+    async def run():
+        job_id = store.submit(lambda x: x * 2, 21)
+        job = await store.wait(job_id, timeout=2)
+        return job
+
+    job = asyncio.run(run())
+    assert job.status == 'done'
+    assert job.result == 42
+    assert store.stats()['completed'] == 1
+
+
+def test_failed_job_reports_error():
+    store = CamJobStore(InferenceExecutor(max_workers=1, max_queue=4))
+
+    def boom():
+        raise RuntimeError('no cam')
+
+    async def run():
+        return await store.wait(store.submit(boom), timeout=2)
+
+    job = asyncio.run(run())
+    assert job.status == 'failed'
+    assert 'no cam' in job.error
+
+
+def test_unknown_and_evicted_jobs():
+    store = CamJobStore(InferenceExecutor(max_workers=1, max_queue=4), max_jobs=2)
+
+    async def run():
+        ids = [store.submit(lambda: None) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        return ids
+
+    ids = asyncio.run(run())
+    assert store.get('missing') is None
+    assert store.get(ids[0]) is None
+    assert store.get(ids[2]) is not None
+
+
+def test_callback_runs_before_job_is_reported_done():
+    store = CamJobStore(InferenceExecutor(max_workers=1, max_queue=4))
+    seen = []
+
+    async def on_done(result):
+        await asyncio.sleep(0.01)
+        seen.append(result)
+
+    async def run():
+        job = await store.wait(store.submit(lambda: 'png', on_done=on_done), timeout=2)
+        return job, list(seen)
+
+    job, seen_at_done = asyncio.run(run())
+    assert job.status == 'done'
+    assert seen_at_done == ['png']
+
+
+def test_callbacks_added_while_pending_run_before_done():
+    import threading
+
+    store = CamJobStore(InferenceExecutor(max_workers=1, max_queue=4))
+    release = threading.Event()
+    seen = []
+
+    async def run():
+        job_id = store.submit(lambda: release.wait(2) and 'png', on_done=lambda r: seen.append(('first', r)))
+        added = store.add_done_callback(job_id, lambda r: seen.append(('second', r)))
+        release.set()
+        job = await store.wait(job_id, timeout=2)
+        return added, job, list(seen), store.add_done_callback(job_id, seen.append)
+
+    added, job, seen_at_done, added_late = asyncio.run(run())
+    assert added and not added_late
+    assert job.status == 'done'
+    assert seen_at_done == [('first', 'png'), ('second', 'png')]
+    assert store.add_done_callback('missing', seen.append) is False
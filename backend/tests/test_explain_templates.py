@@ -0,0 +1,59 @@
+import json
+
+from utils.explain_templates import ExplainTemplates
+
+
+def test_body_renders_confidence_into_every_label():
+    templates = ExplainTemplates()
+    for label in ('glioma_tumor', 'meningioma_tumor', 'pituitary_tumor', 'no_tumor'):
+        sections = json.loads(templates.body(label, '87.3'))['explanation_sections']
+        assert [s['type'] for s in sections] == ['analysis', 'disease', 'symptoms', 'treatment', 'recommendation']
+        assert 'Confidence Score: 87.3%' in sections[0]['text']
+        assert '\x00' not in json.dumps(sections)
+    disease = json.loads(templates.body('pituitary_tumor', '50.0'))['explanation_sections'][1]['text']
+    assert 'Detected Condition: Pituitary Tumor' in disease
+
+
+def test_report_and_confidence_text():
+    templates = ExplainTemplates()
+    assert templates.confidence_text(0.87349) == '87.3'
+    assert templates.confidence_text(None) == '0.0'
+    report = templates.report('glioma_tumor', '87.3', '2024-01-01 00:00:00')
+    assert 'Generated: 2024-01-01 00:00:00' in report
+    assert 'Confidence Level: 87.3%' in report
+    assert 'Detected Condition: Glioma Tumor' in report
+
+
+def test_bodies_are_cached_in_a_bounded_lru():
+    templates = ExplainTemplates(cache_size=2)
+    first = templates.body('glioma_tumor', '90.0')
+    assert templates.body('glioma_tumor', '90.0') is first
+    templates.body('glioma_tumor', '90.1')
+    templates.body('no_tumor', '90.0')
+    assert templates.stats() == {'labels': 4, 'entries': 2, 'hits': 1, 'misses': 3}
+    assert templates.body('glioma_tumor', '90.0') == first
+
+
+def test_etag_depends_on_label_and_confidence_only():
+    templates = ExplainTemplates()
+    etag = templates.etag('glioma_tumor', '90.0')
+    assert etag == ExplainTemplates().etag('glioma_tumor', '90.0')
+    assert etag != templates.etag('glioma_tumor', '90.1')
+    assert etag != templates.etag('no_tumor', '90.0')
+    assert 'glioma_tumor' in templates and 'invalid' not in templates
+
+
+def test_predict_messages_fill_per_request_values_into_compiled_text():
+    templates = ExplainTemplates()
+    messages = templates.messages('glioma_tumor', 'Glioma Tumor', '91.2', 'Detected Glioma Tumor with 91.2% confidence.')
+    assert [m['type'] for m in messages] == ['analysis', 'disease', 'symptoms', 'treatment', 'recommendation']
+    assert 'Confidence Score: 91.2%' in messages[0]['text']
+    assert 'Description: Detected Glioma Tumor with 91.2% confidence.' in messages[1]['text']
+    assert '• Confidence: 91.2%' in messages[1]['text']
+    normal = templates.messages('no_tumor', 'No Tumor', '99.0', 'unused')
+    assert 'no detectable tumor' in normal[1]['text'] and 'unused' not in normal[1]['text']
+    # conditions that are not compiled are rendered directly
+    other = templates.messages('unknown', 'unknown', '10.0', 'Detected unknown.')
+    assert 'Tumor Type: unknown' in other[1]['text']
+    assert '\x00' not in json.dumps([messages, normal, other])
+    assert templates.stats()['entries'] == 0
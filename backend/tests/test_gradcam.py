@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+tf = pytest.importorskip('tensorflow')
+
+from utils.gradcam import GradCamEngine, find_target_layer, get_cam_engine  # noqa: E402
+
+
+def _functional(seed):
+    tf.keras.utils.set_random_seed(seed)
+    inputs = tf.keras.Input((12, 12, 1))
+    h = tf.keras.layers.Conv2D(4, 3, activation='relu', name='conv_a')(inputs)
+    h = tf.keras.layers.Conv2D(6, 3, activation='relu', name='conv_b')(h)
+    h = tf.keras.layers.GlobalAveragePooling2D()(h)
+    outputs = tf.keras.layers.Dense(3, activation='softmax')(h)
+    return tf.keras.Model(inputs, outputs)
+
+
+def _sequential(seed):
+    tf.keras.utils.set_random_seed(seed)
+    return tf.keras.Sequential([
+        tf.keras.Input((12, 12, 1)),
+        tf.keras.layers.Conv2D(4, 3, activation='relu', name='conv'),
+        tf.keras.layers.MaxPooling2D(name='pool'),
+        tf.keras.layers.Flatten(),
+        tf.keras.layers.Dense(8, activation='relu'),
+        tf.keras.layers.Dense(3, activation='softmax'),
+    ])
+
+
+def _reference_cam(model, layer_name, x, class_idx):
+    """Textbook Grad-CAM: gradient of the pre-softmax score, computed layer by layer."""
+    layers = [layer for layer in model.layers if not isinstance(layer, tf.keras.layers.InputLayer)]
+    final = layers[-1]
+    x = tf.convert_to_tensor(x)
+    with tf.GradientTape() as tape:
+        h = x
+        for layer in layers[:-1]:
+            h = layer(h)
+            if layer.name == layer_name:
+                conv_out = h
+        logits = tf.matmul(h, final.kernel) + final.bias
+        score = tf.reduce_sum(tf.gather(logits, class_idx, axis=1, batch_dims=1))
+    grads = tape.gradient(score, conv_out)
+    weights = tf.reduce_mean(grads, axis=(1, 2), keepdims=True)
+    return tf.nn.relu(tf.reduce_sum(conv_out * weights, axis=-1)).numpy()
+
+
+@pytest.mark.parametrize('build, layer_name', [(_functional, 'conv_b'), (_sequential, 'pool')])
+def test_heatmap_matches_reference_grad_cam(build, layer_name):
+    model = build(0)
+    engine = GradCamEngine(model)
+    assert engine.layer_name == find_target_layer(model) == layer_name
+    x = np.random.default_rng(1).random((3, 12, 12, 1)).astype('float32')
+    for class_idx in ([0, 1, 2], 1):
+        idx = np.broadcast_to(np.asarray(class_idx, dtype='int32'), (3,))
+        expected = _reference_cam(model, layer_name, x, idx)
+        cams = engine.heatmap(x, class_idx)
+        assert cams.shape == expected.shape
+        np.testing.assert_allclose(cams, expected, rtol=1e-4, atol=1e-6)
+
+
+def test_engine_is_built_once_per_model():
+    a, b = _functional(0), _sequential(0)
+    engine = get_cam_engine(a)
+    assert get_cam_engine(a) is engine
+    assert get_cam_engine(b) is not engine and get_cam_engine(b).model is b
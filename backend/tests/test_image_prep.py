@@ -0,0 +1,111 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from utils.image_prep import is_brain_image, is_grayscale_like, prepare_upload
+
+INPUT_SHAPE = (150, 150)
+
+
+def _scan(size, color=False, flat=False):
+    """A synthetic slice: a bright ellipse with texture on a dark background."""
+    h, w = size
+    yy, xx = np.mgrid[0:h, 0:w]
+    inside = ((yy - h / 2) / (h * 0.4)) ** 2 + ((xx - w / 2) / (w * 0.35)) ** 2 < 1
+    texture = 40 * np.sin(xx / 7.0) * np.cos(yy / 11.0)
+    gray = np.where(inside, 140 + texture, 10).astype('uint8')
+    if flat:
+        gray = np.full((h, w), 120, dtype='uint8')
+    rgb = np.stack([gray] * 3, axis=-1)
+    if color:
+        rgb[..., 0] = 255 - rgb[..., 0]
+    return Image.fromarray(rgb)
+
+
+def _encode(img, fmt, **kwargs):
+    buf = io.BytesIO()
+    img.save(buf, format=fmt, **kwargs)
+    return buf.getvalue()
+
+
+def _old_path(contents, input_shape):
+    """The previous /predict preprocessing: full decode, then separate resizes per check."""
+    pil = Image.open(io.BytesIO(contents)).convert('RGB')
+    thumb = np.array(pil.resize((256, 256))).astype(float)
+    grayscale = all(np.abs(thumb[..., i] - thumb[..., j]).mean() < 30 for i, j in ((0, 1), (0, 2), (1, 2)))
+    width, height = pil.size
+    std_val = np.std(np.array(pil.convert('L')).astype('float32'))
+    verdict = grayscale and 64 <= width <= 2000 and 64 <= height <= 2000 and std_val >= 5
+    tensor = np.array(pil.resize(input_shape)).astype('float32') / 255.0
+    return verdict, grayscale, tensor
+
+
+FIXTURES = {
+    'png_scan': _encode(_scan((300, 280)), 'PNG'),
+    'png_color': _encode(_scan((300, 300), color=True), 'PNG'),
+    'png_flat': _encode(_scan((200, 200), flat=True), 'PNG'),
+    'png_too_small': _encode(_scan((50, 80)), 'PNG'),
+    'jpeg_scan': _encode(_scan((400, 360)), 'JPEG', quality=90),
+    'jpeg_color': _encode(_scan((400, 400), color=True), 'JPEG', quality=90),
+}
+
+
+@pytest.mark.parametrize('name', sorted(FIXTURES))
+def test_single_decode_matches_old_multi_decode_path(name):
+    contents = FIXTURES[name]
+    verdict, grayscale, tensor = _old_path(contents, INPUT_SHAPE)
+    prep = prepare_upload(contents, INPUT_SHAPE)
+
+    assert prep['is_brain'] == verdict
+    assert prep['error'] is None
+    if prep['pil'] is not None:
+        assert is_grayscale_like(prep['pil']) == grayscale
+        assert is_brain_image(prep['pil']) == verdict
+    if verdict:
+        assert prep['model_input'].dtype == np.float32
+        np.testing.assert_array_equal(prep['model_input'], tensor)
+    else:
+        assert prep['model_input'] is None
+
+
+def test_fixtures_cover_accepted_and_rejected_images():
+    verdicts = {name: prepare_upload(data, INPUT_SHAPE)['is_brain'] for name, data in FIXTURES.items()}
+    assert verdicts == {'png_scan': True, 'png_color': False, 'png_flat': False, 'png_too_small': False,
+                        'jpeg_scan': True, 'jpeg_color': False}
+
+
+def test_oversized_upload_is_rejected_from_the_header(monkeypatch):
+    from PIL import ImageFile
+
+    contents = _encode(_scan((2400, 900)), 'JPEG', quality=80)
+    loads = []
+    original = ImageFile.ImageFile.load
+    monkeypatch.setattr(ImageFile.ImageFile, 'load', lambda self: loads.append(self) or original(self))
+
+    prep = prepare_upload(contents, INPUT_SHAPE)
+
+    assert loads == []
+    assert prep['pil'] is None and not prep['is_brain']
+    assert (prep['width'], prep['height']) == (900, 2400)
+
+
+@pytest.mark.parametrize('input_shape', [(150, 150), (224, 224), (300, 300)])
+def test_jpeg_draft_still_covers_model_input_and_thumbnail(input_shape):
+    contents = _encode(_scan((1800, 1600)), 'JPEG', quality=90)
+    prep = prepare_upload(contents, input_shape)
+    need = max(256, *input_shape)
+    width, height = prep['pil'].size
+    assert min(width, height) >= need
+    # decoded at a reduced DCT scale, not at full size
+    assert width < 1600 and height < 1800
+    assert (prep['width'], prep['height']) == (1600, 1800)
+    assert prep['is_brain'] and prep['model_input'].shape == input_shape + (3,)
+
+
+def test_png_is_decoded_at_full_size():
+    contents = _encode(_scan((1800, 1600)), 'PNG')
+    prep = prepare_upload(contents, INPUT_SHAPE)
+    assert prep['pil'].size == (1600, 1800)
+    assert prep['is_brain']
@@ -0,0 +1,190 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from utils.inference import MicroBatcher
+
+
+def test_concurrent_requests_share_one_batch():
+    calls = []
+
+    def batch_fn(x):
+        calls.append(x.shape[0])
+        return x.reshape(x.shape[0], -1).sum(axis=1, keepdims=True)
+
+    batcher = MicroBatcher(batch_fn, max_batch_size=4, max_wait_ms=50)
+
+    async def run():
+        items = [np.full((2, 2), i, dtype='float32') for i in range(4)]
+        return await asyncio.gather(*(batcher.submit(it) for it in items))
+
+    results = asyncio.run(run())
+    assert calls == [4]
+    assert [float(r[0, 0]) for r in results] == [0.0, 4.0, 8.0, 12.0]
+    assert results[0].shape == (1, 1)
+    stats = batcher.stats()
+    assert stats['batches'] == 1 and stats['items'] == 4
+    assert stats['batch_size_histogram'] == {'4': 1}
+
+
+def test_batch_size_is_capped():
+    calls = []
+
+    def batch_fn(x):
+        calls.append(x.shape[0])
+        return x
+
+    batcher = MicroBatcher(batch_fn, max_batch_size=2, max_wait_ms=20)
+
+    async def run():
+        return await asyncio.gather(*(batcher.submit(np.zeros(3)) for _ in range(5)))
+
+    asyncio.run(run())
+    assert sum(calls) == 5
+    assert max(calls) <= 2
+
+
+def test_errors_propagate_to_every_caller():
+    def batch_fn(x):
+        raise ValueError('boom')
+
+    batcher = MicroBatcher(batch_fn, max_batch_size=4, max_wait_ms=10)
+
+    async def run():
+        return await asyncio.gather(*(batcher.submit(np.zeros(1)) for _ in range(2)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, ValueError) for r in results)
+    assert batcher.stats()['errors'] == 1
+
+
+def test_executor_reports_in_flight_and_queue():
+    import threading
+
+    from utils.inference import InferenceExecutor
+
+    release = threading.Event()
+    executor = InferenceExecutor(max_workers=1, max_queue=1)
+
+    async def run():
+        jobs = [asyncio.ensure_future(executor.run(release.wait, 5)) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        snapshot = executor.stats()
+        release.set()
+        await asyncio.gather(*jobs)
+        return snapshot
+
+    snapshot = asyncio.run(run())
+    assert snapshot['in_flight'] == 1
+    assert snapshot['queue_depth'] == 1
+    assert snapshot['waiting'] == 1
+    assert executor.stats()['completed'] == 3
+    executor.shutdown()
+
+
+def test_tuple_outputs_are_sliced_per_request():
+    def batch_fn(x):
+        return x * 2, x + 1
+
+    batcher = MicroBatcher(batch_fn, max_batch_size=2, max_wait_ms=20)
+
+    async def run():
+        return await asyncio.gather(batcher.submit(np.array([1.0])), batcher.submit(np.array([5.0])))
+
+    (a2, a1), (b2, b1) = asyncio.run(run())
+    assert float(a2[0, 0]) == 2.0 and float(a1[0, 0]) == 2.0
+    assert float(b2[0, 0]) == 10.0 and float(b1[0, 0]) == 6.0
+
+
+def test_ensemble_outputs_weighted_average():
+    tf = pytest.importorskip('tensorflow')
+    from utils.inference import build_ensemble_model
+
+    def make(seed):
+        tf.keras.utils.set_random_seed(seed)
+        return tf.keras.Sequential([tf.keras.Input((4,)), tf.keras.layers.Dense(3, activation='softmax')])
+
+    a, b = make(1), make(2)
+    ens = build_ensemble_model([a, b], [3, 1])
+    x = np.random.default_rng(0).random((5, 4)).astype('float32')
+    expected = 0.75 * a.predict(x, verbose=0) + 0.25 * b.predict(x, verbose=0)
+    np.testing.assert_allclose(ens.predict(x, verbose=0), expected, atol=1e-6)
+
+
+def test_compiled_model_matches_predict():
+    tf = pytest.importorskip('tensorflow')
+    from utils.inference import CompiledModel
+
+    tf.keras.utils.set_random_seed(0)
+    model = tf.keras.Sequential([tf.keras.Input((4,)), tf.keras.layers.Dense(3, activation='softmax')])
+    compiled = CompiledModel(model)
+    assert compiled.verify() <= 1e-5
+    x = np.random.default_rng(1).random((5, 4)).astype('float32')
+    np.testing.assert_allclose(compiled(x), model.predict(x, verbose=0), atol=1e-6)
+    assert compiled.stats()['input_shape'] == [4]
+
+
+@pytest.mark.parametrize('sequential', [False, True])
+def test_predict_with_cam_matches_predict_and_heatmap(sequential):
+    tf = pytest.importorskip('tensorflow')
+    from utils.gradcam import GradCamEngine
+
+    tf.keras.utils.set_random_seed(0)
+    layers = [
+        tf.keras.layers.Conv2D(4, 3, activation='relu'),
+        tf.keras.layers.MaxPooling2D(),
+        tf.keras.layers.Flatten(),
+        tf.keras.layers.Dense(3, activation='softmax'),
+    ]
+    if sequential:
+        model = tf.keras.Sequential([tf.keras.Input((10, 10, 1))] + layers)
+    else:
+        inputs = tf.keras.Input((10, 10, 1))
+        h = inputs
+        for layer in layers:
+            h = layer(h)
+        model = tf.keras.Model(inputs, h)
+    engine = GradCamEngine(model)
+    x = np.random.default_rng(2).random((4, 10, 10, 1)).astype('float32')
+
+    probs, cams = engine.predict_with_cam(x)
+
+    np.testing.assert_allclose(probs, model.predict(x, verbose=0), rtol=1e-5, atol=1e-6)
+    np.testing.assert_allclose(cams, engine.heatmap(x, np.argmax(probs, axis=1)), rtol=1e-5, atol=1e-6)
+    assert cams.shape == (4, 4, 4)
+
+
+def test_cancelled_callers_do_not_leak_queue_depth():
+    import threading
+
+    from utils.inference import InferenceExecutor
+
+    release = threading.Event()
+    ran = []
+    executor = InferenceExecutor(max_workers=1, max_queue=2)
+
+    def job(i):
+        release.wait(5)
+        ran.append(i)
+
+    async def run():
+        tasks = [asyncio.ensure_future(executor.run(job, i)) for i in range(3)]
+        await asyncio.sleep(0.05)
+        # a client goes away while its job is still queued behind the running one
+        tasks[1].cancel()
+        await asyncio.sleep(0.01)
+        release.set()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.sleep(0.01)
+        # every slot came back, so a fresh batch is admitted without waiting
+        await asyncio.wait_for(asyncio.gather(*(executor.run(job, i) for i in range(3, 6))), 2)
+        return results
+
+    results = asyncio.run(run())
+    assert isinstance(results[1], asyncio.CancelledError)
+    assert sorted(ran) == [0, 2, 3, 4, 5]
+    stats = executor.stats()
+    assert stats['queue_depth'] == 0 and stats['in_flight'] == 0 and stats['waiting'] == 0
+    assert stats['completed'] == 5
+    executor.shutdown()
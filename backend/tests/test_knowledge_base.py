@@ -0,0 +1,44 @@
+import json
+
+import pytest
+
+from utils.knowledge_base import KnowledgeBase, normalize_label, thaw
+from utils.medical_knowledge import get_lifestyle_recommendations, get_medication_side_effects, get_tumor_analysis
+
+
+def test_data_file_covers_every_model_label():
+    with open('models/models/labels.json', 'r', encoding='utf-8') as f:
+        labels = list(json.load(f).values())
+    kb = KnowledgeBase.load(labels=labels)
+    assert sorted(kb.labels) == sorted(labels)
+
+
+def test_lookups_normalise_names_and_aliases():
+    kb = KnowledgeBase.load()
+    assert normalize_label(' No Tumor ') == 'no_tumor'
+    for spelling in ('glioma_tumor', 'Glioma', 'Glioma Tumor', 'GLIOMA-TUMOR'):
+        assert kb.canonical(spelling) == 'glioma_tumor'
+    assert kb.canonical('notumor') == 'no_tumor'
+    assert kb.canonical('Invalid image') is None and kb.get(None) is None
+    assert 'Pituitary' in kb and 'astrocytoma' not in kb
+
+
+def test_entries_are_immutable():
+    entry = KnowledgeBase.load().get('glioma_tumor')
+    with pytest.raises(TypeError):
+        entry.disease_info['name'] = 'changed'
+    with pytest.raises(AttributeError):
+        entry.symptoms.append('changed')
+    details = thaw(entry.symptom_details)
+    details['common'].append('changed')
+    assert 'changed' not in entry.symptom_details['common']
+
+
+def test_medical_knowledge_uses_model_labels():
+    analysis = get_tumor_analysis('glioma_tumor', 0.9)
+    assert analysis['name'] == 'Glioma Tumor' and analysis['label'] == 'glioma_tumor'
+    assert 'Seizures' in analysis['symptoms']
+    assert get_medication_side_effects('meningioma_tumor') == get_medication_side_effects('Meningioma') != []
+    assert get_lifestyle_recommendations('pituitary_tumor')
+    assert 'symptoms' not in get_tumor_analysis('no_tumor', 0.99)
+    json.dumps(get_tumor_analysis('pituitary_tumor', 0.5))
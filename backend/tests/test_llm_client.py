@@ -0,0 +1,122 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from utils.llm_client import LLMClient, LLMError
+
+
+class _StubOpenAI(ThreadingHTTPServer):
+    """Chat-completions stub; `script` is a list of (status, delay_s) consumed one per request."""
+
+    daemon_threads = True
+
+    def __init__(self, script=None):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.script = list(script or [])
+        self.requests = []
+        self.lock = threading.Lock()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/v1'
+
+    def next_step(self):
+        with self.lock:
+            return self.script.pop(0) if self.script else (200, 0.0)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.requests.append((self.path, self.headers.get('Authorization'), body))
+        status, delay = self.server.next_step()
+        time.sleep(delay)
+        if status == 200:
+            n = len(self.server.requests)
+            payload = json.dumps({'choices': [{'message': {'content': f' answer {n} '}}]}).encode()
+        else:
+            payload = b'{"error": "busy"}'
+        try:
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        except OSError:
+            pass  # the client gave up on this request
+
+
+def _chat(server, **kwargs):
+    async def run():
+        client = LLMClient('sk-test', model='stub', base_url=server.url, backoff=0.01, **kwargs)
+        try:
+            text = await client.chat([{'role': 'user', 'content': 'hi'}], max_tokens=10)
+            return text, client.stats()
+        finally:
+            await client.aclose()
+
+    return asyncio.run(run())
+
+
+def test_chat_posts_completion_request():
+    server = _StubOpenAI()
+    try:
+        text, stats = _chat(server)
+    finally:
+        server.shutdown()
+    assert text == 'answer 1'
+    path, auth, body = server.requests[0]
+    assert path == '/v1/chat/completions' and auth == 'Bearer sk-test'
+    assert body['model'] == 'stub' and body['max_tokens'] == 10
+    assert stats['calls'] == 1 and stats['failures'] == 0
+
+
+def test_retries_transient_errors():
+    server = _StubOpenAI([(503, 0.0), (429, 0.0)])
+    try:
+        text, stats = _chat(server, max_retries=2)
+    finally:
+        server.shutdown()
+    assert text == 'answer 3'
+    assert stats['retries'] == 2
+
+
+def test_gives_up_after_retries_and_on_client_errors():
+    server = _StubOpenAI([(500, 0.0)] * 3 + [(400, 0.0)])
+    try:
+        with pytest.raises(LLMError):
+            _chat(server, max_retries=2)
+        with pytest.raises(LLMError):
+            _chat(server, max_retries=2)
+    finally:
+        server.shutdown()
+    assert len(server.requests) == 4
+
+
+def test_deadline_bounds_slow_responses():
+    server = _StubOpenAI([(200, 1.0)])
+    try:
+        started = time.monotonic()
+        with pytest.raises(LLMError):
+            _chat(server, timeout=0.2, max_retries=0)
+        assert time.monotonic() - started < 0.9
+    finally:
+        server.shutdown()
+
+
+def test_hedged_request_wins_when_primary_is_slow():
+    server = _StubOpenAI([(200, 1.0)])
+    try:
+        text, stats = _chat(server, hedge_after=0.1, timeout=5.0)
+    finally:
+        server.shutdown()
+    assert text == 'answer 2'
+    assert stats['hedged'] == 1 and stats['hedge_wins'] == 1
@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from utils.output_writer import OutputWriter, atomic_write
+from utils.retention import OutputLayout
+
+S1 = '5e551011-0000-4000-8000-000000000000'
+
+
+def test_atomic_write_replaces_file_without_leftovers(tmp_path):
+    target = tmp_path / S1 / 'predict.json'
+    atomic_write(target, b'{"a":1}')
+    atomic_write(target, b'{"a":2}')
+    assert target.read_bytes() == b'{"a":2}'
+    assert [p.name for p in target.parent.iterdir()] == ['predict.json']
+
+
+def test_writer_writes_in_background_and_coalesces(tmp_path):
+    writer = OutputWriter(str(tmp_path))
+
+    async def run():
+        await writer.submit(S1, 'predict.json', b'old')
+        await writer.submit(S1, 'predict.json', b'new')
+        await writer.submit(S1, 'cam.png', b'\x89PNG')
+        queued = writer.pending(S1, 'predict.json')
+        task = asyncio.create_task(writer.run())
+        await writer.wait_idle(5)
+        task.cancel()
+        return queued
+
+    assert asyncio.run(run()) == b'new'
+    assert (tmp_path / S1 / 'predict.json').read_bytes() == b'new'
+    assert (tmp_path / S1 / 'cam.png').read_bytes() == b'\x89PNG'
+    assert writer.pending(S1, 'predict.json') is None
+    stats = writer.stats()
+    assert stats['written'] == 2 and stats['coalesced'] == 1 and stats['pending'] == 0
+
+
+def test_writer_applies_backpressure_and_flushes(tmp_path):
+    A, B, C = (f'{c * 8}-0000-4000-8000-000000000000' for c in 'abc')
+    writer = OutputWriter(str(tmp_path), max_pending=2)
+
+    async def run():
+        await writer.submit(A, 'x', b'1')
+        await writer.submit(B, 'x', b'2')
+        third = asyncio.create_task(writer.submit(C, 'x', b'3'))
+        await asyncio.sleep(0.01)
+        blocked = not third.done()
+        await writer.flush()
+        await third
+        await writer.flush()
+        return blocked
+
+    assert asyncio.run(run())
+    assert sorted(p.parent.name for p in tmp_path.glob('*/x')) == [A, B, C]
+
+
+def test_write_hook_receives_session_id_and_unsafe_ids_are_refused(tmp_path):
+    calls = []
+    writer = OutputWriter(str(tmp_path), layout=OutputLayout(str(tmp_path)),
+                          on_write=lambda sid, path, delta: calls.append((sid, path.name, delta)))
+
+    async def run():
+        await writer.submit(S1, 'predict.json', b'12345')
+        await writer.flush()
+        for bad in ('../../etc', '/tmp/victim', 'batch'):
+            with pytest.raises(ValueError):
+                await writer.submit(bad, 'predict.json', b'x')
+
+    asyncio.run(run())
+    assert calls == [(S1, 'predict.json', 5)]
+    assert writer.find('../../etc', 'predict.json') is None
@@ -0,0 +1,60 @@
+import asyncio
+
+from utils.prediction_cache import PredictionCache, content_key
+
+
+def test_hit_after_set_and_update():
+    cache = PredictionCache(max_bytes=10_000, ttl=60)
+
+    async def run():
+        key = content_key(b'scan-bytes', 'model-a')
+        assert await cache.get(key) is None
+        await cache.set(key, {'label': 'glioma_tumor', 'cam_image': None})
+        await cache.update(key, cam_image='abc')
+        return await cache.get(key)
+
+    value = asyncio.run(run())
+    assert value == {'label': 'glioma_tumor', 'cam_image': 'abc'}
+    stats = cache.stats()
+    assert stats['hits_local'] == 1 and stats['misses'] == 1
+
+
+def test_key_depends_on_model_fingerprint():
+    assert content_key(b'x', 'model-a') != content_key(b'x', 'model-b')
+
+
+def test_byte_budget_evicts_least_recently_used():
+    cache = PredictionCache(max_bytes=40, ttl=60)  # each entry is 18 bytes
+
+    async def run():
+        await cache.set('a', {'v': 'x' * 10})
+        await cache.set('b', {'v': 'y' * 10})
+        await cache.get('a')
+        await cache.set('c', {'v': 'z' * 10})
+        return [await cache.get(k) is not None for k in ('a', 'b', 'c')]
+
+    assert asyncio.run(run()) == [True, False, True]
+    assert cache.stats()['evictions'] == 1
+
+
+def test_expired_entries_miss():
+    cache = PredictionCache(max_bytes=1000, ttl=-1)
+
+    async def run():
+        await cache.set('a', {'v': 1})
+        return await cache.get('a')
+
+    assert asyncio.run(run()) is None
+
+
+def test_update_before_set_is_merged_into_the_entry():
+    cache = PredictionCache(max_bytes=10_000, ttl=60)
+
+    async def run():
+        # the background CAM job can finish while the request is still waiting on the LLM
+        await cache.update('k', cam_image='abc', cam_job_id=None)
+        assert await cache.get('k') is None
+        await cache.set('k', {'label': 'glioma_tumor', 'cam_image': None, 'cam_job_id': 'job-1'})
+        return await cache.get('k')
+
+    assert asyncio.run(run()) == {'label': 'glioma_tumor', 'cam_image': 'abc', 'cam_job_id': None}
@@ -0,0 +1,47 @@
+import json
+
+from utils.prediction_index import PredictionIndex
+
+
+def test_latest_prediction_per_session(tmp_path):
+    index = PredictionIndex(str(tmp_path / 'predictions.db'))
+    index.record('s1', 'glioma_tumor', 0.6, 'fp1', 'outputs/s1', [{'label': 'glioma_tumor', 'probability': 0.6}],
+                 {'glioma_tumor': 0.6}, created_at=1.0)
+    index.record('s1', 'no_tumor', 0.9, 'fp1', 'outputs/s1', created_at=2.0)
+
+    latest = index.latest('s1')
+    assert latest['label'] == 'no_tumor' and latest['confidence'] == 0.9
+    assert latest['model_fingerprint'] == 'fp1' and latest['artifact_path'] == 'outputs/s1'
+    assert [p['label'] for p in index.history('s1')] == ['no_tumor', 'glioma_tumor']
+    assert index.history('s1')[1]['probs'] == {'glioma_tumor': 0.6}
+    assert index.latest('missing') is None
+    journal = index._conn().execute('PRAGMA journal_mode').fetchone()[0]
+    assert journal == 'wal'
+
+
+def test_list_sessions_pages_and_filters(tmp_path):
+    index = PredictionIndex(str(tmp_path / 'predictions.db'))
+    for i in range(5):
+        index.record(f's{i}', 'no_tumor' if i % 2 else 'glioma_tumor', 0.5, created_at=float(i))
+
+    page = index.list_sessions(limit=2)
+    assert [r['session_id'] for r in page] == ['s4', 's3']
+    page = index.list_sessions(limit=2, before=page[-1]['updated_at'])
+    assert [r['session_id'] for r in page] == ['s2', 's1']
+    assert [r['session_id'] for r in index.list_sessions(label='no_tumor')] == ['s3', 's1']
+
+    assert index.delete_session('s3') == 1
+    assert index.latest('s3') is None
+
+
+def test_backfill_indexes_existing_predict_json(tmp_path):
+    out = tmp_path / 'outputs'
+    (out / 'old').mkdir(parents=True)
+    (out / 'old' / 'predict.json').write_text(json.dumps({'label': 'pituitary_tumor', 'confidence': 0.8}))
+    (out / 'broken').mkdir()
+    (out / 'broken' / 'predict.json').write_text('{not json')
+    index = PredictionIndex(str(tmp_path / 'predictions.db'))
+
+    assert index.is_empty()
+    assert index.backfill(str(out)) == 1
+    assert index.latest('old')['label'] == 'pituitary_tumor'
@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from utils.rate_limit import SlidingWindowLimiter
+
+
+def _hits(limiter, key, n):
+    async def run():
+        return [await limiter.hit(key) for _ in range(n)]
+    return asyncio.run(run())
+
+
+def test_memory_window_enforces_limit_per_key():
+    limiter = SlidingWindowLimiter(3, window=60)
+    results = _hits(limiter, 'a', 5)
+    assert [r.allowed for r in results] == [True, True, True, False, False]
+    assert [r.remaining for r in results[:3]] == [2, 1, 0]
+    assert 0 < results[3].retry_after <= 60
+    assert _hits(limiter, 'b', 1)[0].allowed
+    assert limiter.stats()['limited'] == 2
+
+
+def test_memory_window_slides_and_expires_idle_keys(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('utils.rate_limit.time.time', lambda: now[0])
+    limiter = SlidingWindowLimiter(2, window=60, buckets=6)
+    assert all(r.allowed for r in _hits(limiter, 'a', 2))
+    now[0] += 30
+    assert not _hits(limiter, 'a', 1)[0].allowed
+    now[0] += 35  # the first two requests have left the window
+    assert _hits(limiter, 'a', 1)[0].allowed
+    now[0] += 120
+    _hits(limiter, 'b', 1)
+    assert limiter.stats()['memory_keys'] == 1
+
+
+def test_redis_window_uses_one_script_call():
+    fakeredis = pytest.importorskip('fakeredis')
+    pytest.importorskip('lupa')
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    limiter = SlidingWindowLimiter(2, window=60, redis_client=client, prefix='t:')
+    results = _hits(limiter, 'a', 3)
+    assert [r.allowed for r in results] == [True, True, False]
+    assert results[2].retry_after > 0
+    assert limiter.stats()['redis_errors'] == 0
+    assert asyncio.run(client.zcard('t:a')) == 2
+
+
+def test_redis_errors_fall_back_to_memory():
+    class Broken:
+        def register_script(self, script):
+            async def call(**kwargs):
+                raise ConnectionError('down')
+            return call
+
+    limiter = SlidingWindowLimiter(1, window=60, redis_client=Broken())
+    assert [r.allowed for r in _hits(limiter, 'a', 2)] == [True, False]
+    assert limiter.stats()['redis_errors'] == 2
@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+from utils.redis_guard import CircuitBreaker, CircuitOpenError, GuardedRedis, create_redis_client
+from utils.session_store import MemorySessionStore, RedisSessionStore
+
+
+def _unreachable():
+    # nothing listens on port 1, so every call fails with a connection error
+    return create_redis_client('redis://127.0.0.1:1/0', connect_timeout=0.1, decode_responses=True)
+
+
+def test_breaker_opens_and_short_circuits():
+    breaker = CircuitBreaker(failure_threshold=2)
+    client = GuardedRedis(_unreachable(), breaker)
+
+    async def run():
+        errors = []
+        for _ in range(4):
+            try:
+                await client.get('k')
+            except Exception as e:
+                errors.append(type(e))
+        return errors
+
+    errors = asyncio.run(run())
+    assert errors[2:] == [CircuitOpenError, CircuitOpenError]
+    stats = breaker.stats()
+    assert stats['state'] == 'open' and stats['times_opened'] == 1 and stats['short_circuited'] == 2
+
+
+def test_probe_closes_breaker():
+    breaker = CircuitBreaker(failure_threshold=1)
+    breaker.record_failure(ConnectionError('down'))
+    assert breaker.state == 'open'
+
+    async def ping():
+        return True
+
+    async def run():
+        task = asyncio.create_task(breaker.run_probe(ping, interval=0.01))
+        await asyncio.sleep(0.05)
+        task.cancel()
+
+    asyncio.run(run())
+    assert breaker.state == 'closed'
+
+
+def test_guarded_client_passes_commands_pipelines_and_scripts():
+    fakeredis = pytest.importorskip('fakeredis')
+    pytest.importorskip('lupa')
+    breaker = CircuitBreaker()
+    client = GuardedRedis(fakeredis.FakeAsyncRedis(decode_responses=True), breaker)
+
+    async def run():
+        await client.set('a', '1')
+        pipe = client.pipeline(transaction=False)
+        pipe.incr('a')
+        pipe.get('a')
+        results = await pipe.execute()
+        script = client.register_script("return redis.call('GET', KEYS[1])")
+        return results, await script(keys=['a'])
+
+    results, scripted = asyncio.run(run())
+    assert results == [2, '2'] and scripted == '2'
+    assert breaker.stats()['calls'] == 3 and breaker.stats()['errors'] == 0
+
+
+def test_session_store_uses_memory_fallback_when_redis_is_down():
+    breaker = CircuitBreaker(failure_threshold=1)
+    store = RedisSessionStore(GuardedRedis(_unreachable(), breaker), fallback=MemorySessionStore())
+
+    async def run():
+        await store.update('s1', {'last_prediction': 'glioma_tumor'}, [{'role': 'user', 'message': 'hi'}])
+        return await store.get_fields('s1', 'last_prediction'), await store.get('s1')
+
+    fields, s = asyncio.run(run())
+    assert fields == {'last_prediction': 'glioma_tumor'}
+    assert s['history'] == [{'role': 'user', 'message': 'hi'}]
+    assert breaker.state == 'open' and store.stats()['fallback_calls'] == 3
@@ -0,0 +1,152 @@
+import asyncio
+import time
+
+import pytest
+
+from utils.prediction_index import PredictionIndex
+from utils.retention import OutputLayout, OutputManifest, RetentionManager
+
+
+def _sid(prefix):
+    """A server-style (uuid4) session id starting with the hex `prefix`."""
+    return f'{prefix:0<8}-0000-4000-8000-000000000000'
+
+
+def _write_session(layout, manifest, session_id, size, at):
+    directory = layout.session_dir(session_id)
+    directory.mkdir(parents=True)
+    (directory / 'cam.png').write_bytes(b'x' * size)
+    manifest.add(session_id, str(directory), size, at=at)
+    return directory
+
+
+def test_layout_shards_and_finds_legacy_directories(tmp_path):
+    layout = OutputLayout(str(tmp_path))
+    sid, flat = _sid('abcdef'), _sid('f1a7')
+    assert layout.session_dir(sid) == tmp_path / 'ab' / sid
+    (tmp_path / flat).mkdir()
+    (tmp_path / flat / 'predict.json').write_text('{}')
+    assert layout.find(flat, 'predict.json') == tmp_path / flat / 'predict.json'
+    assert layout.find(flat, 'cam.png') is None
+
+
+def test_manifest_build_moves_flat_directories_into_shards(tmp_path):
+    root = tmp_path / 'outputs'
+    layout = OutputLayout(str(root))
+    legacy = _sid('1e6ac0')
+    (root / legacy).mkdir(parents=True)
+    (root / legacy / 'cam.png').write_bytes(b'x' * 10)
+    (root / 'batch').mkdir()
+    (root / 'batch' / 'batch_predictions.json').write_text('[]')
+    manifest = OutputManifest(str(tmp_path / 'index.db'))
+
+    assert not manifest.is_built()
+    assert manifest.build(layout) == 1
+    assert manifest.is_built()
+    assert (root / '1e' / legacy / 'cam.png').exists()
+    assert (root / 'batch').exists()
+    assert manifest.total_bytes() == 10 and manifest.count() == 1
+
+
+def test_retention_evicts_by_age_then_size(tmp_path):
+    layout = OutputLayout(str(tmp_path / 'outputs'))
+    manifest = OutputManifest(str(tmp_path / 'index.db'))
+    now = time.time()
+    stale = _write_session(layout, manifest, _sid('aa'), 100, now - 1000)
+    old = _write_session(layout, manifest, _sid('bb'), 100, now - 30)
+    mid = _write_session(layout, manifest, _sid('cc'), 100, now - 20)
+    new = _write_session(layout, manifest, _sid('dd'), 100, now - 10)
+    retention = RetentionManager(manifest, layout, max_bytes=250, max_age=500)
+
+    retention.evict_by_age_and_size(now)
+
+    assert not stale.exists() and not old.exists()
+    assert mid.exists() and new.exists()
+    assert manifest.total_bytes() == 200
+    assert retention.evicted == {'age': 1, 'size': 1, 'expired': 0}
+
+
+def test_retention_evicts_expired_sessions_only_when_sure(tmp_path):
+    layout = OutputLayout(str(tmp_path / 'outputs'))
+    manifest = OutputManifest(str(tmp_path / 'index.db'))
+    now = time.time()
+    gone = _write_session(layout, manifest, _sid('aa'), 10, now - 7200)
+    unknown = _write_session(layout, manifest, _sid('bb'), 10, now - 7200)
+    live = _write_session(layout, manifest, _sid('cc'), 10, now - 7200)
+    recent = _write_session(layout, manifest, _sid('dd'), 10, now)
+    answers = {_sid('aa'): False, _sid('bb'): None, _sid('cc'): True, _sid('dd'): False}
+
+    async def is_live(session_id):
+        return answers[session_id]
+
+    retention = RetentionManager(manifest, layout, is_live=is_live, expired_grace=3600)
+    asyncio.run(retention.evict_expired(now))
+
+    assert not gone.exists()
+    assert unknown.exists() and live.exists() and recent.exists()
+    assert retention.evicted['expired'] == 1
+    assert manifest.count() == 3 and manifest.total_bytes() == 30
+
+
+def test_layout_accepts_only_server_issued_ids(tmp_path):
+    layout = OutputLayout(str(tmp_path / 'outputs'))
+    for bad in ('/tmp/victim', '../../etc', 'a/b', '', '..', 'ab', 'batch', 'abc123', _sid('AB')):
+        with pytest.raises(ValueError):
+            layout.session_dir(bad)
+        assert layout.find(bad, 'cam.png') is None
+    assert not layout.contains(tmp_path / 'outputs' / '..' / 'models')
+    assert layout.contains(layout.session_dir(_sid('abc')))
+
+
+def test_eviction_never_deletes_outside_the_output_root(tmp_path):
+    layout = OutputLayout(str(tmp_path / 'outputs'))
+    manifest = OutputManifest(str(tmp_path / 'index.db'))
+    victim = tmp_path / 'models'
+    victim.mkdir()
+    (victim / 'model.h5').write_bytes(b'weights')
+    manifest.add('models', str(victim), 7, at=0)
+    manifest.add('../models', str(tmp_path / 'outputs' / '..' / 'models'), 7, at=0)
+    retention = RetentionManager(manifest, layout, max_age=10)
+
+    retention.evict_by_age_and_size(now=1000)
+
+    assert (victim / 'model.h5').exists()
+    assert manifest.count() == 0
+
+
+def test_eviction_removes_the_session_from_the_prediction_index(tmp_path):
+    layout = OutputLayout(str(tmp_path / 'outputs'))
+    db = str(tmp_path / 'index.db')
+    manifest = OutputManifest(db)
+    index = PredictionIndex(db)
+    now = time.time()
+    _write_session(layout, manifest, _sid('aa'), 10, now - 1000)
+    _write_session(layout, manifest, _sid('bb'), 10, now)
+    index.record(_sid('aa'), 'glioma_tumor', 0.9, created_at=now - 1000)
+    index.record(_sid('bb'), 'no_tumor', 0.8, created_at=now)
+    retention = RetentionManager(manifest, layout, max_age=500, on_evict=index.delete_session)
+
+    retention.evict_by_age_and_size(now)
+
+    assert index.latest(_sid('aa')) is None and index.history(_sid('aa')) == []
+    assert [s['session_id'] for s in index.list_sessions()] == [_sid('bb')]
+
+
+def test_eviction_of_short_or_reserved_ids_leaves_shared_directories(tmp_path):
+    root = tmp_path / 'outputs'
+    layout = OutputLayout(str(root))
+    manifest = OutputManifest(str(tmp_path / 'index.db'))
+    victim = _write_session(layout, manifest, _sid('ab'), 10, at=time.time())
+    (root / 'batch').mkdir()
+    (root / 'batch' / 'global_qa.json').write_text('[]')
+    # rows a client-chosen id could have produced before ids were restricted to uuid4
+    manifest.add('ab', str(root / 'ab'), 1, at=0)
+    manifest.add('batch', str(root / 'batch'), 1, at=0)
+    manifest.add(_sid('cd'), str(root / 'ab'), 1, at=0)
+    retention = RetentionManager(manifest, layout, max_age=10)
+
+    retention.evict_by_age_and_size(now=1000)
+
+    assert (victim / 'cam.png').exists()
+    assert (root / 'batch' / 'global_qa.json').exists()
+    assert manifest.count() == 1
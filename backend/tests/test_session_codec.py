@@ -0,0 +1,46 @@
+import pytest
+
+from utils import session_codec
+from utils.session_codec import JsonCodec, decode, make_codec
+
+SESSION = {
+    'last_prediction': 'glioma_tumor',
+    'last_confidence': 0.9731,
+    'top_k': [['glioma_tumor', 0.9731], ['meningioma_tumor', 0.02]],
+    'probs': {'glioma_tumor': 0.9731, 'meningioma_tumor': 0.02, 'no_tumor': 0.005, 'pituitary_tumor': 0.0019},
+    'explanation': 'The model found features consistent with a glioma. ' * 40,
+}
+
+
+def test_json_codec_matches_legacy_format():
+    raw = JsonCodec().encode(SESSION)
+    assert raw.startswith('{') and ', ' not in raw
+    assert decode(raw) == SESSION
+    assert decode(raw.encode()) == SESSION
+    assert decode(None) is None
+
+
+@pytest.mark.parametrize('compression', [None, 'zstd', 'lz4'])
+def test_msgpack_codec_round_trips_and_reads_json(compression):
+    pytest.importorskip('msgpack')
+    if compression == 'zstd':
+        pytest.importorskip('zstandard')
+    if compression == 'lz4':
+        pytest.importorskip('lz4')
+    codec = session_codec.MsgpackCodec(compression, threshold=256)
+
+    small, large = codec.encode(0.9731), codec.encode(SESSION)
+    assert small.startswith(session_codec.MAGIC + session_codec._MSGPACK)
+    assert decode(small) == 0.9731 and decode(large) == SESSION
+    assert len(large) < len(JsonCodec().encode(SESSION))
+    assert codec.stats()['compressed'] == (1 if compression else 0)
+    # values written before the codec switch are still readable
+    assert codec.decode(b'{"last_prediction":"no_tumor"}') == {'last_prediction': 'no_tumor'}
+
+
+def test_make_codec_falls_back_when_libraries_are_missing(monkeypatch):
+    monkeypatch.setattr(session_codec, 'msgpack', None)
+    assert make_codec('msgpack', 'zstd').name == 'json'
+    assert make_codec('nope').name == 'json'
+    with pytest.raises(ValueError):
+        decode(session_codec.MAGIC + session_codec._MSGPACK + b'\x80')
@@ -0,0 +1,249 @@
+import asyncio
+import json
+
+import pytest
+
+from utils.session_store import MemorySessionStore, RedisSessionStore
+
+
+def _fake_redis():
+    fakeredis = pytest.importorskip('fakeredis')
+    return fakeredis.FakeAsyncRedis(decode_responses=True)
+
+
+def test_memory_store_fields_and_history():
+    store = MemorySessionStore()
+
+    async def run():
+        await store.create('s1')
+        await store.update('s1', {'last_prediction': 'glioma_tumor', 'last_confidence': 0.9},
+                           [{'role': 'assistant', 'message': 'hi'}])
+        await store.update('s1', history=[{'role': 'user', 'message': 'q'}])
+        return await store.get('s1'), await store.get_fields('s1', 'last_prediction', 'top_k')
+
+    s, fields = asyncio.run(run())
+    assert s['last_confidence'] == 0.9
+    assert [h['message'] for h in s['history']] == ['hi', 'q']
+    assert fields == {'last_prediction': 'glioma_tumor', 'top_k': None}
+
+
+def test_redis_store_uses_hash_fields_and_list():
+    client = _fake_redis()
+    store = RedisSessionStore(client, ttl=100)
+
+    async def run():
+        await store.update('s1', {'last_prediction': 'no_tumor', 'probs': {'no_tumor': 0.8}},
+                           [{'role': 'assistant', 'message': 'a'}])
+        await store.update('s1', {'last_confidence': 0.8}, [{'role': 'user', 'message': 'b'}])
+        return (
+            await store.get('s1'),
+            await store.get_fields('s1', 'last_prediction', 'last_confidence'),
+            await client.type('sess:s1'),
+            await client.ttl('sess:s1:history'),
+        )
+
+    s, fields, key_type, ttl = asyncio.run(run())
+    assert key_type == 'hash'
+    assert 0 < ttl <= 100
+    assert s['probs'] == {'no_tumor': 0.8}
+    assert [h['message'] for h in s['history']] == ['a', 'b']
+    assert fields == {'last_prediction': 'no_tumor', 'last_confidence': 0.8}
+
+
+def test_redis_store_migrates_legacy_blob():
+    client = _fake_redis()
+    store = RedisSessionStore(client)
+    legacy = {'last_prediction': 'glioma_tumor', 'last_confidence': 0.7,
+              'history': [{'role': 'assistant', 'message': 'old'}]}
+
+    async def run():
+        await client.set('session:s1', json.dumps(legacy))
+        fields = await store.get_fields('s1', 'last_prediction')
+        return fields, await store.get('s1'), await client.exists('session:s1')
+
+    fields, s, legacy_left = asyncio.run(run())
+    assert fields == {'last_prediction': 'glioma_tumor'}
+    assert s['history'] == legacy['history']
+    assert legacy_left == 0
+    assert store.migrated == 1
+
+
+def test_redis_store_msgpack_codec_reads_existing_json_values():
+    fakeredis = pytest.importorskip('fakeredis')
+    pytest.importorskip('msgpack')
+    from utils.session_codec import make_codec
+
+    client = fakeredis.FakeAsyncRedis(decode_responses=False)
+    old = RedisSessionStore(client)
+    store = RedisSessionStore(client, codec=make_codec('msgpack', 'none', threshold=64))
+
+    async def run():
+        await old.update('codec', {'last_prediction': 'no_tumor', 'top_k': [['no_tumor', 0.8]]},
+                         [{'role': 'assistant', 'message': 'json'}])
+        await store.update('codec', {'last_confidence': 0.8}, [{'role': 'user', 'message': 'x' * 100}])
+        return await store.get('codec'), await client.hget('sess:codec', 'last_confidence')
+
+    s, raw = asyncio.run(run())
+    assert s['last_prediction'] == 'no_tumor' and s['top_k'] == [['no_tumor', 0.8]]
+    assert s['last_confidence'] == 0.8
+    assert [h['message'] for h in s['history']] == ['json', 'x' * 100]
+    assert raw.startswith(b'\xc1')
+    assert store.stats()['codec']['name'] == 'msgpack'
+
+
+def _entries(n, start=0):
+    return [{'role': 'user', 'message': str(i)} for i in range(start, start + n)]
+
+
+def test_memory_history_is_capped_and_spilled():
+    spilled = []
+    store = MemorySessionStore(history_max=3, spill=lambda sid, entries: spilled.extend(entries))
+
+    async def run():
+        await store.update('s1', history=_entries(2))
+        await store.update('s1', history=_entries(3, start=2))
+        return await store.get('s1'), await store.get('s1', limit=2)
+
+    full, window = asyncio.run(run())
+    assert [h['message'] for h in full['history']] == ['2', '3', '4']
+    assert [h['message'] for h in window['history']] == ['3', '4']
+    assert [h['message'] for h in spilled] == ['0', '1']
+
+
+def test_redis_history_is_trimmed_with_and_without_spill():
+    client = _fake_redis()
+    spilled = []
+    capped = RedisSessionStore(client, history_max=3)
+    spilling = RedisSessionStore(client, prefix='spill:', history_max=3,
+                                 spill=lambda sid, entries: spilled.extend(entries))
+
+    async def run():
+        for store in (capped, spilling):
+            await store.update('s1', history=_entries(2))
+            await store.update('s1', {'last_prediction': 'x'}, _entries(3, start=2))
+        return await capped.get('s1'), await spilling.get('s1', limit=2)
+
+    capped_s, window = asyncio.run(run())
+    assert [h['message'] for h in capped_s['history']] == ['2', '3', '4']
+    assert [h['message'] for h in window['history']] == ['3', '4']
+    assert [h['message'] for h in spilled] == ['0', '1']
+
+
+def test_memory_store_evicts_lru_and_expires_idle_sessions():
+    store = MemorySessionStore(max_sessions=2, ttl=60)
+
+    async def run():
+        await store.update('a', {'x': 1})
+        await store.update('b', {'x': 2})
+        await store.get('a')  # 'b' becomes least recently used
+        await store.update('c', {'x': 3})
+        return await store.get('a'), await store.get('b'), await store.get('c')
+
+    a, b, c = asyncio.run(run())
+    assert a['x'] == 1 and b == {} and c['x'] == 3
+    assert store.stats()['evicted_lru'] == 1
+
+    for s in store._sessions.values():
+        s.expires = 0
+    assert store.sweep() == 2
+    assert store.stats()['sessions'] == 0 and store.stats()['bytes'] == 0
+
+
+def test_memory_store_byte_budget_tracks_updates():
+    store = MemorySessionStore(max_bytes=400, history_max=5)
+
+    async def run():
+        await store.update('a', {'last_prediction': 'x' * 50}, _entries(5))
+        size_a = store.stats()['bytes']
+        await store.update('a', {'last_prediction': 'y'}, _entries(5, start=5))
+        shrunk = store.stats()['bytes']
+        await store.update('b', {'blob': 'z' * 300})
+        return size_a, shrunk
+
+    size_a, shrunk = asyncio.run(run())
+    assert shrunk < size_a
+    assert store.stats()['sessions'] == 1
+    assert store.stats()['bytes'] <= 400
+
+
+def test_cached_store_invalidates_across_processes():
+    from utils.session_store import CachedSessionStore
+
+    client = _fake_redis()
+    a = CachedSessionStore(RedisSessionStore(client), client)
+    b = CachedSessionStore(RedisSessionStore(client), client)
+
+    async def wait_for(cond):
+        for _ in range(200):
+            if cond():
+                return
+            await asyncio.sleep(0.01)
+
+    async def run():
+        tasks = [asyncio.create_task(s.run_subscriber()) for s in (a, b)]
+        await wait_for(lambda: a.subscribed and b.subscribed)
+        await a.update('s1', {'last_prediction': 'glioma_tumor'})
+        await wait_for(lambda: b.received >= 1)
+        first = await b.get_fields('s1', 'last_prediction')
+        again = await b.get_fields('s1', 'last_prediction')
+        await a.update('s1', {'last_prediction': 'no_tumor'})
+        await wait_for(lambda: b.received >= 2)
+        after = await b.get_fields('s1', 'last_prediction')
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return first, again, after
+
+    first, again, after = asyncio.run(run())
+    assert first == again == {'last_prediction': 'glioma_tumor'}
+    assert after == {'last_prediction': 'no_tumor'}
+    cache = b.stats()['cache']
+    assert cache['hits'] == 1 and cache['misses'] == 2 and cache['invalidations_received'] == 2
+    assert a.stats()['cache']['invalidations_received'] == 0
+
+
+def test_cached_store_bypasses_cache_without_subscriber():
+    from utils.session_store import CachedSessionStore
+
+    client = _fake_redis()
+    store = CachedSessionStore(RedisSessionStore(client), client)
+
+    async def run():
+        await store.update('s1', {'x': 1})
+        return await store.get_fields('s1', 'x')
+
+    assert asyncio.run(run()) == {'x': 1}
+    assert store.stats()['cache']['bypassed'] == 1
+
+
+def test_cached_store_does_not_cache_a_read_that_overlaps_a_local_write():
+    from utils.session_store import CachedSessionStore
+
+    client = _fake_redis()
+    store = CachedSessionStore(RedisSessionStore(client), client)
+    store.subscribed = True  # serve from the cache without running the subscriber
+    fetch = store.store.fetch_fields
+    read_done = asyncio.Event()
+    release = asyncio.Event()
+
+    async def slow_fetch(session_id):
+        fields = await fetch(session_id)
+        read_done.set()
+        await release.wait()
+        return fields
+
+    store.store.fetch_fields = slow_fetch
+
+    async def run():
+        await store.store.update('s1', {'last_prediction': 'glioma_tumor'})
+        reader = asyncio.create_task(store.get_fields('s1', 'last_prediction'))
+        await read_done.wait()
+        await store.update('s1', {'last_prediction': 'no_tumor'})
+        release.set()
+        stale = await reader
+        store.store.fetch_fields = fetch
+        return stale, await store.get_fields('s1', 'last_prediction')
+
+    stale, after = asyncio.run(run())
+    assert stale == {'last_prediction': 'glioma_tumor'}
+    assert after == {'last_prediction': 'no_tumor'}
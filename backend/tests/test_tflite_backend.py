@@ -0,0 +1,40 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+tf = pytest.importorskip('tensorflow')
+
+from utils.tflite_backend import TFLiteModel
+
+
+@pytest.fixture(scope='module')
+def models(tmp_path_factory):
+    tf.keras.utils.set_random_seed(0)
+    model = tf.keras.Sequential([
+        tf.keras.Input((8, 8, 3)),
+        tf.keras.layers.Conv2D(4, 3, activation='relu'),
+        tf.keras.layers.Flatten(),
+        tf.keras.layers.Dense(4, activation='softmax'),
+    ])
+    path = tmp_path_factory.mktemp('tflite') / 'model.tflite'
+    path.write_bytes(tf.lite.TFLiteConverter.from_keras_model(model).convert())
+    return model, TFLiteModel(str(path))
+
+
+def test_matches_keras_for_any_batch_size(models):
+    model, lite = models
+    assert lite.input_shape == (8, 8, 3)
+    rng = np.random.default_rng(0)
+    for n in (1, 3, 1):
+        x = rng.random((n, 8, 8, 3)).astype('float32')
+        np.testing.assert_allclose(lite.predict(x), model.predict(x, verbose=0), atol=1e-5)
+
+
+def test_concurrent_threads_use_separate_interpreters(models):
+    model, lite = models
+    xs = [np.random.default_rng(i).random((i % 3 + 1, 8, 8, 3)).astype('float32') for i in range(12)]
+    with ThreadPoolExecutor(4) as pool:
+        outs = list(pool.map(lite.predict, xs))
+    for x, out in zip(xs, outs):
+        np.testing.assert_allclose(out, model.predict(x, verbose=0), atol=1e-5)
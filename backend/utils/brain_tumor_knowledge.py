@@ -1,23 +1,19 @@
+try:
+    from utils.knowledge_base import get_knowledge_base
+except ImportError:  # imported as a top-level module
+    from knowledge_base import get_knowledge_base
+
+
 def get_tumor_info(label):
     """Get detailed information about the tumor type."""
-    info = {
-        "Glioma": {
-            "description": "A type of tumor that starts in the glial cells of the brain.",
-            "symptoms": ["Headaches", "Seizures", "Cognitive changes"],
-            "treatment": ["Surgery", "Radiation", "Chemotherapy"]
-        },
-        "Meningioma": {
-            "description": "A tumor that arises from the meninges.",
-            "symptoms": ["Headaches", "Vision problems", "Seizures"],
-            "treatment": ["Observation", "Surgery", "Radiation"]
-        },
-        "Pituitary": {
-            "description": "Tumor in the pituitary gland.",
-            "symptoms": ["Hormonal issues", "Vision changes", "Headaches"],
-            "treatment": ["Medication", "Surgery", "Radiation"]
-        }
+    entry = get_knowledge_base().get(label)
+    if entry is None or not entry.treatments:
+        return {"description": "Unknown tumor type"}
+    return {
+        "description": entry.description,
+        "symptoms": list(entry.symptoms),
+        "treatment": list(entry.treatments)
     }
-    return info.get(label, {"description": "Unknown tumor type"})
 
 def answer_question(question):
     """Answer questions about brain tumors."""
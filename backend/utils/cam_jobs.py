@@ -0,0 +1,139 @@
+"""Background Grad-CAM jobs.
+
+`/predict` can answer with the label and confidence immediately and hand the
+CAM rendering (Grad-CAM pass plus PNG encoding) to a `CamJobStore`. Clients
+fetch the result later from `/predict/{job_id}/cam`, optionally long-polling
+until the job finishes.
+"""
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger('fastapi_app.cam_jobs')
+
+
+class CamJob:
+    __slots__ = ('job_id', 'status', 'result', 'error', 'created', 'finished', 'done', 'callbacks')
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.status = 'pending'
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created = time.time()
+        self.finished: Optional[float] = None
+        self.done = asyncio.Event()
+        self.callbacks: list = []
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'job_id': self.job_id, 'status': self.status, 'error': self.error}
+
+
+class CamJobStore:
+    """Run CAM jobs on `executor` and keep their results for `ttl` seconds.
+
+    `executor` is anything with an awaitable `run(fn, *args)` (see
+    `utils.inference.InferenceExecutor`). At most `max_jobs` jobs are retained;
+    the oldest are dropped first.
+    """
+
+    def __init__(self, executor, ttl: float = 600.0, max_jobs: int = 1000):
+        self.executor = executor
+        self.ttl = ttl
+        self.max_jobs = max_jobs
+        self._jobs: 'OrderedDict[str, CamJob]' = OrderedDict()
+        self._tasks = set()
+        self._completed = 0
+        self._failed = 0
+
+    def submit(self, fn: Callable, *args, on_done: Optional[Callable] = None) -> str:
+        """Schedule `fn(*args)` in the background and return the new job id.
+
+        `on_done(result)` (plain or async function) is called after a successful run,
+        before the job is reported as finished.
+        """
+        self._evict()
+        job = CamJob(uuid.uuid4().hex)
+        self._jobs[job.job_id] = job
+        task = asyncio.get_running_loop().create_task(self._run(job, fn, args, on_done))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job.job_id
+
+    async def _run(self, job: CamJob, fn: Callable, args, on_done: Optional[Callable] = None):
+        try:
+            job.result = await self.executor.run(fn, *args)
+            job.status = 'done'
+            self._completed += 1
+        except Exception as e:
+            logger.warning('CAM job %s failed: %s', job.job_id, e)
+            job.status = 'failed'
+            job.error = str(e)
+            self._failed += 1
+        try:
+            # run the callbacks before waking pollers so whatever they publish is visible to them
+            if on_done is not None:
+                job.callbacks.insert(0, on_done)
+            i = 0
+            while job.status == 'done' and i < len(job.callbacks):
+                try:
+                    res = job.callbacks[i](job.result)
+                    if asyncio.iscoroutine(res):
+                        await res
+                except Exception as e:
+                    logger.warning('CAM job %s callback failed: %s', job.job_id, e)
+                i += 1
+        finally:
+            job.callbacks = []
+            job.finished = time.time()
+            job.done.set()
+
+    def add_done_callback(self, job_id: str, fn: Callable) -> bool:
+        """Also call `fn(result)` when the pending job succeeds (like `on_done`).
+
+        Returns False if the job is unknown or has already finished.
+        """
+        job = self.get(job_id)
+        if job is None or job.done.is_set():
+            return False
+        job.callbacks.append(fn)
+        return True
+
+    def get(self, job_id: str) -> Optional[CamJob]:
+        job = self._jobs.get(job_id)
+        if job is not None and time.time() - job.created > self.ttl:
+            self._jobs.pop(job_id, None)
+            return None
+        return job
+
+    async def wait(self, job_id: str, timeout: float = 0.0) -> Optional[CamJob]:
+        """Return the job, waiting up to `timeout` seconds for it to finish (long-poll)."""
+        job = self.get(job_id)
+        if job is None or job.done.is_set() or timeout <= 0:
+            return job
+        try:
+            await asyncio.wait_for(job.done.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return job
+
+    def _evict(self):
+        now = time.time()
+        while self._jobs:
+            oldest = next(iter(self._jobs.values()))
+            if len(self._jobs) >= self.max_jobs or now - oldest.created > self.ttl:
+                self._jobs.popitem(last=False)
+            else:
+                break
+
+    def stats(self) -> Dict[str, Any]:
+        pending = sum(1 for j in self._jobs.values() if j.status == 'pending')
+        return {
+            'jobs': len(self._jobs),
+            'pending': pending,
+            'completed': self._completed,
+            'failed': self._failed,
+        }
@@ -0,0 +1,512 @@
+"""Precompiled /explain reports and an LRU of rendered responses.
+
+The /explain report is several kilobytes of text around the per-label
+disease information, symptoms and treatment side effects of the knowledge
+base (`utils.knowledge_base`). Everything in it depends only on the label and
+the confidence formatted to one decimal place (plus the generation time in
+the copy stored in the session history).
+
+`ExplainTemplates` renders each label once at startup with placeholder
+markers and keeps the literal chunks between them, so rendering a report is a
+`str.join`. Rendered responses are kept in a small LRU keyed by
+(label, confidence text), and `etag()` derives a response's ETag from the
+template version, label and confidence without rendering anything, so a
+conditional request can be answered with 304 up front.
+
+The chat messages /predict returns are compiled per label the same way, with
+markers for the confidence and the description, which are filled in per
+request rather than cached.
+"""
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from utils.knowledge_base import KnowledgeBase, LabelKnowledge, get_knowledge_base, thaw
+
+_CONFIDENCE = '\x00confidence\x00'
+_GENERATED = '\x00generated\x00'
+_DESCRIPTION = '\x00description\x00'
+
+
+def _render(knowledge: LabelKnowledge, confidence: str, generated: str) -> Tuple[str, List[Dict[str, str]]]:
+    """Build the full report and the response sections for one label."""
+    # 1. TUMOR PERCENTAGE (Confidence Score)
+    tumor_percentage = {
+        'confidence': f"{confidence}%",
+        'interpretation': f"Model confidence in this prediction is {confidence}%"
+    }
+    
+    # 2-4. DISEASE INFORMATION, SYMPTOMS and TREATMENT SIDE EFFECTS from the knowledge base
+    disease_info = thaw(knowledge.disease_info)
+    symptoms = thaw(knowledge.symptom_details)
+    side_effects = thaw(knowledge.treatment_side_effects)
+
+    # 5. DOCTOR RECOMMENDATION
+    doctor_recommendation = {
+        'urgency': 'Schedule appointment with a neurologist or neurosurgeon',
+        'recommendations': [
+            '1. Get professional medical evaluation from a qualified neurologist or radiologist',
+            '2. Share this MRI scan and analysis with your healthcare provider',
+            '3. Discuss treatment options if needed (surgery, radiation, medication, monitoring)',
+            f'4. Get a second opinion from another medical specialist',
+            '5. Ask about follow-up imaging schedule',
+            '6. Discuss symptom management strategies',
+            '7. Create a treatment plan with your medical team'
+        ],
+        'important_note': '⚠️ This is an AI-generated prediction and NOT a medical diagnosis. Professional medical evaluation is ESSENTIAL for proper diagnosis and treatment planning.',
+        'emergency': 'Seek emergency care if experiencing severe headaches, loss of consciousness, severe vision loss, or difficulty breathing.'
+    }
+    
+    # Compile comprehensive explanation with better formatting
+    comprehensive_explanation = f"""
+╔══════════════════════════════════════════════════════════════════════════════╗
+║          COMPREHENSIVE BRAIN MRI ANALYSIS REPORT                            ║
+║                     Professional Medical Analysis                           ║
+╚══════════════════════════════════════════════════════════════════════════════╝
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+📊 1. TUMOR DETECTION CONFIDENCE (Model Accuracy)
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+   Confidence Score: {tumor_percentage['confidence']}
+   
+   {tumor_percentage['interpretation']}
+   
+   • What this means: The AI model has analyzed your brain MRI and is 
+     {confidence}% confident in its assessment.
+   • Higher percentage = Higher certainty in the prediction
+   • However, this is NOT a medical diagnosis - professional evaluation needed
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+🔬 2. DISEASE INFORMATION
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+   Detected Condition: {disease_info.get('name', 'Unknown')}
+   
+   Description:
+   {disease_info.get('description', 'N/A')}
+   
+   {f"Classification: {disease_info.get('types', disease_info.get('status', 'N/A'))}" if 'types' in disease_info or 'status' in disease_info else ''}
+   {f"Source/Origin: {disease_info.get('origin', '')}" if 'origin' in disease_info else ''}
+   {f"Prevalence: {disease_info.get('prevalence', '')}" if 'prevalence' in disease_info else ''}
+   
+   Key Information:
+   {format_disease_details(disease_info)}
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+⚠️  3. COMMON SYMPTOMS & WARNING SIGNS
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+{format_symptoms_detailed(symptoms)}
+
+   Important Note:
+   • Not all patients experience all symptoms
+   • Symptoms depend on tumor location, size, and type
+   • Presence of symptoms doesn't confirm diagnosis
+   • Absence of symptoms doesn't mean it's not serious
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+💊 4. POTENTIAL SIDE EFFECTS & TREATMENT CONSIDERATIONS
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+{format_side_effects_detailed(side_effects)}
+
+   Treatment Selection:
+   • Treatment choice depends on: tumor size, location, grade, patient age, 
+     overall health, and patient preferences
+   • Multiple treatment options may be available
+   • Your doctor will recommend the best approach for your specific case
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+🏥 5. URGENT: DOCTOR VISIT RECOMMENDATIONS
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+   RECOMMENDED ACTION: {doctor_recommendation['urgency']}
+   
+   PRIORITY TASKS:
+   ✓ {doctor_recommendation['recommendations'][0] if len(doctor_recommendation['recommendations']) > 0 else ''}
+   ✓ {doctor_recommendation['recommendations'][1] if len(doctor_recommendation['recommendations']) > 1 else ''}
+   ✓ {doctor_recommendation['recommendations'][2] if len(doctor_recommendation['recommendations']) > 2 else ''}
+   ✓ {doctor_recommendation['recommendations'][3] if len(doctor_recommendation['recommendations']) > 3 else ''}
+   ✓ {doctor_recommendation['recommendations'][4] if len(doctor_recommendation['recommendations']) > 4 else ''}
+   ✓ {doctor_recommendation['recommendations'][5] if len(doctor_recommendation['recommendations']) > 5 else ''}
+   ✓ {doctor_recommendation['recommendations'][6] if len(doctor_recommendation['recommendations']) > 6 else ''}
+   
+   SPECIALIST TO CONSULT:
+   • Neurologist (specialist in nervous system disorders)
+   • Neurosurgeon (if surgery is considered)
+   • Oncologist (if cancer-related)
+   • Radiologist (for imaging interpretation)
+   
+   WHAT TO BRING TO YOUR APPOINTMENT:
+   • This MRI scan and analysis
+   • Any previous medical records
+   • List of current medications
+   • Family medical history
+   • Symptom diary
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+🚨 EMERGENCY WARNING SIGNS - SEEK IMMEDIATE MEDICAL ATTENTION
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+If you experience ANY of the following, go to the emergency room immediately:
+   • Severe, sudden headache (worst headache of your life)
+   • Loss of consciousness or fainting
+   • Severe vision loss or eye pain
+   • Difficulty breathing or swallowing
+   • Severe weakness or paralysis
+   • Uncontrollable seizures
+   • Severe confusion or inability to communicate
+   • Significant change in mental status
+   • Difficulty walking or loss of balance
+
+Call Emergency Services (911 or your local emergency number) if these occur.
+
+╔══════════════════════════════════════════════════════════════════════════════╗
+║                          IMPORTANT DISCLAIMERS                              ║
+╠══════════════════════════════════════════════════════════════════════════════╣
+║ ⚠️  CRITICAL LEGAL NOTICE:                                                   ║
+║                                                                              ║
+║ • This analysis is AI-generated and is NOT a medical diagnosis              ║
+║ • It is NOT a substitute for professional medical evaluation                ║
+║ • AI predictions can be incorrect - professional confirmation is ESSENTIAL  ║
+║ • Only a qualified medical professional can provide a diagnosis             ║
+║ • Treatment decisions MUST be made with your healthcare provider            ║
+║ • Do NOT delay seeking medical care based on this analysis                  ║
+║ • Always consult with a licensed physician or medical specialist            ║
+║ • This information is for educational purposes only                         ║
+║                                                                              ║
+║ Your health and safety are paramount. Seek professional medical advice.     ║
+╚══════════════════════════════════════════════════════════════════════════════╝
+
+Generated: {generated}
+Report Type: Comprehensive AI-Assisted Analysis
+Confidence Level: {confidence}%
+"""
+
+    # Response body: the same content as individual colored sections
+    detailed_sections = [
+        {
+            'type': 'analysis',
+            'title': '📊 TUMOR DETECTION CONFIDENCE',
+            'text': f"""Confidence Score: {tumor_percentage['confidence']}
+
+{tumor_percentage['interpretation']}
+
+• What this means: The AI model has analyzed your brain MRI and is {confidence}% confident in its assessment.
+• Higher percentage = Higher certainty in the prediction
+• However, this is NOT a medical diagnosis - professional evaluation needed"""
+        },
+        {
+            'type': 'disease',
+            'title': '🔬 DISEASE INFORMATION',
+            'text': f"""Detected Condition: {disease_info.get('name', 'Unknown')}
+
+Description:
+{disease_info.get('description', 'N/A')}
+
+{f"Classification: {disease_info.get('types', disease_info.get('status', 'N/A'))}" if 'types' in disease_info or 'status' in disease_info else ''}
+{f"Source/Origin: {disease_info.get('origin', '')}" if 'origin' in disease_info else ''}
+{f"Prevalence: {disease_info.get('prevalence', '')}" if 'prevalence' in disease_info else ''}"""
+        },
+        {
+            'type': 'symptoms',
+            'title': '⚠️ COMMON SYMPTOMS & WARNING SIGNS',
+            'text': f"""{format_symptoms_detailed(symptoms)}
+
+Important Note:
+• Not all patients experience all symptoms
+• Symptoms depend on tumor location, size, and type
+• Presence of symptoms doesn't confirm diagnosis
+• Absence of symptoms doesn't mean it's not serious"""
+        },
+        {
+            'type': 'treatment',
+            'title': '💊 POTENTIAL SIDE EFFECTS & TREATMENT',
+            'text': f"""{format_side_effects_detailed(side_effects)}
+
+Treatment Selection:
+• Treatment choice depends on: tumor size, location, grade, patient age, overall health, and patient preferences
+• Multiple treatment options may be available
+• Your doctor will recommend the best approach for your specific case"""
+        },
+        {
+            'type': 'recommendation',
+            'title': '🏥 DOCTOR VISIT RECOMMENDATIONS',
+            'text': f"""RECOMMENDED ACTION: {doctor_recommendation['urgency']}
+
+PRIORITY TASKS:
+✓ Get professional medical evaluation from a qualified neurologist or radiologist
+✓ Share this MRI scan and analysis with your healthcare provider
+✓ Discuss treatment options if needed (surgery, radiation, medication, monitoring)
+✓ Get a second opinion from another medical specialist
+✓ Ask about follow-up imaging schedule
+✓ Discuss symptom management strategies
+✓ Create a treatment plan with your medical team
+
+SPECIALIST TO CONSULT:
+• Neurologist (specialist in nervous system disorders)
+• Neurosurgeon (if surgery is considered)
+• Oncologist (if cancer-related)
+• Radiologist (for imaging interpretation)
+
+⚠️ CRITICAL: This is an AI-generated prediction and NOT a medical diagnosis. Professional medical evaluation is ESSENTIAL."""
+        }
+    ]
+    return comprehensive_explanation, detailed_sections
+
+
+def _render_messages(conf_percent: str, detected_condition: str, description: str) -> List[Tuple[str, str]]:
+    """Build the /predict chat messages (type, text) for one detected condition."""
+    messages = []
+    
+    # Message 1: Tumor Detection Confidence
+    msg1 = f"📊 **TUMOR DETECTION CONFIDENCE (Model Accuracy)**\n\n"
+    msg1 += f"Confidence Score: {conf_percent}%\n\n"
+    msg1 += f"• What this means: The AI model has analyzed your brain MRI and is {conf_percent}% confident in its assessment.\n"
+    msg1 += f"• Higher percentage = Higher certainty in the prediction\n"
+    msg1 += f"• ⚠️ Important: This is NOT a medical diagnosis - professional evaluation is always needed."
+    messages.append(('analysis', msg1))
+    
+    # Message 2: Disease Information
+    msg2 = f"🔍 **DISEASE INFORMATION**\n\n"
+    msg2 += f"Detected Condition: {detected_condition}\n\n"
+    
+    if (detected_condition.lower() == 'no tumor') or ('normal' in detected_condition.lower()):
+        msg2 += f"Description: The brain MRI scan shows no detectable tumor.\n"
+        msg2 += f"Classification: Normal brain tissue detected\n\n"
+        msg2 += f"✅ Key Information:\n"
+        msg2 += f"• Status: Normal brain tissue detected\n"
+        msg2 += f"• Note: This is a positive result indicating normal brain structure"
+    else:
+        msg2 += f"Description: {description}\n\n"
+        msg2 += f"📋 Classification Details:\n"
+        msg2 += f"• Tumor Type: {detected_condition}\n"
+        msg2 += f"• Confidence: {conf_percent}%"
+    messages.append(('disease', msg2))
+    
+    # Message 3: Symptoms & Warning Signs
+    msg3 = f"⚠️ **COMMON SYMPTOMS & WARNING SIGNS**\n\n"
+    if (detected_condition.lower() == 'no tumor') or ('normal' in detected_condition.lower()):
+        msg3 += f"STATUS: No tumor-related symptoms expected\n"
+        msg3 += f"Normal brain tissue indicates no pathology detected\n\n"
+        msg3 += f"Important Notes:\n"
+        msg3 += f"• Not all patients experience all symptoms\n"
+        msg3 += f"• Symptoms depend on tumor location, size, and type\n"
+        msg3 += f"• Presence of symptoms doesn't confirm diagnosis\n"
+        msg3 += f"• Absence of symptoms doesn't mean it's not serious"
+    else:
+        msg3 += f"Potential Symptoms (if tumor confirmed):\n"
+        msg3 += f"• Headaches\n"
+        msg3 += f"• Vision problems\n"
+        msg3 += f"• Balance and coordination issues\n"
+        msg3 += f"• Nausea or vomiting\n\n"
+        msg3 += f"Important Notes:\n"
+        msg3 += f"• Not all patients experience all symptoms\n"
+        msg3 += f"• Symptoms depend on tumor location, size, and type"
+    messages.append(('symptoms', msg3))
+    
+    # Message 4: Side Effects & Treatment
+    msg4 = f"💊 **POTENTIAL SIDE EFFECTS & TREATMENT CONSIDERATIONS**\n\n"
+    msg4 += f"Treatment Selection depends on:\n"
+    msg4 += f"• Tumor size, location, and grade\n"
+    msg4 += f"• Patient age and overall health\n"
+    msg4 += f"• Patient preferences\n\n"
+    msg4 += f"Available Treatment Options:\n"
+    msg4 += f"• Surgery\n"
+    msg4 += f"• Radiation therapy\n"
+    msg4 += f"• Chemotherapy\n"
+    msg4 += f"• Clinical trials\n\n"
+    msg4 += f"Note: Multiple treatment options may be available. Your doctor will recommend the best approach for your specific case."
+    messages.append(('treatment', msg4))
+    
+    # Message 5: Doctor Recommendations
+    msg5 = f"👨‍⚕️ **URGENT: DOCTOR VISIT RECOMMENDATIONS**\n\n"
+    msg5 += f"Next Steps:\n"
+    msg5 += f"1. Consult with a Neurologist or Neurosurgeon\n"
+    msg5 += f"2. Have your MRI reviewed by a Radiologist\n"
+    msg5 += f"3. Discuss additional imaging if needed\n"
+    msg5 += f"4. Create a personalized treatment plan\n\n"
+    msg5 += f"⚠️ Disclaimer:\n"
+    msg5 += f"This AI analysis is a supplementary tool ONLY. Always consult qualified medical professionals for diagnosis and treatment. This report should not replace professional medical advice."
+    messages.append(('recommendation', msg5))
+    
+    return messages
+
+
+def format_disease_details(info):
+    """Format disease information with better detail."""
+    details = []
+    if 'types' in info:
+        details.append(f"   • Type: {info['types']}")
+    if 'origin' in info:
+        details.append(f"   • Origin: {info['origin']}")
+    if 'prevalence' in info:
+        details.append(f"   • Prevalence: {info['prevalence']}")
+    if 'status' in info:
+        details.append(f"   • Status: {info['status']}")
+    if 'note' in info:
+        details.append(f"   • Note: {info['note']}")
+    return '\n'.join(details) if details else "   • No additional details available"
+
+
+def format_symptoms_detailed(symptoms):
+    """Format symptoms with detailed organization."""
+    if not symptoms or len(symptoms) == 0:
+        return "   No specific symptoms expected for this condition."
+    
+    result = []
+    if 'common' in symptoms:
+        result.append("   COMMON SYMPTOMS:")
+        for item in symptoms.get('common', []):
+            result.append(f"      □ {item}")
+    
+    if 'severe' in symptoms:
+        result.append("\n   SEVERE/URGENT SYMPTOMS:")
+        for item in symptoms.get('severe', []):
+            result.append(f"      □ {item}")
+    
+    if 'hormonal' in symptoms:
+        result.append("\n   HORMONAL SYMPTOMS:")
+        for item in symptoms.get('hormonal', []):
+            result.append(f"      □ {item}")
+    
+    if 'local' in symptoms:
+        result.append("\n   LOCAL SYMPTOMS:")
+        for item in symptoms.get('local', []):
+            result.append(f"      □ {item}")
+    
+    if 'status' in symptoms:
+        result.append(f"\n   STATUS: {symptoms['status']}")
+    
+    if 'note' in symptoms:
+        result.append(f"\n   {symptoms['note']}")
+    
+    return '\n'.join(result) if result else "   No specific symptoms listed"
+
+
+def format_side_effects_detailed(effects):
+    """Format side effects with detailed organization."""
+    if not effects or len(effects) == 0:
+        return "   • No treatment side effects expected for this condition."
+    
+    result = []
+    
+    if 'surgery' in effects:
+        result.append("   SURGICAL PROCEDURE SIDE EFFECTS:")
+        for item in effects.get('surgery', []):
+            result.append(f"      • {item}")
+    
+    if 'radiation' in effects:
+        result.append("\n   RADIATION THERAPY SIDE EFFECTS:")
+        for item in effects.get('radiation', []):
+            result.append(f"      • {item}")
+    
+    if 'chemotherapy' in effects:
+        result.append("\n   CHEMOTHERAPY SIDE EFFECTS:")
+        for item in effects.get('chemotherapy', []):
+            result.append(f"      • {item}")
+    
+    if 'medication' in effects:
+        result.append("\n   MEDICATION SIDE EFFECTS:")
+        for item in effects.get('medication', []):
+            result.append(f"      • {item}")
+    
+    if 'observation' in effects:
+        result.append("\n   MONITORING APPROACH:")
+        for item in effects.get('observation', []):
+            result.append(f"      • {item}")
+    
+    if 'note' in effects:
+        result.append(f"\n   Note: {effects['note']}")
+    
+    return '\n'.join(result) if result else "   • No specific side effects listed"
+
+
+def format_side_effects(effects):
+    """Helper to format side effects by category."""
+    result = []
+    for category, details in effects.items():
+        if category != 'note':
+            result.append(f"{category.upper().replace('_', ' ')}:")
+            if isinstance(details, list):
+                for item in details:
+                    result.append(f"  • {item}")
+            else:
+                result.append(f"  {details}")
+    if 'note' in effects:
+        result.append(f"\nNote: {effects['note']}")
+    return '\n'.join(result)
+
+
+class ExplainTemplates:
+    """Per-label compiled /explain output with an LRU of rendered JSON bodies."""
+
+    def __init__(self, knowledge_base: Optional[KnowledgeBase] = None, cache_size: int = 256):
+        knowledge_base = knowledge_base if knowledge_base is not None else get_knowledge_base()
+        self.cache_size = max(1, int(cache_size))
+        self._report: Dict[str, List[str]] = {}
+        self._sections: Dict[str, List[Tuple[str, str, List[str]]]] = {}
+        # label -> (condition name, /predict chat messages with confidence/description markers)
+        self._messages: Dict[str, Tuple[str, List[Tuple[str, str]]]] = {}
+        h = hashlib.sha256()
+        for label in knowledge_base.labels:
+            report, sections = _render(knowledge_base.get(label), _CONFIDENCE, _GENERATED)
+            self._report[label] = report.split(_CONFIDENCE)
+            self._sections[label] = [(s['type'], s['title'], s['text'].split(_CONFIDENCE)) for s in sections]
+            name = knowledge_base.get(label).name
+            self._messages[label] = (name, _render_messages(_CONFIDENCE, name, _DESCRIPTION))
+            h.update(label.encode('utf-8'))
+            h.update(report.encode('utf-8'))
+            h.update(json.dumps(sections).encode('utf-8'))
+        self.version = h.hexdigest()[:16]
+        self._cache: 'OrderedDict[Tuple[str, str], bytes]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, label: str) -> bool:
+        return label in self._sections
+
+    @staticmethod
+    def confidence_text(confidence: Optional[float]) -> str:
+        """The confidence as shown in the report (a percentage with one decimal)."""
+        return f"{(confidence or 0) * 100:.1f}"
+
+    def etag(self, label: str, confidence: str) -> str:
+        digest = hashlib.sha256(f'{self.version}:{label}:{confidence}'.encode('utf-8')).hexdigest()[:32]
+        return f'"{digest}"'
+
+    def body(self, label: str, confidence: str) -> bytes:
+        """JSON body of the /explain response, rendered once per (label, confidence)."""
+        key = (label, confidence)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return cached
+        self.misses += 1
+        sections = [{'type': t, 'title': title, 'text': confidence.join(parts)}
+                    for t, title, parts in self._sections[label]]
+        # same serialisation as JSONResponse
+        rendered = json.dumps({'explanation_sections': sections}, ensure_ascii=False, allow_nan=False,
+                              separators=(',', ':')).encode('utf-8')
+        self._cache[key] = rendered
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return rendered
+
+    def messages(self, label: str, condition: str, confidence: str, description: str) -> List[Dict[str, str]]:
+        """The /predict chat messages; per-request values are filled into the label's compiled text."""
+        compiled = self._messages.get(label)
+        if compiled is None or compiled[0] != condition:
+            return [{'type': kind, 'text': text} for kind, text in _render_messages(confidence, condition, description)]
+        return [{'type': kind, 'text': text.replace(_CONFIDENCE, confidence).replace(_DESCRIPTION, description)}
+                for kind, text in compiled[1]]
+
+    def report(self, label: str, confidence: str, generated: str) -> str:
+        """The full text report (stored in the session history)."""
+        return confidence.join(self._report[label]).replace(_GENERATED, generated)
+
+    def stats(self) -> Dict[str, int]:
+        return {'labels': len(self._sections), 'entries': len(self._cache), 'hits': self.hits, 'misses': self.misses}
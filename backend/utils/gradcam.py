@@ -0,0 +1,142 @@
+"""Grad-CAM engine built once per loaded Keras model.
+
+Building a tf-keras-vis `Gradcam` object per request clones the model, which
+costs more than inference itself. `GradCamEngine` resolves the target conv
+layer once, builds a gradient model and traces the CAM computation with
+`tf.function`, so each request only pays for one forward and backward pass.
+
+`predict_with_cam` goes one step further and serves the class probabilities
+and the CAM from the same tape-recorded forward pass, so a CAM-enabled request
+costs one forward plus one backward pass in total.
+"""
+import logging
+import threading
+from typing import Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger('fastapi_app.gradcam')
+
+_ENGINES: Dict[int, 'GradCamEngine'] = {}
+_ENGINES_LOCK = threading.Lock()
+
+
+def find_target_layer(model) -> Optional[str]:
+    """Return the name of the last layer with a 4-D (N, H, W, C) output."""
+    for layer in reversed(model.layers):
+        try:
+            if hasattr(layer, 'output') and len(layer.output.shape) == 4:
+                return layer.name
+        except Exception:
+            continue
+    return None
+
+
+def _linear_head(layer):
+    """Return a copy of the final layer with a linear activation (like tf-keras-vis ReplaceToLinear)."""
+    cfg = layer.get_config()
+    if cfg.get('activation') in (None, 'linear'):
+        return layer
+    cfg['activation'] = 'linear'
+    head = layer.__class__.from_config(cfg)
+    head.build(tuple(layer.input.shape))
+    head.set_weights(layer.get_weights())
+    head.trainable = False
+    return head
+
+
+class GradCamEngine:
+    """Grad-CAM for one model with the target layer and gradient function prepared up front."""
+
+    def __init__(self, model, layer_name: Optional[str] = None):
+        import tensorflow as tf
+
+        self.model = model
+        self.layer_name = layer_name or find_target_layer(model)
+        if self.layer_name is None:
+            raise ValueError('model has no 4-D layer to use as Grad-CAM target')
+        inputs = model.inputs[0] if len(model.inputs) == 1 else model.inputs
+        target = model.get_layer(self.layer_name)
+        final = model.layers[-1]
+        head = _linear_head(final)
+        # activation stripped from the head; re-applied to logits to recover the model's output
+        self._activation = getattr(final, 'activation', None) if head is not final else None
+        if isinstance(model, tf.keras.Sequential):
+            # Sequential layers may carry several call nodes, so chain the tail layers explicitly
+            idx = model.layers.index(target)
+            self._features = tf.keras.Model(inputs=inputs, outputs=target.output)
+            self._tail = model.layers[idx + 1:-1] + [head]
+        else:
+            self._features = tf.keras.Model(inputs=inputs, outputs=[target.output, final.input])
+            self._tail = None
+            self._head = head
+        in_shape = tuple(model.inputs[0].shape[1:])
+        self._cam_fn = tf.function(
+            self._cam,
+            input_signature=[
+                tf.TensorSpec(shape=(None,) + in_shape, dtype=tf.float32),
+                tf.TensorSpec(shape=(None,), dtype=tf.int32),
+            ],
+        )
+        self._predict_cam_fn = tf.function(
+            self._predict_cam,
+            input_signature=[tf.TensorSpec(shape=(None,) + in_shape, dtype=tf.float32)],
+        )
+
+    def _forward(self, x):
+        """Return (pre-activation logits, target layer activations) for a batch."""
+        if self._tail is None:
+            conv_out, features = self._features(x, training=False)
+            return self._head(features), conv_out
+        conv_out = self._features(x, training=False)
+        h = conv_out
+        for layer in self._tail:
+            h = layer(h, training=False)
+        return h, conv_out
+
+    def _cam(self, x, class_idx):
+        import tensorflow as tf
+
+        with tf.GradientTape() as tape:
+            logits, conv_out = self._forward(x)
+            score = tf.reduce_sum(tf.gather(logits, class_idx, axis=1, batch_dims=1))
+        grads = tape.gradient(score, conv_out)
+        weights = tf.reduce_mean(grads, axis=(1, 2), keepdims=True)
+        return tf.nn.relu(tf.reduce_sum(conv_out * weights, axis=-1))
+
+    def _predict_cam(self, x):
+        import tensorflow as tf
+
+        with tf.GradientTape() as tape:
+            logits, conv_out = self._forward(x)
+            probs = self._activation(logits) if self._activation is not None else logits
+            class_idx = tf.argmax(probs, axis=1, output_type=tf.int32)
+            score = tf.reduce_sum(tf.gather(logits, class_idx, axis=1, batch_dims=1))
+        grads = tape.gradient(score, conv_out)
+        weights = tf.reduce_mean(grads, axis=(1, 2), keepdims=True)
+        return probs, tf.nn.relu(tf.reduce_sum(conv_out * weights, axis=-1))
+
+    def predict_with_cam(self, batched: np.ndarray):
+        """Return (probs (N, C), CAMs (N, h, w) for each row's top class) from a single forward pass."""
+        probs, cams = self._predict_cam_fn(np.asarray(batched, dtype='float32'))
+        return probs.numpy(), cams.numpy()
+
+    def heatmap(self, batched: np.ndarray, class_idx) -> np.ndarray:
+        """Return raw (N, h, w) CAMs at the target layer's resolution for `class_idx` (int or per-row list)."""
+        idx = np.broadcast_to(np.asarray(class_idx, dtype='int32'), (batched.shape[0],))
+        return self._cam_fn(np.asarray(batched, dtype='float32'), idx).numpy()
+
+
+def get_cam_engine(model) -> GradCamEngine:
+    """Return the cached `GradCamEngine` for `model`, building it on first use."""
+    key = id(model)
+    engine = _ENGINES.get(key)
+    if engine is not None:
+        return engine
+    with _ENGINES_LOCK:
+        engine = _ENGINES.get(key)
+        if engine is None:
+            engine = GradCamEngine(model)
+            _ENGINES[key] = engine
+            logger.info('Built Grad-CAM engine (target layer %s)', engine.layer_name)
+    return engine
@@ -0,0 +1,116 @@
+"""Upload decoding and brain-MRI validation for `/predict`.
+
+`prepare_upload` decodes an upload once and derives the validation verdict
+and the model tensor from that single decode. Image dimensions are read from
+the header first, so oversized uploads are rejected before any pixels are
+decoded, and JPEGs are decoded with DCT-domain downscaling (`Image.draft`) to
+the smallest scale that still covers every downstream stage.
+
+`is_grayscale_like` and `is_brain_image` apply the same checks to an already
+decoded image.
+"""
+import io
+import logging
+from typing import Any, Dict
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger('fastapi_app.image_prep')
+
+# side of the square thumbnail the grayscale test runs on
+THUMB_SIZE = 256
+MIN_SIDE = 64
+MAX_SIDE = 2000
+
+
+def brain_checks(is_grayscale: bool, width: int, height: int, std_val: float) -> bool:
+    """Apply the brain MRI validation rules to precomputed image statistics."""
+    # Step 1: Must be grayscale-like
+    if not is_grayscale:
+        logger.debug("Image rejected: Not grayscale-like")
+        return False
+
+    # Step 2: Check image dimensions are reasonable
+    if width < MIN_SIDE or height < MIN_SIDE:
+        logger.debug(f"Image rejected: Too small ({width}x{height})")
+        return False
+    # Maximum reasonable size (shouldn't be huge)
+    if width > MAX_SIDE or height > MAX_SIDE:
+        logger.debug(f"Image rejected: Too large ({width}x{height})")
+        return False
+
+    # Step 3: Check contrast - very low contrast images are likely not medical scans
+    if std_val < 5:
+        logger.debug(f"Image rejected: Very low contrast (std={std_val:.1f})")
+        return False
+
+    logger.info("Image validated as brain MRI")
+    return True
+
+
+def grayscale_from_thumb(thumb: np.ndarray) -> bool:
+    """Grayscale-likeness test on an already resized THUMB_SIZE x THUMB_SIZE uint8 array."""
+    if thumb.ndim == 2:
+        # Single channel - definitely grayscale (valid MRI)
+        return True
+    if thumb.shape[2] < 3:
+        return False
+    # int16 is enough for channel differences of uint8 data
+    t = thumb.astype(np.int16)
+    r, g, b = t[:, :, 0], t[:, :, 1], t[:, :, 2]
+    # Threshold: 30 allows for slight color variations due to image conversion
+    return np.abs(r - g).mean() < 30 and np.abs(r - b).mean() < 30 and np.abs(g - b).mean() < 30
+
+
+def is_grayscale_like(pil: Image.Image) -> bool:
+    """Check if the image is mostly grayscale (low color variance) - validation for MRI."""
+    try:
+        return bool(grayscale_from_thumb(np.asarray(pil.resize((THUMB_SIZE, THUMB_SIZE)))))
+    except Exception:
+        return False
+
+
+def is_brain_image(pil: Image.Image) -> bool:
+    """Check if a decoded image is a valid brain MRI scan (grayscale-like, reasonable size and contrast)."""
+    try:
+        width, height = pil.size
+        std_val = float(np.std(np.asarray(pil.convert('L'), dtype=np.float32)))
+        return brain_checks(is_grayscale_like(pil), width, height, std_val)
+    except Exception as e:
+        logger.error(f"Error validating brain image: {e}")
+        return False
+
+
+def prepare_upload(contents: bytes, input_shape) -> Dict[str, Any]:
+    """Decode an upload once and derive validation statistics and the model tensor from it.
+
+    Returns a dict with the decoded RGB `pil`, the original `width`/`height`, `is_brain`
+    (validation verdict), `error` (validation exception text or None) and, for valid
+    images, `model_input` as float32 HxWx3 in [0, 1]. `pil` is None when the header
+    already rules the image out. Blocking: run it in an executor.
+    """
+    img = Image.open(io.BytesIO(contents))
+    width, height = img.size
+    prep = {'pil': None, 'width': width, 'height': height, 'is_brain': False, 'error': None, 'model_input': None}
+    if width > MAX_SIDE or height > MAX_SIDE or width < MIN_SIDE or height < MIN_SIDE:
+        logger.debug(f"Image rejected from header: bad size ({width}x{height})")
+        return prep
+    if img.format == 'JPEG':
+        # draft never scales below the requested size, so every later resize still downsamples
+        need = max(THUMB_SIZE, *input_shape)
+        img.draft('RGB', (need, need))
+    pil = img.convert('RGB')
+    prep['pil'] = pil
+    try:
+        thumb = np.asarray(pil.resize((THUMB_SIZE, THUMB_SIZE)))
+        gray = np.asarray(pil.convert('L'), dtype=np.float32)
+        prep['is_brain'] = brain_checks(grayscale_from_thumb(thumb), width, height, float(gray.std()))
+    except Exception as e:
+        logger.error(f"Error validating brain image: {e}")
+        prep['error'] = str(e)
+        return prep
+    if prep['is_brain']:
+        model_u8 = np.asarray(pil.resize(input_shape), dtype=np.uint8)
+        prep['model_input'] = model_u8.astype(np.float32) / 255.0
+    return prep
@@ -0,0 +1,303 @@
+"""Inference scheduling helpers for the FastAPI backend.
+
+`InferenceExecutor` is a size-bounded thread pool that keeps CPU-heavy work
+(model calls, Grad-CAM, image encoding) off the asyncio event loop.
+
+`CompiledModel` replaces `model.predict` for serving: the model is wrapped in
+a `tf.function` with a fixed input signature (optionally XLA-compiled) and
+called directly, skipping predict's per-call data adapter and callback setup.
+
+`build_ensemble_model` folds several Keras classifiers into one graph that
+outputs their weighted-average probabilities, so an ensemble costs one call.
+
+`MicroBatcher` collects concurrent single-image requests into one batched model
+call: the first queued request opens a batch window which closes after
+`max_wait_ms` or once `max_batch_size` requests are waiting. The batch runs in
+a single forward pass and each caller receives its own slice of the output.
+"""
+import asyncio
+import functools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger('fastapi_app.inference')
+
+
+class InferenceExecutor:
+    """Thread pool with a bounded number of pending jobs.
+
+    At most `max_workers` jobs run at once and at most `max_queue` more wait in
+    the pool's queue; further callers wait on the event loop (without holding a
+    thread) until a slot frees up.
+    """
+
+    def __init__(self, max_workers: int = 2, max_queue: int = 32, name: str = 'inference'):
+        self.max_workers = max(1, int(max_workers))
+        self.max_queue = max(0, int(max_queue))
+        self.name = name
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=name)
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._queued = 0
+        self._waiting = 0
+        self._completed = 0
+        self._failed = 0
+
+    def _call(self, fn, args, kwargs):
+        with self._lock:
+            self._queued -= 1
+            self._in_flight += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """Run `fn(*args, **kwargs)` on the pool and await its result."""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_workers + self.max_queue)
+        self._waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._waiting -= 1
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._queued += 1
+        try:
+            job = self._pool.submit(self._call, fn, args, kwargs)
+        except BaseException:
+            with self._lock:
+                self._queued -= 1
+            self._slots.release()
+            raise
+        # settle the bookkeeping when the job itself ends, not the awaiting task: a caller
+        # cancelled while its job is queued cancels the job, so _call never runs
+        job.add_done_callback(functools.partial(self._job_done, loop))
+        try:
+            result = await asyncio.wrap_future(job)
+        except Exception:
+            self._failed += 1
+            raise
+        self._completed += 1
+        return result
+
+    def _job_done(self, loop: asyncio.AbstractEventLoop, job: Future):
+        if job.cancelled():
+            with self._lock:
+                self._queued -= 1
+        try:
+            loop.call_soon_threadsafe(self._slots.release)
+        except RuntimeError:
+            pass  # the loop is closed
+
+    def stats(self) -> Dict[str, Any]:
+        """Return current queue depth, in-flight count and totals."""
+        return {
+            'name': self.name,
+            'max_workers': self.max_workers,
+            'max_queue': self.max_queue,
+            'in_flight': self._in_flight,
+            'queue_depth': self._queued,
+            'waiting': self._waiting,
+            'completed': self._completed,
+            'failed': self._failed,
+        }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
+
+
+class CompiledModel:
+    """Call a Keras model through one traced `tf.function` with signature (None,) + input shape."""
+
+    def __init__(self, model, jit_compile: bool = False, name: str = 'model'):
+        import tensorflow as tf
+
+        self.model = model
+        self.name = name
+        self.jit_compile = bool(jit_compile)
+        self.input_shape = tuple(model.inputs[0].shape[1:])
+        if any(d is None for d in self.input_shape):
+            raise ValueError(f'{name} has a dynamic input shape {self.input_shape}')
+        self.max_abs_diff: Optional[float] = None
+        self._fn = tf.function(
+            lambda x: model(x, training=False),
+            input_signature=[tf.TensorSpec(shape=(None,) + self.input_shape, dtype=tf.float32)],
+            jit_compile=self.jit_compile,
+        )
+
+    def __call__(self, batch: np.ndarray) -> np.ndarray:
+        return np.asarray(self._fn(np.asarray(batch, dtype='float32')))
+
+    def verify(self, atol: float = 1e-5, batch_sizes: Sequence[int] = (1, 2)) -> float:
+        """Check outputs against `model.predict` on random inputs; raise ValueError if they differ."""
+        rng = np.random.default_rng(0)
+        worst = 0.0
+        for n in batch_sizes:
+            probe = rng.random((n,) + self.input_shape).astype('float32')
+            expected = np.asarray(self.model.predict(probe, verbose=0))
+            got = self(probe)
+            if got.shape != expected.shape:
+                raise ValueError(f'{self.name}: output shape {got.shape} != predict {expected.shape}')
+            worst = max(worst, float(np.max(np.abs(got - expected))))
+        self.max_abs_diff = worst
+        if worst > atol:
+            raise ValueError(f'{self.name}: outputs differ from predict by {worst:.2e}')
+        return worst
+
+    def stats(self) -> Dict[str, Any]:
+        return {'input_shape': list(self.input_shape), 'xla': self.jit_compile, 'max_abs_diff': self.max_abs_diff}
+
+
+def build_ensemble_model(models: Sequence, weights: Optional[Sequence[float]] = None, name: str = 'ensemble'):
+    """Return one Keras model that feeds a shared input to every model and outputs the weighted average.
+
+    All models must accept the same input shape and produce the same output shape. Weights
+    default to equal and are normalised to sum to 1.
+    """
+    import tensorflow as tf
+
+    if not models:
+        raise ValueError('no models to ensemble')
+    weights = list(weights) if weights else [1.0] * len(models)
+    if len(weights) != len(models):
+        raise ValueError(f'expected {len(models)} ensemble weights, got {len(weights)}')
+    total = float(sum(weights))
+    if total <= 0:
+        raise ValueError('ensemble weights must sum to a positive value')
+    in_shape = tuple(models[0].inputs[0].shape[1:])
+    out_shape = tuple(models[0].outputs[0].shape[1:])
+    for m in models[1:]:
+        if tuple(m.inputs[0].shape[1:]) != in_shape or tuple(m.outputs[0].shape[1:]) != out_shape:
+            raise ValueError('ensemble members must share input and output shapes')
+
+    inp = tf.keras.Input(shape=in_shape, name=f'{name}_input')
+    scaled = []
+    for i, (m, w) in enumerate(zip(models, weights)):
+        # re-wrap each member under a unique name; saved models often share the default one
+        member = tf.keras.Model(m.inputs[0], m.outputs[0], name=f'{name}_m{i}')
+        scaled.append(tf.keras.layers.Rescaling(w / total, name=f'{name}_w{i}')(member(inp)))
+    out = scaled[0] if len(scaled) == 1 else tf.keras.layers.Add(name=f'{name}_avg')(scaled)
+    return tf.keras.Model(inp, out, name=name)
+
+
+class MicroBatcher:
+    """Coalesce concurrent `submit()` calls into batched calls of `batch_fn`.
+
+    `batch_fn` receives a stacked array of shape (N, ...) and must return an
+    array (or list) with N rows, or a tuple of such arrays. Each caller gets
+    back its row with the batch axis kept, i.e. shape (1, ...), so results look
+    like `model.predict` on a batch of one.
+    """
+
+    def __init__(self, batch_fn: Callable[[np.ndarray], Any], max_batch_size: int = 8,
+                 max_wait_ms: float = 5.0, name: str = 'predict', window: int = 1024,
+                 executor: Optional[InferenceExecutor] = None):
+        self.batch_fn = batch_fn
+        self.executor = executor
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        # statistics
+        self._batches = 0
+        self._items = 0
+        self._errors = 0
+        self._max_seen = 0
+        self._size_hist: Dict[int, int] = {}
+        self._waits = deque(maxlen=window)
+        self._run_times = deque(maxlen=window)
+
+    async def submit(self, item: np.ndarray):
+        """Queue a single (unbatched) input and wait for its slice of the batch output."""
+        loop = asyncio.get_running_loop()
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._worker is None or self._worker.done():
+            self._worker = loop.create_task(self._run())
+        fut = loop.create_future()
+        await self._queue.put((item, fut, time.perf_counter()))
+        return await fut
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            first = await self._queue.get()
+            batch = [first]
+            deadline = first[2] + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            # drain anything already queued without waiting further
+            while len(batch) < self.max_batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            started = time.perf_counter()
+            for _, _, enq in batch:
+                self._waits.append(started - enq)
+            try:
+                stacked = np.stack([b[0] for b in batch], axis=0)
+                if self.executor is not None:
+                    out = await self.executor.run(self.batch_fn, stacked)
+                else:
+                    out = await loop.run_in_executor(None, self.batch_fn, stacked)
+                for i, (_, fut, _) in enumerate(batch):
+                    if not fut.done():
+                        if isinstance(out, tuple):
+                            fut.set_result(tuple(o[i:i + 1] for o in out))
+                        else:
+                            fut.set_result(out[i:i + 1])
+            except Exception as e:
+                self._errors += 1
+                logger.warning('%s batch of %d failed: %s', self.name, len(batch), e)
+                for _, fut, _ in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+            self._record(len(batch), time.perf_counter() - started)
+
+    def _record(self, size: int, run_time: float):
+        self._batches += 1
+        self._items += size
+        self._max_seen = max(self._max_seen, size)
+        self._size_hist[size] = self._size_hist.get(size, 0) + 1
+        self._run_times.append(run_time)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return batch-size and queue-wait statistics (times in milliseconds)."""
+        waits = sorted(self._waits)
+        runs = sorted(self._run_times)
+
+        def _pct(vals, q):
+            if not vals:
+                return 0.0
+            return round(vals[min(len(vals) - 1, int(q * len(vals)))] * 1000.0, 3)
+
+        return {
+            'name': self.name,
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000.0,
+            'batches': self._batches,
+            'items': self._items,
+            'errors': self._errors,
+            'mean_batch_size': round(self._items / self._batches, 3) if self._batches else 0.0,
+            'max_batch_seen': self._max_seen,
+            'batch_size_histogram': {str(k): v for k, v in sorted(self._size_hist.items())},
+            'queue_depth': self._queue.qsize() if self._queue is not None else 0,
+            'queue_wait_ms': {'p50': _pct(waits, 0.5), 'p95': _pct(waits, 0.95), 'max': _pct(waits, 1.0)},
+            'run_ms': {'p50': _pct(runs, 0.5), 'p95': _pct(runs, 0.95), 'max': _pct(runs, 1.0)},
+        }
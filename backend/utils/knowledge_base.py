@@ -0,0 +1,142 @@
+"""Load-once medical knowledge base keyed by model label.
+
+The content (descriptions, symptoms, treatments, side effects, lifestyle
+recommendations, the /explain report data and per-label chat answers) lives
+in `utils/medical_knowledge.json`, keyed by the label ids of `labels.json`
+(`glioma_tumor`, `meningioma_tumor`, ...). It is read once into immutable
+`LabelKnowledge` records: lists become tuples and dicts read-only mappings,
+so callers must copy before handing data to a response.
+
+Lookups accept any spelling of a label: the id itself, a display name
+("Glioma Tumor", "No Tumor") or an alias listed in the data file ("Glioma",
+"notumor"). Each is normalised once into an index, so a lookup is a string
+normalisation plus a dict access.
+"""
+import json
+import logging
+import os
+import re
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, Mapping, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger('fastapi_app.knowledge_base')
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'medical_knowledge.json')
+
+_SEPARATORS = re.compile(r'[\s\-]+')
+
+
+def normalize_label(label: Any) -> str:
+    """Lower-case `label` and join its words with underscores ("No Tumor" -> "no_tumor")."""
+    return _SEPARATORS.sub('_', str(label or '').strip().lower())
+
+
+def _freeze(value: Any) -> Any:
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def thaw(value: Any) -> Any:
+    """Return a JSON-serialisable (mutable) copy of a frozen value."""
+    if isinstance(value, Mapping):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(v) for v in value]
+    return value
+
+
+class LabelKnowledge(NamedTuple):
+    label: str
+    name: str
+    description: str
+    symptoms: Tuple[str, ...]
+    treatments: Tuple[str, ...]
+    medication_side_effects: Tuple[str, ...]
+    lifestyle_recommendations: Tuple[str, ...]
+    disease_info: Mapping[str, Any]
+    symptom_details: Mapping[str, Any]
+    treatment_side_effects: Mapping[str, Any]
+    chat: Mapping[str, str]
+
+
+class KnowledgeBase:
+    """Immutable per-label knowledge with O(1) lookups by id, display name or alias."""
+
+    def __init__(self, entries: Dict[str, Dict[str, Any]], labels: Optional[Iterable[str]] = None,
+                 version: Any = None):
+        self.version = version
+        known = set(labels) if labels is not None else None
+        records = {}
+        index = {}
+        for label_id, entry in entries.items():
+            if known is not None and label_id not in known:
+                logger.warning('Knowledge base entry %r is not a model label', label_id)
+            records[label_id] = LabelKnowledge(
+                label=label_id,
+                name=entry.get('name', label_id),
+                description=entry.get('description', ''),
+                symptoms=_freeze(entry.get('symptoms', [])),
+                treatments=_freeze(entry.get('treatments', [])),
+                medication_side_effects=_freeze(entry.get('medication_side_effects', [])),
+                lifestyle_recommendations=_freeze(entry.get('lifestyle_recommendations', [])),
+                disease_info=_freeze(entry.get('disease_info', {})),
+                symptom_details=_freeze(entry.get('symptom_details', {})),
+                treatment_side_effects=_freeze(entry.get('treatment_side_effects', {})),
+                chat=_freeze(entry.get('chat', {})),
+            )
+            for key in (label_id, entry.get('name'), *entry.get('aliases', [])):
+                if key:
+                    index.setdefault(normalize_label(key), label_id)
+        if known is not None:
+            for label_id in sorted(known - set(records)):
+                logger.warning('Model label %r has no knowledge base entry', label_id)
+        self._records: Mapping[str, LabelKnowledge] = MappingProxyType(records)
+        self._index: Mapping[str, str] = MappingProxyType(index)
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_PATH, labels: Optional[Iterable[str]] = None) -> 'KnowledgeBase':
+        """Read the data file; `labels` (the values of labels.json) are checked against its entries."""
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data.get('labels', {}), labels=labels, version=data.get('version'))
+
+    @property
+    def labels(self) -> Tuple[str, ...]:
+        return tuple(self._records)
+
+    def canonical(self, label: Any) -> Optional[str]:
+        """Return the model label id for any known spelling of `label`, or None."""
+        return self._index.get(normalize_label(label))
+
+    def get(self, label: Any) -> Optional[LabelKnowledge]:
+        label_id = self._index.get(normalize_label(label))
+        return self._records[label_id] if label_id is not None else None
+
+    def __contains__(self, label: Any) -> bool:
+        return normalize_label(label) in self._index
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+
+_DEFAULT: Optional[KnowledgeBase] = None
+
+
+def _model_labels() -> Optional[Iterable[str]]:
+    path = os.environ.get('LABELS_PATH', 'models/models/labels.json')
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return list(json.load(f).values())
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def get_knowledge_base() -> KnowledgeBase:
+    """The process-wide knowledge base, loaded on first use from MEDICAL_KNOWLEDGE_PATH."""
+    global _DEFAULT
+    if _DEFAULT is None:
+        _DEFAULT = KnowledgeBase.load(os.environ.get('MEDICAL_KNOWLEDGE_PATH', DEFAULT_PATH), labels=_model_labels())
+    return _DEFAULT
@@ -0,0 +1,188 @@
+"""Async client for an OpenAI-compatible chat completions endpoint.
+
+The handlers used to call the synchronous `openai.ChatCompletion.create`
+without a timeout, so one slow completion stalled a worker thread (or the
+event loop), and /predict waited for up to five of them in a row.
+`LLMClient` talks to `<base_url>/chat/completions` over one pooled
+`httpx.AsyncClient` and gives every call:
+
+* a deadline covering all attempts, including backoff sleeps;
+* retries on connection errors, timeouts, 429 and 5xx responses, with
+  full-jitter exponential backoff (a `Retry-After` header is honoured when
+  it fits in the deadline);
+* optional hedging: if the first request has not answered after
+  `hedge_after` seconds (or, with `hedge_after=None` and `hedge=True`, the
+  observed p95 latency), a second identical request is sent and the first
+  answer wins.
+
+`base_url` can point at any compatible server, including a local stub in
+tests. Failures raise `LLMError`; callers fall back to the rule-based answers.
+"""
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+logger = logging.getLogger('fastapi_app.llm')
+
+_RETRY_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class LLMError(RuntimeError):
+    """The completion failed (after retries) or the deadline passed."""
+
+
+class _RetryableError(LLMError):
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    try:
+        return max(0.0, float(response.headers.get('retry-after', '')))
+    except ValueError:
+        return None
+
+
+class LLMClient:
+    """Pooled chat-completions client with deadlines, jittered retries and hedged requests."""
+
+    def __init__(self, api_key: str, model: str = 'gpt-3.5-turbo', base_url: str = 'https://api.openai.com/v1',
+                 timeout: float = 20.0, connect_timeout: float = 5.0, max_retries: int = 2,
+                 backoff: float = 0.25, max_backoff: float = 4.0, hedge: bool = False,
+                 hedge_after: Optional[float] = None, hedge_min_samples: int = 20,
+                 max_connections: int = 20, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.model = model
+        self.url = base_url.rstrip('/') + '/chat/completions'
+        self.timeout = float(timeout)
+        self.max_retries = max(0, int(max_retries))
+        self.backoff = float(backoff)
+        self.max_backoff = float(max_backoff)
+        self.hedge = bool(hedge or hedge_after)
+        self.hedge_after = hedge_after
+        self.hedge_min_samples = max(1, int(hedge_min_samples))
+        self._client = httpx.AsyncClient(
+            headers={'Authorization': f'Bearer {api_key}'},
+            timeout=httpx.Timeout(self.timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            transport=transport,
+        )
+        self._latencies: deque = deque(maxlen=200)
+        self.calls = 0
+        self.failures = 0
+        self.retries = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def _hedge_delay(self) -> Optional[float]:
+        if not self.hedge:
+            return None
+        if self.hedge_after is not None:
+            return self.hedge_after
+        if len(self._latencies) < self.hedge_min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    async def _request(self, payload: Dict[str, Any], timeout: float) -> str:
+        try:
+            response = await self._client.post(self.url, json=payload, timeout=timeout)
+        except (httpx.TimeoutException, httpx.TransportError) as e:
+            raise _RetryableError(f'{type(e).__name__}: {e}') from e
+        if response.status_code in _RETRY_STATUS:
+            raise _RetryableError(f'HTTP {response.status_code}', _retry_after(response))
+        if response.status_code >= 400:
+            raise LLMError(f'HTTP {response.status_code}: {response.text[:200]}')
+        try:
+            return response.json()['choices'][0]['message']['content'].strip()
+        except (ValueError, KeyError, IndexError, TypeError, AttributeError) as e:
+            raise LLMError(f'Malformed completion response: {e}') from e
+
+    async def _hedged(self, payload: Dict[str, Any], timeout: float) -> str:
+        """One logical attempt: the request, plus a hedge if it is slower than the hedge delay."""
+        delay = self._hedge_delay()
+        if delay is None or delay >= timeout:
+            return await self._request(payload, timeout)
+        started = time.monotonic()
+        primary = asyncio.ensure_future(self._request(payload, timeout))
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                self.hedged += 1
+                tasks.append(asyncio.ensure_future(self._request(payload, timeout - (time.monotonic() - started))))
+            error: Optional[BaseException] = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def chat(self, messages: List[Dict[str, str]], max_tokens: int = 256, temperature: float = 0.2,
+                   deadline: Optional[float] = None) -> str:
+        """Return the completion text; raise `LLMError` on failure or when `deadline` seconds pass."""
+        payload = {'model': self.model, 'messages': messages, 'max_tokens': max_tokens, 'temperature': temperature}
+        budget = self.timeout if deadline is None else float(deadline)
+        started = time.monotonic()
+        self.calls += 1
+        attempt = 0
+        while True:
+            remaining = budget - (time.monotonic() - started)
+            if remaining <= 0:
+                self.failures += 1
+                raise LLMError(f'Deadline of {budget:.1f}s exceeded')
+            try:
+                attempt_started = time.monotonic()
+                text = await asyncio.wait_for(self._hedged(payload, remaining), remaining)
+                self._latencies.append(time.monotonic() - attempt_started)
+                return text
+            except asyncio.TimeoutError:
+                self.failures += 1
+                raise LLMError(f'Deadline of {budget:.1f}s exceeded') from None
+            except _RetryableError as e:
+                if attempt >= self.max_retries:
+                    self.failures += 1
+                    raise LLMError(f'Completion failed after {attempt + 1} attempts: {e}') from e
+                # full jitter: sleep anywhere up to the exponential cap
+                sleep = random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+                if e.retry_after is not None:
+                    sleep = max(sleep, e.retry_after)
+                if sleep >= budget - (time.monotonic() - started):
+                    self.failures += 1
+                    raise LLMError(f'Completion failed and no time left to retry: {e}') from e
+                logger.info('LLM request failed (%s); retrying in %.2fs', e, sleep)
+                self.retries += 1
+                attempt += 1
+                await asyncio.sleep(sleep)
+            except LLMError:
+                self.failures += 1
+                raise
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        ordered = sorted(self._latencies)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] if ordered else None
+        return {
+            'model': self.model,
+            'calls': self.calls,
+            'failures': self.failures,
+            'retries': self.retries,
+            'hedged': self.hedged,
+            'hedge_wins': self.hedge_wins,
+            'p95_ms': round(p95 * 1000.0, 1) if p95 is not None else None,
+        }
@@ -1,43 +1,51 @@
+"""Per-label medical information, served from the shared knowledge base.
+
+The data lives in `medical_knowledge.json` (see `utils.knowledge_base`); these
+helpers accept model label ids ("glioma_tumor") as well as display names and
+aliases ("Glioma") and return fresh lists/dicts that callers may modify.
+"""
+try:
+    from utils.knowledge_base import get_knowledge_base
+except ImportError:  # imported as a top-level module (scripts, legacy tests)
+    from knowledge_base import get_knowledge_base
+
+
 def get_tumor_analysis(label, conf):
     """Provide analysis based on predicted tumor type."""
+    entry = get_knowledge_base().get(label)
+    name = entry.name if entry is not None else label
     base_analysis = {
-        "name": label,
+        "name": name,
         "confidence": f"{conf*100:.1f}%",
-        "description": f"Detected {label} with {conf*100:.1f}% confidence.",
+        "description": f"Detected {name} with {conf*100:.1f}% confidence.",
         "recommendations": ["Consult a neurologist immediately.", "Schedule MRI for confirmation."]
     }
-    
+    if entry is not None:
+        base_analysis["label"] = entry.label
+
     # Add symptoms/side effects
     symptoms = get_tumor_symptoms(label)
     if symptoms:
         base_analysis["symptoms"] = symptoms
-    
+
     return base_analysis
 
+
 def get_tumor_symptoms(label):
     """Get common symptoms for the tumor type."""
-    symptoms = {
-        "Glioma": ["Headaches", "Seizures", "Nausea", "Vision changes", "Weakness on one side of the body"],
-        "Meningioma": ["Headaches", "Seizures", "Vision problems", "Hearing loss", "Weakness"],
-        "Pituitary": ["Headaches", "Vision changes", "Hormonal imbalances", "Fatigue", "Weight changes"],
-        "notumor": []
-    }
-    return symptoms.get(label, ["General neurological symptoms; consult a doctor."])
+    entry = get_knowledge_base().get(label)
+    if entry is None:
+        return ["General neurological symptoms; consult a doctor."]
+    return list(entry.symptoms)
+
 
 def get_medication_side_effects(label):
     """Get side effects for medications related to the tumor type."""
-    side_effects = {
-        "Glioma": ["Nausea", "Fatigue", "Hair loss"],
-        "Meningioma": ["Headache", "Seizures"],
-        "Pituitary": ["Hormonal imbalances", "Vision changes"]
-    }
-    return side_effects.get(label, [])
+    entry = get_knowledge_base().get(label)
+    return list(entry.medication_side_effects) if entry is not None else []
+
 
 def get_lifestyle_recommendations(label):
     """Get lifestyle recommendations."""
-    recommendations = {
-        "Glioma": ["Maintain healthy diet", "Regular exercise", "Avoid smoking"],
-        "Meningioma": ["Stress management", "Adequate sleep"],
-        "Pituitary": ["Monitor hormone levels", "Balanced nutrition"]
-    }
-    return recommendations.get(label, [])
\ No newline at end of file
+    entry = get_knowledge_base().get(label)
+    return list(entry.lifestyle_recommendations) if entry is not None else []
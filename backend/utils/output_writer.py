@@ -0,0 +1,182 @@
+"""Write-behind persistence of per-session artifacts (predict.json, cam.png).
+
+`/predict` used to write its artifacts synchronously on the request path.
+`OutputWriter.submit` only queues the bytes; a background task writes them
+from a worker thread. Several writes to the same file that queue up before
+the worker reaches them are coalesced, and only the newest is written. Each
+file is written to a temporary name in the same directory and moved into
+place with `os.replace`, so readers never see a partially written file.
+
+Queued bytes stay readable through `pending()` until they are on disk.
+`submit` applies backpressure once `max_pending` files are waiting, and
+`flush()` drains the queue (e.g. on shutdown).
+
+With a `layout` (see `utils.retention.OutputLayout`) session directories are
+sharded, and `on_write(session_id, path, delta_bytes)` is called from the writer thread
+after each file is written so the retention manifest can track sizes.
+"""
+import asyncio
+import logging
+import os
+import pathlib
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils.retention import SAFE_SESSION_ID
+
+logger = logging.getLogger('fastapi_app.outputs')
+
+
+def atomic_write(path: pathlib.Path, data: bytes):
+    """Write `data` to `path` through a temporary file in the same directory."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f'.{path.name}.{uuid.uuid4().hex}.tmp')
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+class OutputWriter:
+    """Queue artifact writes under `root/<session_id>/` and perform them in the background."""
+
+    def __init__(self, root: str = 'outputs', max_pending: int = 1000, batch_size: int = 32, layout=None,
+                 on_write: Optional[Callable[[str, pathlib.Path, int], None]] = None):
+        self.root = pathlib.Path(root)
+        self.layout = layout
+        self.on_write = on_write
+        self.max_pending = max(1, int(max_pending))
+        self.batch_size = max(1, int(batch_size))
+        self._pending: 'OrderedDict[pathlib.Path, Tuple[str, bytes]]' = OrderedDict()  # path -> (session_id, data)
+        self._ready = asyncio.Event()
+        self._space = asyncio.Event()
+        self._space.set()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self.submitted = 0
+        self.coalesced = 0
+        self.written = 0
+        self.bytes_written = 0
+        self.failed = 0
+        self.write_seconds = 0.0
+
+    def session_dir(self, session_id: str) -> pathlib.Path:
+        if self.layout is not None:
+            return self.layout.session_dir(session_id)
+        if not SAFE_SESSION_ID.match(session_id or ''):
+            raise ValueError(f'Unsafe session id: {session_id!r}')
+        return self.root / session_id
+
+    def path(self, session_id: str, name: str) -> pathlib.Path:
+        return self.session_dir(session_id) / name
+
+    def find(self, session_id: str, name: str) -> Optional[pathlib.Path]:
+        """Return the written file (in either directory layout), or None."""
+        if self.layout is not None:
+            return self.layout.find(session_id, name)
+        if not SAFE_SESSION_ID.match(session_id or ''):
+            return None
+        path = self.path(session_id, name)
+        return path if path.is_file() else None
+
+    async def submit(self, session_id: str, name: str, data: bytes):
+        """Queue `data` for `root/<session_id>/<name>`, replacing any queued write to that file."""
+        path = self.path(session_id, name)
+        while path not in self._pending and len(self._pending) >= self.max_pending:
+            self._space.clear()
+            await self._space.wait()
+        self.submitted += 1
+        if path in self._pending:
+            self.coalesced += 1
+        self._pending[path] = (session_id, data)
+        self._idle.clear()
+        self._ready.set()
+
+    def pending(self, session_id: str, name: str) -> Optional[bytes]:
+        """Return bytes queued for the file but not yet written, or None."""
+        entry = self._pending.get(self.path(session_id, name))
+        return entry[1] if entry is not None else None
+
+    def _take(self) -> List[Tuple[pathlib.Path, Tuple[str, bytes]]]:
+        batch = []
+        for path, entry in self._pending.items():
+            batch.append((path, entry))
+            if len(batch) >= self.batch_size:
+                break
+        return batch
+
+    def _write_batch(self, batch) -> List[Tuple[pathlib.Path, Tuple[str, bytes], Optional[Exception]]]:
+        results = []
+        for path, entry in batch:
+            session_id, data = entry
+            try:
+                try:
+                    previous = path.stat().st_size
+                except OSError:
+                    previous = 0
+                atomic_write(path, data)
+                results.append((path, entry, None))
+            except Exception as e:
+                results.append((path, entry, e))
+                continue
+            if self.on_write is not None:
+                try:
+                    self.on_write(session_id, path, len(data) - previous)
+                except Exception as e:
+                    logger.warning('Write hook failed for %s: %s', path, e)
+        return results
+
+    async def _drain_once(self):
+        batch = self._take()
+        started = time.perf_counter()
+        results = await asyncio.to_thread(self._write_batch, batch)
+        self.write_seconds += time.perf_counter() - started
+        for path, entry, error in results:
+            # leave the entry if a newer write for the same file was queued meanwhile
+            if self._pending.get(path) is entry:
+                del self._pending[path]
+            if error is None:
+                self.written += 1
+                self.bytes_written += len(entry[1])
+            else:
+                self.failed += 1
+                logger.warning('Failed to write %s: %s', path, error)
+        self._space.set()
+        if not self._pending:
+            self._idle.set()
+
+    async def run(self):
+        """Write queued artifacts until cancelled."""
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            while self._pending:
+                await self._drain_once()
+
+    async def flush(self):
+        """Write everything queued so far from the calling task."""
+        while self._pending:
+            await self._drain_once()
+
+    async def wait_idle(self, timeout: Optional[float] = None):
+        """Wait until the background task has written everything queued."""
+        await asyncio.wait_for(self._idle.wait(), timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'pending': len(self._pending),
+            'submitted': self.submitted,
+            'coalesced': self.coalesced,
+            'written': self.written,
+            'bytes_written': self.bytes_written,
+            'failed': self.failed,
+            'mean_write_ms': round(self.write_seconds * 1000.0 / max(1, self.written + self.failed), 3),
+        }
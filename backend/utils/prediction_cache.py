@@ -0,0 +1,147 @@
+"""Content-addressed cache of `/predict` results.
+
+Entries are keyed on the SHA-256 of the uploaded bytes plus a fingerprint of
+the loaded model files, so re-uploading the same scan against the same model
+skips validation, inference, Grad-CAM and the LLM calls. An in-process LRU tier
+is bounded by a byte budget and TTL; an optional Redis tier (same key, same
+TTL) is shared by every worker.
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger('fastapi_app.prediction_cache')
+
+
+def model_fingerprint(paths: Iterable[Optional[str]], extra: str = '') -> str:
+    """Return a short content hash of the given model files (missing paths are skipped)."""
+    h = hashlib.sha256(extra.encode('utf-8'))
+    for path in paths:
+        if not path or not os.path.exists(path):
+            continue
+        h.update(os.path.basename(path).encode('utf-8'))
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+    return h.hexdigest()[:16]
+
+
+def content_key(contents: bytes, fingerprint: str) -> str:
+    """Return the cache key for an upload under the given model fingerprint."""
+    return f"{hashlib.sha256(contents).hexdigest()}:{fingerprint}"
+
+
+class PredictionCache:
+    """Two-tier (in-process LRU + optional Redis) cache of JSON-serialisable results."""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, ttl: int = 3600, redis_client=None,
+                 prefix: str = 'predcache:'):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.redis = redis_client
+        self.prefix = prefix
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()  # key -> (expires_at, size, payload)
+        self._bytes = 0
+        # key -> (expires_at, fields): updates that arrived before the entry was set
+        self._early: 'OrderedDict[str, tuple]' = OrderedDict()
+        self.max_early = 1024
+        self.hits_local = 0
+        self.hits_redis = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def _put_local(self, key: str, payload: str):
+        size = len(payload)
+        if size > self.max_bytes:
+            return
+        self._drop(key)
+        self._entries[key] = (time.time() + self.ttl, size, payload)
+        self._bytes += size
+        while self._bytes > self.max_bytes and self._entries:
+            old_key = next(iter(self._entries))
+            self._drop(old_key)
+            self.evictions += 1
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.time():
+                self._entries.move_to_end(key)
+                self.hits_local += 1
+                return json.loads(entry[2])
+            self._drop(key)
+        if self.redis is not None:
+            try:
+                payload = await self.redis.get(self.prefix + key)
+                if payload:
+                    self._put_local(key, payload)
+                    self.hits_redis += 1
+                    return json.loads(payload)
+            except Exception as e:
+                logger.debug('Redis prediction cache read failed: %s', e)
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: Dict[str, Any]):
+        early = self._early.pop(key, None)
+        if early is not None and early[0] > time.time():
+            value = {**value, **early[1]}
+        payload = json.dumps(value, separators=(',', ':'))
+        self._put_local(key, payload)
+        if self.redis is not None:
+            try:
+                await self.redis.set(self.prefix + key, payload, ex=self.ttl)
+            except Exception as e:
+                logger.debug('Redis prediction cache write failed: %s', e)
+
+    async def update(self, key: str, **fields):
+        """Merge `fields` into the entry for `key`.
+
+        If the entry has not been set yet (a background job finished before the
+        request that started it stored its result), the fields are held and
+        merged into the value passed to the next `set` for that key.
+        """
+        value = None
+        entry = self._entries.get(key)
+        if entry is not None:
+            value = json.loads(entry[2])
+        elif self.redis is not None:
+            try:
+                payload = await self.redis.get(self.prefix + key)
+                value = json.loads(payload) if payload else None
+            except Exception:
+                value = None
+        if value is None:
+            held = self._early.pop(key, None)
+            merged = dict(held[1]) if held is not None and held[0] > time.time() else {}
+            merged.update(fields)
+            self._early[key] = (time.time() + self.ttl, merged)
+            while len(self._early) > self.max_early:
+                self._early.popitem(last=False)
+            return
+        value.update(fields)
+        await self.set(key, value)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits_local + self.hits_redis + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'max_bytes': self.max_bytes,
+            'ttl': self.ttl,
+            'redis': self.redis is not None,
+            'hits_local': self.hits_local,
+            'hits_redis': self.hits_redis,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round((self.hits_local + self.hits_redis) / lookups, 4) if lookups else 0.0,
+        }
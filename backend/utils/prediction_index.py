@@ -0,0 +1,210 @@
+"""SQLite index of predictions (WAL mode) for /explain and the admin pages.
+
+Prediction artifacts live under `outputs/<session_id>/`. Reading them back
+used to mean opening and parsing predict.json, and listing sessions meant
+walking the whole directory tree. `PredictionIndex` keeps two tables:
+
+* `predictions`: one row per /predict call (session id, time, label,
+  confidence, model fingerprint, artifact path, top-k and probabilities),
+  indexed by time, by label and time, and by session and time;
+* `sessions`: the latest prediction of each session, keyed by session id and
+  indexed by update time and by label, so lookups and paged listings are
+  index reads.
+
+Both tables are written in one transaction. WAL mode lets readers run
+alongside the writer. Connections are per thread; call the methods through
+`asyncio.to_thread` from async code.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger('fastapi_app.prediction_index')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    id INTEGER PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    label TEXT NOT NULL,
+    confidence REAL,
+    model_fingerprint TEXT,
+    artifact_path TEXT,
+    top_k TEXT,
+    probs TEXT
+);
+CREATE INDEX IF NOT EXISTS predictions_created ON predictions (created_at);
+CREATE INDEX IF NOT EXISTS predictions_label ON predictions (label, created_at);
+CREATE INDEX IF NOT EXISTS predictions_session ON predictions (session_id, created_at);
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    updated_at REAL NOT NULL,
+    prediction_id INTEGER NOT NULL,
+    label TEXT NOT NULL,
+    confidence REAL,
+    model_fingerprint TEXT,
+    artifact_path TEXT,
+    top_k TEXT,
+    probs TEXT
+);
+CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated_at);
+CREATE INDEX IF NOT EXISTS sessions_label ON sessions (label, updated_at);
+"""
+
+_COLUMNS = 'session_id, updated_at, prediction_id, label, confidence, model_fingerprint, artifact_path, top_k, probs'
+
+
+def _row(row: sqlite3.Row) -> Dict[str, Any]:
+    out = dict(row)
+    for name in ('top_k', 'probs'):
+        if out.get(name) is not None:
+            out[name] = json.loads(out[name])
+    return out
+
+
+class PredictionIndex:
+    """Per-thread SQLite connections over one WAL-mode database file."""
+
+    def __init__(self, path: str = 'outputs/predictions.db'):
+        self.path = path
+        self._local = threading.local()
+        self.writes = 0
+        self.reads = 0
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            # WAL + NORMAL: commits don't fsync; a power loss can drop the newest rows but never corrupts
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def record(self, session_id: str, label: str, confidence: Optional[float],
+               model_fingerprint: Optional[str] = None, artifact_path: Optional[str] = None,
+               top_k: Any = None, probs: Any = None, created_at: Optional[float] = None) -> int:
+        """Insert a prediction and make it the session's latest; returns the prediction id."""
+        created_at = time.time() if created_at is None else created_at
+        top_k_json = json.dumps(top_k, separators=(',', ':')) if top_k is not None else None
+        probs_json = json.dumps(probs, separators=(',', ':')) if probs is not None else None
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            cur = conn.execute(
+                'INSERT INTO predictions (session_id, created_at, label, confidence, model_fingerprint,'
+                ' artifact_path, top_k, probs) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (session_id, created_at, label, confidence, model_fingerprint, artifact_path, top_k_json, probs_json),
+            )
+            prediction_id = cur.lastrowid
+            conn.execute(
+                f'INSERT OR REPLACE INTO sessions ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (session_id, created_at, prediction_id, label, confidence, model_fingerprint, artifact_path,
+                 top_k_json, probs_json),
+            )
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        self.writes += 1
+        return prediction_id
+
+    def latest(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Return the session's latest prediction, or None."""
+        self.reads += 1
+        row = self._conn().execute(f'SELECT {_COLUMNS} FROM sessions WHERE session_id = ?', (session_id,)).fetchone()
+        return _row(row) if row is not None else None
+
+    def list_sessions(self, limit: int = 100, before: Optional[float] = None,
+                      label: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Return sessions by most recent prediction first; page with `before` (an `updated_at`)."""
+        self.reads += 1
+        where, args = [], []
+        if label:
+            where.append('label = ?')
+            args.append(label)
+        if before is not None:
+            where.append('updated_at < ?')
+            args.append(before)
+        sql = f'SELECT {_COLUMNS} FROM sessions'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY updated_at DESC LIMIT ?'
+        args.append(max(1, int(limit)))
+        return [_row(r) for r in self._conn().execute(sql, args)]
+
+    def history(self, session_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+        """Return the session's predictions, newest first."""
+        self.reads += 1
+        rows = self._conn().execute(
+            'SELECT id, session_id, created_at, label, confidence, model_fingerprint, artifact_path, top_k, probs'
+            ' FROM predictions WHERE session_id = ? ORDER BY created_at DESC LIMIT ?',
+            (session_id, max(1, int(limit))),
+        )
+        return [_row(r) for r in rows]
+
+    def delete_session(self, session_id: str) -> int:
+        """Remove every row of the session; returns the number of predictions deleted."""
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            deleted = conn.execute('DELETE FROM predictions WHERE session_id = ?', (session_id,)).rowcount
+            conn.execute('DELETE FROM sessions WHERE session_id = ?', (session_id,))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        self.writes += 1
+        return deleted
+
+    def is_empty(self) -> bool:
+        return self._conn().execute('SELECT 1 FROM sessions LIMIT 1').fetchone() is None
+
+    def backfill(self, root: str, shard_chars: int = 2) -> int:
+        """Index predict.json files written before the index existed.
+
+        Reads `root/<session_id>/` and sharded `root/<shard>/<session_id>/` directories, where
+        a shard is a directory named by the first `shard_chars` characters of the ids.
+        """
+        count = 0
+        try:
+            top = [e for e in os.scandir(root) if e.is_dir()]
+        except OSError:
+            return 0
+        dirs = []
+        for entry in top:
+            if len(entry.name) == shard_chars:
+                try:
+                    dirs.extend((e.name, e.path) for e in os.scandir(entry.path) if e.is_dir())
+                except OSError:
+                    continue
+            else:
+                dirs.append((entry.name, entry.path))
+        for session_id, directory in dirs:
+            pj = os.path.join(directory, 'predict.json')
+            try:
+                with open(pj, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                created = os.path.getmtime(pj)
+            except (OSError, ValueError):
+                continue
+            if not isinstance(data, dict) or not data.get('label'):
+                continue
+            self.record(session_id, data['label'], data.get('confidence'), artifact_path=directory,
+                        top_k=data.get('top_k'), probs=data.get('probs'), created_at=created)
+            count += 1
+        if count:
+            logger.info('Indexed %d existing predictions from %s', count, root)
+        return count
+
+    def stats(self) -> Dict[str, Any]:
+        return {'path': self.path, 'writes': self.writes, 'reads': self.reads}
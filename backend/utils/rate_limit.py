@@ -0,0 +1,148 @@
+"""Sliding-window rate limiting for per-session quotas (LLM calls, /predict).
+
+With Redis, each check is one round trip: a Lua script trims the key's sorted
+set of request timestamps to the window, counts it and records the request if
+it fits. Timestamps come from Redis' own clock so every worker and node agrees
+on the window. There is no fixed-bucket boundary, so no 2x burst at minute
+edges.
+
+Without Redis (or while it errors) the limiter falls back to an in-process
+ring of `buckets` sub-window counters per key. A check touches one bucket and
+sums a fixed number of counters, and keys are kept in last-use order so idle
+ones are expired from the front without scanning the whole table.
+"""
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple
+
+logger = logging.getLogger('fastapi_app.rate_limit')
+
+# KEYS[1] = key; ARGV = window_ms, limit, member. Returns {allowed, remaining, retry_after_ms}.
+_SLIDING_WINDOW_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local window = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+local count = redis.call('ZCARD', KEYS[1])
+if count < limit then
+    redis.call('ZADD', KEYS[1], now, ARGV[3])
+    redis.call('PEXPIRE', KEYS[1], window)
+    return {1, limit - count - 1, 0}
+end
+local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+local retry = window
+if oldest[2] then
+    retry = tonumber(oldest[2]) + window - now
+end
+return {0, 0, retry}
+"""
+
+
+class RateLimitResult(NamedTuple):
+    allowed: bool
+    remaining: int
+    retry_after: float  # seconds until the next request would be allowed (0 if allowed)
+
+
+class _Ring:
+    __slots__ = ('counts', 'epochs', 'last_seen')
+
+    def __init__(self, buckets: int):
+        self.counts: List[int] = [0] * buckets
+        self.epochs: List[int] = [-1] * buckets
+        self.last_seen = 0.0
+
+
+class SlidingWindowLimiter:
+    """Allow at most `limit` requests per key in any `window` seconds."""
+
+    def __init__(self, limit: int, window: float = 60.0, redis_client=None, prefix: str = 'rl:',
+                 buckets: int = 12, name: str = 'limiter'):
+        self.limit = int(limit)
+        self.window = float(window)
+        self.redis = redis_client
+        self.prefix = prefix
+        self.name = name
+        self.buckets = max(1, int(buckets))
+        self._width = self.window / self.buckets
+        self._rings: 'OrderedDict[str, _Ring]' = OrderedDict()
+        self._script = None
+        self.allowed = 0
+        self.limited = 0
+        self.redis_errors = 0
+
+    async def hit(self, key: str) -> RateLimitResult:
+        """Record a request for `key` and return whether it is within the limit."""
+        if self.limit <= 0:
+            return RateLimitResult(True, 0, 0.0)
+        result = None
+        if self.redis is not None:
+            try:
+                result = await self._hit_redis(key)
+            except Exception as e:
+                self.redis_errors += 1
+                logger.debug('%s: Redis rate limit failed, using in-memory window: %s', self.name, e)
+        if result is None:
+            result = self._hit_memory(key)
+        if result.allowed:
+            self.allowed += 1
+        else:
+            self.limited += 1
+        return result
+
+    async def _hit_redis(self, key: str) -> RateLimitResult:
+        if self._script is None:
+            self._script = self.redis.register_script(_SLIDING_WINDOW_LUA)
+        allowed, remaining, retry_ms = await self._script(
+            keys=[self.prefix + key],
+            args=[int(self.window * 1000), self.limit, uuid.uuid4().hex],
+        )
+        return RateLimitResult(bool(int(allowed)), int(remaining), max(0.0, int(retry_ms) / 1000.0))
+
+    def _hit_memory(self, key: str) -> RateLimitResult:
+        now = time.time()
+        self._expire(now)
+        ring = self._rings.get(key)
+        if ring is None:
+            ring = self._rings[key] = _Ring(self.buckets)
+        else:
+            self._rings.move_to_end(key)
+        ring.last_seen = now
+
+        epoch = int(now // self._width)
+        pos = epoch % self.buckets
+        if ring.epochs[pos] != epoch:
+            ring.epochs[pos] = epoch
+            ring.counts[pos] = 0
+        oldest_live = epoch - self.buckets + 1
+        total = sum(c for c, e in zip(ring.counts, ring.epochs) if e >= oldest_live)
+        if total < self.limit:
+            ring.counts[pos] += 1
+            return RateLimitResult(True, self.limit - total - 1, 0.0)
+        # the next slot frees up when the oldest live bucket leaves the window
+        live = [e for c, e in zip(ring.counts, ring.epochs) if e >= oldest_live and c]
+        retry = (min(live) + self.buckets) * self._width - now if live else self._width
+        return RateLimitResult(False, 0, max(0.0, retry))
+
+    def _expire(self, now: float):
+        cutoff = now - self.window
+        while self._rings:
+            ring = next(iter(self._rings.values()))
+            if ring.last_seen > cutoff:
+                break
+            self._rings.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'limit': self.limit,
+            'window_s': self.window,
+            'redis': self.redis is not None,
+            'allowed': self.allowed,
+            'limited': self.limited,
+            'redis_errors': self.redis_errors,
+            'memory_keys': len(self._rings),
+        }
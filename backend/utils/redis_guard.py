@@ -0,0 +1,186 @@
+"""Redis client with a bounded connection pool and a circuit breaker.
+
+Every Redis caller in the backend (sessions, rate limits, prediction cache)
+already falls back to in-process state when a call raises. Without a breaker,
+an outage still costs each of those calls a full socket timeout before the
+fallback kicks in. `GuardedRedis` wraps the client so that after
+`failure_threshold` consecutive connection errors or timeouts the breaker
+opens and calls raise `CircuitOpenError` immediately; a background probe pings
+Redis and closes the breaker once it answers again.
+
+`CircuitOpenError` subclasses redis' `ConnectionError`, so existing
+`except` clauses handle it like any other connection failure.
+"""
+import asyncio
+import functools
+import inspect
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from redis.exceptions import ConnectionError as RedisConnectionError
+from redis.exceptions import TimeoutError as RedisTimeoutError
+
+logger = logging.getLogger('fastapi_app.redis')
+
+# errors that mean "Redis is unreachable or too slow", as opposed to command errors
+_OUTAGE_ERRORS = (RedisConnectionError, RedisTimeoutError, asyncio.TimeoutError, OSError)
+
+
+class CircuitOpenError(RedisConnectionError):
+    """Raised instead of calling Redis while the breaker is open."""
+
+
+def create_redis_client(url: str, max_connections: int = 50, socket_timeout: float = 0.25,
+                        connect_timeout: float = 0.25, pool_timeout: float = 0.5, **kwargs):
+    """Return a `redis.asyncio.Redis` on a blocking pool with short socket timeouts."""
+    import redis.asyncio as redis_asyncio
+
+    pool = redis_asyncio.BlockingConnectionPool.from_url(
+        url,
+        max_connections=max_connections,
+        timeout=pool_timeout,
+        socket_timeout=socket_timeout,
+        socket_connect_timeout=connect_timeout,
+        health_check_interval=30,
+        **kwargs,
+    )
+    return redis_asyncio.Redis(connection_pool=pool)
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with latency tracking."""
+
+    def __init__(self, failure_threshold: int = 3, window: int = 1024):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.times_opened = 0
+        self.short_circuited = 0
+        self.calls = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+        self._latencies = deque(maxlen=window)
+
+    def allow(self) -> bool:
+        if self.state == 'open':
+            self.short_circuited += 1
+            return False
+        return True
+
+    def record_success(self, latency: float):
+        self.calls += 1
+        self.failures = 0
+        self._latencies.append(latency)
+
+    def record_failure(self, error: BaseException):
+        self.calls += 1
+        self.errors += 1
+        self.failures += 1
+        self.last_error = f'{type(error).__name__}: {error}'
+        if self.state == 'closed' and self.failures >= self.failure_threshold:
+            self.state = 'open'
+            self.opened_at = time.time()
+            self.times_opened += 1
+            logger.warning('Redis circuit opened after %d failures: %s', self.failures, self.last_error)
+
+    def close(self):
+        if self.state != 'closed':
+            logger.info('Redis circuit closed after %.1fs', time.time() - (self.opened_at or time.time()))
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = None
+
+    async def run_probe(self, ping: Callable[[], Awaitable[Any]], interval: float = 2.0, timeout: float = 1.0):
+        """While open, call `ping()` every `interval` seconds and close the breaker once it succeeds."""
+        while True:
+            await asyncio.sleep(interval)
+            if self.state != 'open':
+                continue
+            try:
+                await asyncio.wait_for(ping(), timeout)
+            except Exception as e:
+                self.last_error = f'{type(e).__name__}: {e}'
+                continue
+            self.close()
+
+    def stats(self) -> Dict[str, Any]:
+        lat = sorted(self._latencies)
+
+        def _pct(q):
+            if not lat:
+                return 0.0
+            return round(lat[min(len(lat) - 1, int(q * len(lat)))] * 1000.0, 3)
+
+        return {
+            'state': self.state,
+            'open_for_s': round(time.time() - self.opened_at, 1) if self.opened_at else 0.0,
+            'consecutive_failures': self.failures,
+            'times_opened': self.times_opened,
+            'short_circuited': self.short_circuited,
+            'calls': self.calls,
+            'errors': self.errors,
+            'last_error': self.last_error,
+            'latency_ms': {'p50': _pct(0.5), 'p95': _pct(0.95), 'max': _pct(1.0)},
+        }
+
+
+async def _guarded(breaker: CircuitBreaker, awaitable: Awaitable):
+    if not breaker.allow():
+        if inspect.iscoroutine(awaitable):
+            awaitable.close()
+        raise CircuitOpenError('Redis circuit is open')
+    started = time.perf_counter()
+    try:
+        result = await awaitable
+    except _OUTAGE_ERRORS as e:
+        breaker.record_failure(e)
+        raise
+    breaker.record_success(time.perf_counter() - started)
+    return result
+
+
+class _GuardedPipeline:
+    def __init__(self, pipeline, breaker: CircuitBreaker):
+        self._pipeline = pipeline
+        self._breaker = breaker
+
+    def __getattr__(self, name):
+        return getattr(self._pipeline, name)
+
+    async def execute(self, *args, **kwargs):
+        return await _guarded(self._breaker, self._pipeline.execute(*args, **kwargs))
+
+
+class GuardedRedis:
+    """Proxy for `redis.asyncio.Redis` that routes every command through a `CircuitBreaker`."""
+
+    def __init__(self, client, breaker: CircuitBreaker):
+        self.client = client
+        self.breaker = breaker
+
+    def pipeline(self, *args, **kwargs):
+        return _GuardedPipeline(self.client.pipeline(*args, **kwargs), self.breaker)
+
+    def register_script(self, script: str):
+        registered = self.client.register_script(script)
+
+        def call(*args, **kwargs):
+            return _guarded(self.breaker, registered(*args, **kwargs))
+        return call
+
+    def __getattr__(self, name):
+        attr = getattr(self.client, name)
+        if not callable(attr):
+            return attr
+
+        # command methods return awaitables; anything else (pubsub(), ...) passes through
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            if inspect.isawaitable(result):
+                return _guarded(self.breaker, result)
+            return result
+        return call
@@ -0,0 +1,370 @@
+"""Retention of per-session artifact directories under outputs/.
+
+Session directories are sharded by the first two characters of the session
+id (`outputs/ab/abcdef.../`), so no directory holds more than a fraction of
+the sessions. Directories from the old flat layout (`outputs/<session_id>/`)
+are still found by `OutputLayout.find` and are moved into their shard once,
+the first time the manifest is built.
+
+`OutputManifest` is the on-disk record of what exists: one row per session
+directory with its size and last write time, plus a running total. It lives
+in SQLite (normally the prediction index database) and is updated as
+artifacts are written, so the retention pass never has to walk the tree.
+
+`RetentionManager` periodically evicts directories, oldest first:
+* anything not written for `max_age` seconds;
+* more of the oldest while the total exceeds `max_bytes`;
+* directories of sessions whose session store entry has expired, when an
+  `is_live(session_id)` check is given (it must return None when unsure;
+  only an explicit False evicts).
+
+`on_evict(session_id)` is called (from a worker thread) for every evicted
+session, so other records of it (the prediction index) go with its files.
+"""
+import asyncio
+import logging
+import os
+import pathlib
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger('fastapi_app.retention')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    session_id TEXT PRIMARY KEY,
+    directory TEXT NOT NULL,
+    bytes INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    last_write_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS artifacts_last_write ON artifacts (last_write_at);
+CREATE TABLE IF NOT EXISTS artifact_meta (
+    key TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+"""
+
+LiveFn = Callable[[str], Awaitable[Optional[bool]]]
+
+# session ids name directories, so only the server-issued form (str(uuid.uuid4())) is accepted: it
+# is one path component and can never be a shard (`ab`) or a reserved directory (`batch`)
+SAFE_SESSION_ID = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$')
+# directories under the output root that hold shared files, not a session's
+RESERVED_DIRS = frozenset({'batch'})
+
+
+class OutputLayout:
+    """Maps session ids to sharded artifact directories under `root`."""
+
+    def __init__(self, root: str = 'outputs', shard_chars: int = 2):
+        self.root = pathlib.Path(root)
+        self.shard_chars = shard_chars
+
+    @staticmethod
+    def _check(session_id: str):
+        if not isinstance(session_id, str) or not SAFE_SESSION_ID.match(session_id):
+            raise ValueError(f'Unsafe session id: {session_id!r}')
+
+    def session_dir(self, session_id: str) -> pathlib.Path:
+        self._check(session_id)
+        return self.root / session_id[:self.shard_chars] / session_id
+
+    def legacy_dir(self, session_id: str) -> pathlib.Path:
+        self._check(session_id)
+        if len(session_id) <= self.shard_chars or session_id in RESERVED_DIRS:
+            raise ValueError(f'Session id names a shared directory: {session_id!r}')
+        return self.root / session_id
+
+    def owns(self, session_id: str, path) -> bool:
+        """True if `path` is the session's own directory (sharded or flat), never a shard or shared one."""
+        try:
+            candidates = (self.session_dir(session_id), self.legacy_dir(session_id))
+            resolved = pathlib.Path(path).resolve()
+            return self.contains(resolved) and any(resolved == c.resolve() for c in candidates)
+        except (ValueError, OSError, RuntimeError):
+            return False
+
+    def contains(self, path) -> bool:
+        """True if `path` resolves to a directory strictly below `root`."""
+        try:
+            resolved = pathlib.Path(path).resolve()
+            root = self.root.resolve()
+        except (OSError, RuntimeError):
+            return False
+        return resolved != root and root in resolved.parents
+
+    def find(self, session_id: str, name: str) -> Optional[pathlib.Path]:
+        """Return the existing file for the session, checking the sharded and then the flat layout."""
+        if not SAFE_SESSION_ID.match(session_id or ''):
+            return None
+        for directory in (self.session_dir(session_id), self.legacy_dir(session_id)):
+            path = directory / name
+            if path.is_file():
+                return path
+        return None
+
+
+def _dir_size(path: pathlib.Path) -> int:
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+
+class OutputManifest:
+    """SQLite record of session artifact directories, their sizes and last write times."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _add_total(self, conn: sqlite3.Connection, delta: int):
+        conn.execute("INSERT INTO artifact_meta (key, value) VALUES ('total_bytes', ?)"
+                     " ON CONFLICT(key) DO UPDATE SET value = value + excluded.value", (delta,))
+
+    def add(self, session_id: str, directory: str, delta_bytes: int, at: Optional[float] = None):
+        """Record a write of `delta_bytes` (may be negative) to the session's directory."""
+        at = time.time() if at is None else at
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(
+                'INSERT INTO artifacts (session_id, directory, bytes, created_at, last_write_at) VALUES (?, ?, ?, ?, ?)'
+                ' ON CONFLICT(session_id) DO UPDATE SET bytes = bytes + excluded.bytes,'
+                ' directory = excluded.directory, last_write_at = MAX(last_write_at, excluded.last_write_at)',
+                (session_id, directory, delta_bytes, at, at),
+            )
+            self._add_total(conn, delta_bytes)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def remove(self, session_id: str) -> Optional[Tuple[str, int]]:
+        """Forget the session; returns its (directory, bytes) if it was recorded."""
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT directory, bytes FROM artifacts WHERE session_id = ?', (session_id,)).fetchone()
+            if row is not None:
+                conn.execute('DELETE FROM artifacts WHERE session_id = ?', (session_id,))
+                self._add_total(conn, -row[1])
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return (row[0], row[1]) if row is not None else None
+
+    def total_bytes(self) -> int:
+        row = self._conn().execute("SELECT value FROM artifact_meta WHERE key = 'total_bytes'").fetchone()
+        return int(row[0]) if row else 0
+
+    def count(self) -> int:
+        return self._conn().execute('SELECT COUNT(*) FROM artifacts').fetchone()[0]
+
+    def oldest(self, limit: int, before: Optional[float] = None,
+               after: Optional[Tuple[float, str]] = None) -> List[Tuple[str, str, int, float]]:
+        """Return up to `limit` (session_id, directory, bytes, last_write_at) rows, least recently written first.
+
+        `before` keeps only rows written before that time; `after` resumes a scan after a
+        (last_write_at, session_id) position.
+        """
+        where, args = [], []
+        if before is not None:
+            where.append('last_write_at < ?')
+            args.append(before)
+        if after is not None:
+            where.append('(last_write_at > ? OR (last_write_at = ? AND session_id > ?))')
+            args.extend([after[0], after[0], after[1]])
+        sql = 'SELECT session_id, directory, bytes, last_write_at FROM artifacts'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY last_write_at, session_id LIMIT ?'
+        args.append(max(1, int(limit)))
+        return [tuple(r) for r in self._conn().execute(sql, args)]
+
+    def is_built(self) -> bool:
+        return self._conn().execute("SELECT 1 FROM artifact_meta WHERE key = 'built_at'").fetchone() is not None
+
+    def build(self, layout: OutputLayout) -> int:
+        """One-time import of existing session directories (flat ones are moved into their shard).
+
+        Only the top two levels of `layout.root` are listed; the manifest is the source of
+        truth afterwards.
+        """
+        imported = 0
+        try:
+            entries = list(os.scandir(layout.root))
+        except OSError:
+            entries = []
+        for entry in entries:
+            if not entry.is_dir() or entry.name in RESERVED_DIRS:
+                continue
+            if len(entry.name) == layout.shard_chars:
+                sessions = [(e.name, pathlib.Path(e.path)) for e in os.scandir(entry.path)
+                            if e.is_dir() and SAFE_SESSION_ID.match(e.name)]
+            elif not SAFE_SESSION_ID.match(entry.name):
+                continue
+            else:
+                target = layout.session_dir(entry.name)
+                try:
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    if not target.exists():
+                        os.rename(entry.path, target)
+                except OSError as e:
+                    logger.warning('Could not move %s into its shard: %s', entry.path, e)
+                    target = pathlib.Path(entry.path)
+                sessions = [(entry.name, target)]
+            for session_id, directory in sessions:
+                try:
+                    mtime = directory.stat().st_mtime
+                except OSError:
+                    continue
+                self.remove(session_id)
+                self.add(session_id, str(directory), _dir_size(directory), at=mtime)
+                imported += 1
+        conn = self._conn()
+        conn.execute("INSERT OR REPLACE INTO artifact_meta (key, value) VALUES ('built_at', ?)", (time.time(),))
+        if imported:
+            logger.info('Output manifest: imported %d existing session directories', imported)
+        return imported
+
+
+class RetentionManager:
+    """Evict session artifact directories by age, total size and session expiry."""
+
+    def __init__(self, manifest: OutputManifest, layout: OutputLayout, max_bytes: int = 0, max_age: float = 0.0,
+                 is_live: Optional[LiveFn] = None, expired_grace: float = 3600.0, batch: int = 100,
+                 on_evict: Optional[Callable[[str], Any]] = None):
+        self.manifest = manifest
+        self.layout = layout
+        self.max_bytes = int(max_bytes)
+        self.max_age = float(max_age)
+        self.is_live = is_live
+        self.expired_grace = float(expired_grace)
+        self.batch = max(1, int(batch))
+        self.on_evict = on_evict
+        self._cursor: Optional[Tuple[float, str]] = None
+        self.evicted = {'age': 0, 'size': 0, 'expired': 0}
+        self.bytes_freed = 0
+        self.runs = 0
+        self.last_run_ms = 0.0
+
+    def _evict_rows(self, rows, reason: str) -> int:
+        freed = 0
+        for session_id, directory, size, _ in rows:
+            # only ever delete the session's own directories, whatever the manifest says
+            if self.layout.owns(session_id, directory):
+                shutil.rmtree(directory, ignore_errors=True)
+            else:
+                logger.warning('Not evicting %s: not a directory of session %r', directory, session_id)
+            if SAFE_SESSION_ID.match(session_id):
+                legacy = self.layout.legacy_dir(session_id)
+                if str(legacy) != directory and self.layout.owns(session_id, legacy):
+                    shutil.rmtree(legacy, ignore_errors=True)
+            if self.on_evict is not None:
+                try:
+                    self.on_evict(session_id)
+                except Exception as e:
+                    logger.warning('Eviction hook failed for %s: %s', session_id, e)
+            if self.manifest.remove(session_id) is not None:
+                freed += max(0, size)
+                self.evicted[reason] += 1
+        self.bytes_freed += freed
+        return freed
+
+    def evict_by_age_and_size(self, now: Optional[float] = None):
+        """Blocking part of a pass: age limit, then size budget."""
+        now = time.time() if now is None else now
+        if self.max_age > 0:
+            while True:
+                rows = self.manifest.oldest(self.batch, before=now - self.max_age)
+                if not rows:
+                    break
+                self._evict_rows(rows, 'age')
+        if self.max_bytes > 0:
+            while self.manifest.total_bytes() > self.max_bytes:
+                rows = self.manifest.oldest(self.batch)
+                if not rows:
+                    break
+                # stop as soon as enough of the oldest directories are gone
+                excess = self.manifest.total_bytes() - self.max_bytes
+                take, acc = [], 0
+                for row in rows:
+                    take.append(row)
+                    acc += max(0, row[2])
+                    if acc >= excess:
+                        break
+                self._evict_rows(take, 'size')
+
+    async def evict_expired(self, now: Optional[float] = None):
+        """Check one batch of directories (resuming where the last pass stopped) for expired sessions."""
+        if self.is_live is None:
+            return
+        now = time.time() if now is None else now
+        rows = await asyncio.to_thread(self.manifest.oldest, self.batch, now - self.expired_grace, self._cursor)
+        if not rows:
+            self._cursor = None
+            return
+        self._cursor = (rows[-1][3], rows[-1][0])
+        expired = []
+        for row in rows:
+            try:
+                live = await self.is_live(row[0])
+            except Exception:
+                live = None
+            if live is False:
+                expired.append(row)
+        if expired:
+            await asyncio.to_thread(self._evict_rows, expired, 'expired')
+
+    async def run_once(self):
+        started = time.perf_counter()
+        await asyncio.to_thread(self.evict_by_age_and_size)
+        await self.evict_expired()
+        self.runs += 1
+        self.last_run_ms = (time.perf_counter() - started) * 1000.0
+
+    async def run(self, interval: float = 300.0):
+        """Build the manifest if needed, then enforce retention every `interval` seconds until cancelled."""
+        if not await asyncio.to_thread(self.manifest.is_built):
+            await asyncio.to_thread(self.manifest.build, self.layout)
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.warning('Retention pass failed: %s', e)
+            await asyncio.sleep(interval)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'max_bytes': self.max_bytes,
+            'max_age_s': self.max_age,
+            'total_bytes': self.manifest.total_bytes(),
+            'evicted': dict(self.evicted),
+            'bytes_freed': self.bytes_freed,
+            'runs': self.runs,
+            'last_run_ms': round(self.last_run_ms, 3),
+        }
@@ -0,0 +1,151 @@
+"""Value codecs for session fields and history entries stored in Redis.
+
+`JsonCodec` writes the compact JSON the session store has always written.
+`MsgpackCodec` writes msgpack and, above `threshold` bytes, compresses the
+payload with zstd or lz4 when the library is installed. Binary values start
+with the byte 0xC1, which is neither valid UTF-8 nor a valid msgpack type, so
+they can never be confused with JSON text. The next byte says how the rest
+was encoded. `decode` reads every format, so JSON values written before a
+codec change stay readable. Switching codecs needs no migration.
+
+Binary values need a Redis client created with `decode_responses=False`.
+"""
+import json
+import logging
+from typing import Any, Dict, Optional, Union
+
+logger = logging.getLogger('fastapi_app.sessions')
+
+MAGIC = b'\xc1'
+_MSGPACK = b'm'
+_ZSTD = b'z'
+_LZ4 = b'l'
+
+try:
+    import msgpack
+except Exception:
+    msgpack = None
+
+try:
+    import zstandard
+except Exception:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except Exception:
+    lz4_frame = None
+
+
+def _unpack(payload: bytes) -> Any:
+    if msgpack is None:
+        raise ValueError('msgpack is not installed; cannot decode a msgpack session value')
+    return msgpack.unpackb(payload, raw=False, strict_map_key=False)
+
+
+def decode(raw: Union[bytes, str, None]) -> Any:
+    """Decode a value written by any codec (or by the older JSON-only code)."""
+    if raw is None:
+        return None
+    if isinstance(raw, str):
+        return json.loads(raw)
+    if not raw.startswith(MAGIC):
+        return json.loads(raw)
+    kind, payload = raw[1:2], raw[2:]
+    if kind == _MSGPACK:
+        return _unpack(payload)
+    if kind == _ZSTD:
+        if zstandard is None:
+            raise ValueError('zstandard is not installed; cannot decode a compressed session value')
+        return _unpack(zstandard.ZstdDecompressor().decompress(payload))
+    if kind == _LZ4:
+        if lz4_frame is None:
+            raise ValueError('lz4 is not installed; cannot decode a compressed session value')
+        return _unpack(lz4_frame.decompress(payload))
+    raise ValueError(f'unknown session value format {kind!r}')
+
+
+class JsonCodec:
+    """Compact JSON text (the original session format)."""
+
+    name = 'json'
+
+    def __init__(self):
+        self.encoded = 0
+        self.bytes_out = 0
+
+    def encode(self, value: Any) -> str:
+        out = json.dumps(value, separators=(',', ':'))
+        self.encoded += 1
+        self.bytes_out += len(out)
+        return out
+
+    def decode(self, raw: Union[bytes, str, None]) -> Any:
+        return decode(raw)
+
+    def stats(self) -> Dict[str, Any]:
+        return {'name': self.name, 'encoded': self.encoded, 'bytes_out': self.bytes_out}
+
+
+class MsgpackCodec(JsonCodec):
+    """msgpack, compressed with zstd or lz4 once the packed value reaches `threshold` bytes."""
+
+    def __init__(self, compression: Optional[str] = None, threshold: int = 1024, level: int = 3):
+        super().__init__()
+        if msgpack is None:
+            raise RuntimeError('msgpack is not installed')
+        if compression in (None, '', 'none'):
+            compression = None
+        elif compression == 'zstd':
+            if zstandard is None:
+                raise RuntimeError('zstandard is not installed')
+            self._zstd = zstandard.ZstdCompressor(level=level)
+        elif compression == 'lz4':
+            if lz4_frame is None:
+                raise RuntimeError('lz4 is not installed')
+        else:
+            raise ValueError(f'unknown compression {compression!r} (expected none, zstd or lz4)')
+        self.compression = compression
+        self.threshold = max(0, int(threshold))
+        self.level = level
+        self.name = 'msgpack' + (f'+{compression}' if compression else '')
+        self.compressed = 0
+        self.bytes_saved = 0
+
+    def encode(self, value: Any) -> bytes:
+        packed = msgpack.packb(value, use_bin_type=True)
+        out = MAGIC + _MSGPACK + packed
+        if self.compression and len(packed) >= self.threshold:
+            if self.compression == 'zstd':
+                candidate = MAGIC + _ZSTD + self._zstd.compress(packed)
+            else:
+                candidate = MAGIC + _LZ4 + lz4_frame.compress(packed, compression_level=self.level)
+            # incompressible payloads are stored as plain msgpack
+            if len(candidate) < len(out):
+                self.compressed += 1
+                self.bytes_saved += len(out) - len(candidate)
+                out = candidate
+        self.encoded += 1
+        self.bytes_out += len(out)
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        out = super().stats()
+        out.update({'threshold': self.threshold, 'compressed': self.compressed, 'bytes_saved': self.bytes_saved})
+        return out
+
+
+def make_codec(name: str = 'json', compression: Optional[str] = None, threshold: int = 1024, level: int = 3):
+    """Build the configured codec, falling back to JSON if its libraries are missing."""
+    if name == 'msgpack':
+        try:
+            return MsgpackCodec(compression, threshold, level)
+        except RuntimeError as e:
+            if msgpack is not None:
+                # only the compressor is missing: keep msgpack, skip compression
+                logger.warning('Session compression %s unavailable (%s); storing uncompressed msgpack', compression, e)
+                return MsgpackCodec(None, threshold, level)
+            logger.warning('Session codec msgpack unavailable (%s); using json', e)
+    elif name != 'json':
+        logger.warning('Unknown session codec %r; using json', name)
+    return JsonCodec()
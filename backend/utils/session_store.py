@@ -0,0 +1,536 @@
+"""Per-session state (last prediction, chat history) for the FastAPI backend.
+
+Sessions used to be one JSON blob per user that every request read, modified
+and rewrote in full. `RedisSessionStore` keeps scalar fields (`last_prediction`,
+`last_confidence`, `top_k`, `probs`, ...) as JSON-encoded fields of a Redis
+hash and the chat history as a Redis list, so a request sends only what it
+changes: all of its field updates and history appends go out in one pipelined
+round trip together with the TTL refresh. Sessions written in the old blob
+format (`session:<id>`) are still readable and are migrated on first access.
+
+History is capped at `history_max` entries: `RPUSH` + `LTRIM` in Redis and a
+`deque(maxlen=...)` in memory, so appends stay O(1) however long a user talks.
+Entries pushed out of the window can be handed to a `spill(session_id, entries)`
+callback (e.g. appended to a JSONL file) instead of being dropped.
+
+Field values and history entries are encoded by a pluggable codec
+(`utils.session_codec`): JSON by default, or msgpack with optional zstd/lz4
+compression. Values written in any format, including older JSON, are readable.
+
+`CachedSessionStore` adds a per-process read-through cache of the scalar
+fields in front of `RedisSessionStore`. Writers publish the session id on a
+Redis pub/sub channel and every other worker drops its copy, so cached reads
+stay correct across workers and nodes.
+
+`MemorySessionStore` is the in-process fallback with the same interface; it is
+bounded by entry count, estimated bytes and an idle TTL so it cannot grow with
+traffic for the life of the process.
+"""
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import OrderedDict, deque
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from utils.session_codec import JsonCodec
+
+logger = logging.getLogger('fastapi_app.sessions')
+
+SESSION_TTL = 60 * 60 * 24
+HISTORY_MAX = 200
+
+SpillFn = Callable[[str, List[Dict[str, Any]]], None]
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, separators=(',', ':'))
+
+
+async def _spill(spill: Optional[SpillFn], session_id: str, entries: List[Dict[str, Any]]):
+    """Hand trimmed history entries to the spill callback off the event loop."""
+    if spill is None or not entries:
+        return
+    try:
+        await asyncio.to_thread(spill, session_id, entries)
+    except Exception as e:
+        logger.warning('History spill failed for %s: %s', session_id, e)
+
+
+class _MemorySession:
+    __slots__ = ('fields', 'field_sizes', 'history', 'history_sizes', 'size', 'expires')
+
+    def __init__(self, history_max: int):
+        self.fields: Dict[str, Any] = {}
+        self.field_sizes: Dict[str, int] = {}
+        self.history: deque = deque(maxlen=history_max)
+        self.history_sizes: deque = deque(maxlen=history_max)
+        self.size = 0
+        self.expires = 0.0
+
+
+class MemorySessionStore:
+    """Session store backed by a dict in this process, bounded like the Redis backend.
+
+    Sessions expire after `ttl` seconds without access (matching the Redis TTL) and
+    the least recently used are evicted once there are more than `max_sessions` or
+    their estimated JSON size exceeds `max_bytes`. Sizes are tracked incrementally
+    per field and history entry. Because every access refreshes the TTL, the LRU
+    order is also expiry order, so `sweep()` only touches expired sessions;
+    `run_sweeper()` calls it periodically.
+    """
+
+    def __init__(self, ttl: int = SESSION_TTL, history_max: int = HISTORY_MAX, spill: Optional[SpillFn] = None,
+                 max_sessions: int = 10000, max_bytes: int = 64 * 1024 * 1024):
+        self.ttl = ttl
+        self.history_max = max(1, int(history_max))
+        self.spill = spill
+        self.max_sessions = max(1, int(max_sessions))
+        self.max_bytes = max(1, int(max_bytes))
+        self._sessions: 'OrderedDict[str, _MemorySession]' = OrderedDict()
+        self._bytes = 0
+        self.evicted_lru = 0
+        self.expired = 0
+
+    def _touch(self, session_id: str, create: bool = False) -> Optional[_MemorySession]:
+        s = self._sessions.get(session_id)
+        now = time.time()
+        if s is not None and s.expires <= now:
+            self._drop(session_id)
+            self.expired += 1
+            s = None
+        if s is None:
+            if not create:
+                return None
+            s = self._sessions[session_id] = _MemorySession(self.history_max)
+        else:
+            self._sessions.move_to_end(session_id)
+        s.expires = now + self.ttl
+        return s
+
+    def _drop(self, session_id: str):
+        s = self._sessions.pop(session_id, None)
+        if s is not None:
+            self._bytes -= s.size
+
+    def _resize(self, s: _MemorySession, delta: int):
+        s.size += delta
+        self._bytes += delta
+
+    def _enforce_budget(self, keep: str):
+        while len(self._sessions) > self.max_sessions or (self._bytes > self.max_bytes and len(self._sessions) > 1):
+            oldest = next(iter(self._sessions))
+            if oldest == keep:
+                break
+            self._drop(oldest)
+            self.evicted_lru += 1
+
+    async def create(self, session_id: str):
+        self._touch(session_id, create=True)
+        self._enforce_budget(session_id)
+
+    async def get(self, session_id: str, limit: Optional[int] = None) -> Dict[str, Any]:
+        """Return a copy of the session with at most the `limit` newest history entries, or {} if unknown."""
+        s = self._touch(session_id)
+        if s is None:
+            return {}
+        out = dict(s.fields)
+        start = max(0, len(s.history) - limit) if limit is not None else 0
+        out['history'] = list(islice(s.history, start, None))
+        return out
+
+    async def get_fields(self, session_id: str, *names: str) -> Dict[str, Any]:
+        s = self._touch(session_id)
+        fields = s.fields if s is not None else {}
+        return {name: fields.get(name) for name in names}
+
+    async def update(self, session_id: str, fields: Optional[Dict[str, Any]] = None,
+                     history: Iterable[Dict[str, Any]] = ()):
+        """Set `fields` and append `history` entries in one call."""
+        s = self._touch(session_id, create=True)
+        for name, value in (fields or {}).items():
+            size = len(name) + len(_dumps(value))
+            self._resize(s, size - s.field_sizes.get(name, 0))
+            s.fields[name] = value
+            s.field_sizes[name] = size
+        dropped = []
+        for entry in history:
+            size = len(_dumps(entry))
+            if len(s.history) == s.history.maxlen:
+                dropped.append(s.history[0])
+                self._resize(s, -s.history_sizes[0])
+            s.history.append(entry)
+            s.history_sizes.append(size)
+            self._resize(s, size)
+        self._enforce_budget(session_id)
+        await _spill(self.spill, session_id, dropped)
+
+    def sweep(self) -> int:
+        """Drop expired sessions and return how many were removed."""
+        now = time.time()
+        removed = 0
+        while self._sessions:
+            session_id, s = next(iter(self._sessions.items()))
+            if s.expires > now:
+                break
+            self._drop(session_id)
+            removed += 1
+        self.expired += removed
+        return removed
+
+    async def run_sweeper(self, interval: float = 60.0):
+        """Call `sweep()` every `interval` seconds until cancelled."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                removed = self.sweep()
+                if removed:
+                    logger.debug('Session sweeper removed %d expired sessions', removed)
+            except Exception as e:
+                logger.warning('Session sweep failed: %s', e)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'backend': 'memory',
+            'sessions': len(self._sessions),
+            'bytes': self._bytes,
+            'max_sessions': self.max_sessions,
+            'max_bytes': self.max_bytes,
+            'history_max': self.history_max,
+            'evicted_lru': self.evicted_lru,
+            'expired': self.expired,
+        }
+
+
+class RedisSessionStore:
+    """Session store using a Redis hash per session plus a list for its history."""
+
+    def __init__(self, client, ttl: int = SESSION_TTL, prefix: str = 'sess:', legacy_prefix: str = 'session:',
+                 history_max: int = HISTORY_MAX, spill: Optional[SpillFn] = None,
+                 fallback: Optional[MemorySessionStore] = None, codec=None):
+        self.client = client
+        self.codec = codec or JsonCodec()
+        self.decode_errors = 0
+        # used for reads and writes while Redis is unreachable (e.g. its circuit breaker is open)
+        self.fallback = fallback
+        self.fallback_calls = 0
+        self.ttl = ttl
+        self.history_max = max(1, int(history_max))
+        self.spill = spill
+        self.prefix = prefix
+        self.legacy_prefix = legacy_prefix
+        self.migrated = 0
+
+    def _keys(self, session_id: str):
+        key = self.prefix + session_id
+        return key, key + ':history'
+
+    def _decode(self, raw: Any) -> Any:
+        try:
+            return self.codec.decode(raw)
+        except Exception:
+            self.decode_errors += 1
+            return raw
+
+    def _decode_fields(self, raw: Dict[Any, Any]) -> Dict[str, Any]:
+        # a binary client (decode_responses=False) returns field names as bytes
+        return {(name.decode() if isinstance(name, bytes) else name): self._decode(value)
+                for name, value in raw.items()}
+
+    async def create(self, session_id: str):
+        await self.update(session_id, {'created_at': time.time()})
+
+    async def get(self, session_id: str, limit: Optional[int] = None) -> Dict[str, Any]:
+        """Return the session with at most the `limit` newest history entries, or {} if unknown."""
+        key, hist_key = self._keys(session_id)
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            pipe.hgetall(key)
+            pipe.lrange(hist_key, -limit if limit else 0, -1)
+            fields, history = await pipe.execute()
+        except Exception as e:
+            logger.debug('Session read failed for %s: %s', session_id, e)
+            if self.fallback is not None:
+                self.fallback_calls += 1
+                return await self.fallback.get(session_id, limit=limit)
+            return {}
+        if not fields and not history:
+            s = await self._migrate_legacy(session_id)
+            if limit and s.get('history'):
+                s['history'] = s['history'][-limit:]
+            return s
+        s = self._decode_fields(fields)
+        s['history'] = [self._decode(entry) for entry in history]
+        return s
+
+    async def get_fields(self, session_id: str, *names: str) -> Dict[str, Any]:
+        """Return only the named scalar fields (missing ones are None)."""
+        key, _ = self._keys(session_id)
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            pipe.exists(key)
+            pipe.hmget(key, *names)
+            exists, values = await pipe.execute()
+        except Exception as e:
+            logger.debug('Session read failed for %s: %s', session_id, e)
+            if self.fallback is not None:
+                self.fallback_calls += 1
+                return await self.fallback.get_fields(session_id, *names)
+            return {name: None for name in names}
+        if not exists:
+            s = await self._migrate_legacy(session_id)
+            return {name: s.get(name) for name in names}
+        return {name: self._decode(raw) for name, raw in zip(names, values)}
+
+    async def exists(self, session_id: str) -> Optional[bool]:
+        """Whether the session (new or legacy layout) is still in Redis; None if Redis can't be asked."""
+        key, hist_key = self._keys(session_id)
+        try:
+            return bool(await self.client.exists(key, hist_key, self.legacy_prefix + session_id))
+        except Exception:
+            return None
+
+    async def fetch_fields(self, session_id: str) -> Dict[str, Any]:
+        """Return every scalar field of the session; unlike the other reads, Redis errors propagate."""
+        key, _ = self._keys(session_id)
+        raw = await self.client.hgetall(key)
+        if not raw:
+            s = await self._migrate_legacy(session_id)
+            s.pop('history', None)
+            return s
+        return self._decode_fields(raw)
+
+    async def update(self, session_id: str, fields: Optional[Dict[str, Any]] = None,
+                     history: Iterable[Dict[str, Any]] = ()):
+        """Set `fields`, append `history` entries and refresh the TTL in one round trip.
+
+        With a spill callback, a second round trip moves overflowing entries out of the
+        list (atomically, so concurrent writers never spill the same entry twice).
+        """
+        key, hist_key = self._keys(session_id)
+        entries = list(history)
+        history = [self.codec.encode(entry) for entry in entries]
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            if fields:
+                pipe.hset(key, mapping={name: self.codec.encode(value) for name, value in fields.items()})
+            if history:
+                pipe.rpush(hist_key, *history)
+                if self.spill is None:
+                    pipe.ltrim(hist_key, -self.history_max, -1)
+            pipe.expire(key, self.ttl)
+            pipe.expire(hist_key, self.ttl)
+            results = await pipe.execute()
+        except Exception as e:
+            logger.debug('Session write failed for %s: %s', session_id, e)
+            if self.fallback is not None:
+                self.fallback_calls += 1
+                await self.fallback.update(session_id, fields, entries)
+            return
+        if history and self.spill is not None:
+            length = results[1 if fields else 0]
+            if length > self.history_max:
+                await self._spill_overflow(session_id, hist_key)
+
+    async def _spill_overflow(self, session_id: str, hist_key: str):
+        try:
+            pipe = self.client.pipeline(transaction=True)
+            pipe.lrange(hist_key, 0, -self.history_max - 1)
+            pipe.ltrim(hist_key, -self.history_max, -1)
+            overflow, _ = await pipe.execute()
+        except Exception as e:
+            logger.debug('History trim failed for %s: %s', session_id, e)
+            return
+        await _spill(self.spill, session_id, [self._decode(entry) for entry in overflow])
+
+    async def _migrate_legacy(self, session_id: str) -> Dict[str, Any]:
+        """Read an old-style JSON blob session and rewrite it as hash + list."""
+        legacy_key = self.legacy_prefix + session_id
+        try:
+            raw = await self.client.get(legacy_key)
+        except Exception:
+            return {}
+        if not raw:
+            return {}
+        try:
+            s = json.loads(raw)
+        except ValueError:
+            return {}
+        history = s.pop('history', None) or []
+        await self.update(session_id, s or {'created_at': time.time()}, history)
+        try:
+            await self.client.delete(legacy_key)
+        except Exception:
+            pass
+        self.migrated += 1
+        s['history'] = history
+        return s
+
+    def stats(self) -> Dict[str, Any]:
+        out = {'backend': 'redis', 'migrated_legacy': self.migrated, 'history_max': self.history_max,
+               'fallback_calls': self.fallback_calls, 'codec': self.codec.stats(),
+               'decode_errors': self.decode_errors}
+        if self.fallback is not None:
+            out['fallback'] = self.fallback.stats()
+        return out
+
+
+class CachedSessionStore:
+    """Read-through cache of session fields in front of a `RedisSessionStore`.
+
+    `get_fields` is served from this process while the invalidation subscriber
+    is connected (entries also expire after `ttl` seconds as a backstop). Every
+    field write publishes `{"sid", "origin", "ts"}` on `channel`; other processes
+    drop that session's entry and record the publish-to-receive lag. While the
+    subscriber is down, reads bypass the cache.
+    """
+
+    def __init__(self, store: RedisSessionStore, pubsub_client, channel: str = 'session-invalidate',
+                 ttl: float = 30.0, max_entries: int = 10000, window: int = 1024):
+        self.store = store
+        self.pubsub_client = pubsub_client
+        self.channel = channel
+        self.ttl = ttl
+        self.max_entries = max(1, int(max_entries))
+        self.origin = uuid.uuid4().hex
+        self.subscribed = False
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()  # sid -> (expires_at, fields)
+        self._invalidated: 'OrderedDict[str, float]' = OrderedDict()  # sid -> monotonic time of last invalidation
+        self._lags = deque(maxlen=window)
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.published = 0
+        self.received = 0
+
+    def _put(self, session_id: str, fields: Dict[str, Any]):
+        self._entries[session_id] = (time.time() + self.ttl, fields)
+        self._entries.move_to_end(session_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _invalidate(self, session_id: str):
+        self._entries.pop(session_id, None)
+        self._mark_changed(session_id)
+
+    def _mark_changed(self, session_id: str):
+        """Record that the session changed now, so reads that started earlier are not cached."""
+        self._invalidated[session_id] = time.monotonic()
+        self._invalidated.move_to_end(session_id)
+        while len(self._invalidated) > self.max_entries:
+            self._invalidated.popitem(last=False)
+
+    async def create(self, session_id: str):
+        await self.store.create(session_id)
+
+    async def get(self, session_id: str, limit: Optional[int] = None) -> Dict[str, Any]:
+        return await self.store.get(session_id, limit=limit)
+
+    async def exists(self, session_id: str) -> Optional[bool]:
+        return await self.store.exists(session_id)
+
+    async def get_fields(self, session_id: str, *names: str) -> Dict[str, Any]:
+        if not self.subscribed:
+            self.bypassed += 1
+            return await self.store.get_fields(session_id, *names)
+        entry = self._entries.get(session_id)
+        if entry is not None and entry[0] > time.time():
+            self.hits += 1
+            self._entries.move_to_end(session_id)
+            return {name: entry[1].get(name) for name in names}
+        self.misses += 1
+        started = time.monotonic()
+        try:
+            fields = await self.store.fetch_fields(session_id)
+        except Exception:
+            return await self.store.get_fields(session_id, *names)
+        # don't cache a read that raced with an invalidation
+        if self._invalidated.get(session_id, 0.0) < started:
+            self._put(session_id, fields)
+        return {name: fields.get(name) for name in names}
+
+    async def update(self, session_id: str, fields: Optional[Dict[str, Any]] = None,
+                     history: Iterable[Dict[str, Any]] = ()):
+        if fields:
+            # a local miss overlapping this write may have read the old fields
+            self._mark_changed(session_id)
+        await self.store.update(session_id, fields, history)
+        if not fields:
+            return
+        self._mark_changed(session_id)
+        entry = self._entries.get(session_id)
+        if entry is not None:
+            self._put(session_id, {**entry[1], **fields})
+        try:
+            msg = _dumps({'sid': session_id, 'origin': self.origin, 'ts': time.time()})
+            await self.store.client.publish(self.channel, msg)
+            self.published += 1
+        except Exception as e:
+            # other workers can't be told; stop trusting our own copy too
+            self._invalidate(session_id)
+            logger.debug('Session invalidation publish failed for %s: %s', session_id, e)
+
+    async def run_subscriber(self, reconnect_delay: float = 2.0):
+        """Listen for invalidations from other processes until cancelled, reconnecting on errors."""
+        while True:
+            pubsub = None
+            try:
+                pubsub = self.pubsub_client.pubsub()
+                await pubsub.subscribe(self.channel)
+                # anything cached before (re)subscribing may have missed invalidations
+                self._entries.clear()
+                self.subscribed = True
+                while True:
+                    msg = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if msg is not None:
+                        self._on_message(msg.get('data'))
+            except asyncio.CancelledError:
+                self.subscribed = False
+                raise
+            except Exception as e:
+                logger.debug('Session invalidation subscriber error: %s', e)
+            finally:
+                self.subscribed = False
+                if pubsub is not None:
+                    try:
+                        await pubsub.aclose()
+                    except Exception:
+                        pass
+            await asyncio.sleep(reconnect_delay)
+
+    def _on_message(self, data):
+        try:
+            msg = json.loads(data)
+        except (TypeError, ValueError):
+            return
+        if msg.get('origin') == self.origin:
+            return
+        self.received += 1
+        self._invalidate(msg.get('sid', ''))
+        if msg.get('ts'):
+            self._lags.append(max(0.0, time.time() - float(msg['ts'])))
+
+    def stats(self) -> Dict[str, Any]:
+        lags = sorted(self._lags)
+
+        def _pct(q):
+            if not lags:
+                return 0.0
+            return round(lags[min(len(lags) - 1, int(q * len(lags)))] * 1000.0, 3)
+
+        lookups = self.hits + self.misses
+        out = self.store.stats()
+        out['cache'] = {
+            'subscribed': self.subscribed,
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'bypassed': self.bypassed,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'invalidations_published': self.published,
+            'invalidations_received': self.received,
+            'invalidation_lag_ms': {'p50': _pct(0.5), 'p95': _pct(0.95), 'max': _pct(1.0)},
+        }
+        return out
@@ -0,0 +1,82 @@
+"""TFLite serving backend for quantized exports of the Keras classifier.
+
+`backend/export_tflite.py` writes the artifact; `TFLiteModel` loads it and
+exposes a `predict(batch)` that behaves like `model.predict` so it can be used
+as the micro-batcher's `batch_fn`. A TFLite interpreter is not thread-safe, so
+each inference worker thread gets its own interpreter over the same model bytes.
+"""
+import logging
+import threading
+from typing import Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger('fastapi_app.tflite')
+
+
+def _interpreter_class():
+    """Return the first available TFLite interpreter implementation."""
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+        return Interpreter
+    except Exception:
+        pass
+    try:
+        from tflite_runtime.interpreter import Interpreter
+        return Interpreter
+    except Exception:
+        pass
+    import tensorflow as tf
+    return tf.lite.Interpreter
+
+
+class TFLiteModel:
+    """Thread-safe `predict` over a .tflite model (one interpreter per calling thread)."""
+
+    def __init__(self, path: str, num_threads: Optional[int] = None):
+        self.path = path
+        self.num_threads = num_threads
+        with open(path, 'rb') as f:
+            self._content = f.read()
+        self._interpreter_cls = _interpreter_class()
+        self._local = threading.local()
+        interp = self._interpreter()
+        inp = interp.get_input_details()[0]
+        out = interp.get_output_details()[0]
+        self.input_shape: Tuple[int, ...] = tuple(int(d) for d in inp['shape'][1:])
+        self.input_dtype = inp['dtype']
+        self.output_dtype = out['dtype']
+
+    def _interpreter(self):
+        interp = getattr(self._local, 'interpreter', None)
+        if interp is None:
+            interp = self._interpreter_cls(model_content=self._content, num_threads=self.num_threads)
+            interp.allocate_tensors()
+            self._local.interpreter = interp
+            self._local.batch = int(interp.get_input_details()[0]['shape'][0])
+        return interp
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        """Return the model output for a float32 batch of shape (N,) + input_shape."""
+        interp = self._interpreter()
+        inp = interp.get_input_details()[0]
+        out = interp.get_output_details()[0]
+        batch = np.asarray(batch, dtype='float32')
+        if batch.shape[0] != self._local.batch:
+            interp.resize_tensor_input(inp['index'], (batch.shape[0],) + self.input_shape)
+            interp.allocate_tensors()
+            self._local.batch = batch.shape[0]
+            inp = interp.get_input_details()[0]
+            out = interp.get_output_details()[0]
+        if inp['dtype'] != np.float32:
+            # fully-integer model: quantize the input with the tensor's own scale/zero point
+            scale, zero = inp['quantization']
+            info = np.iinfo(inp['dtype'])
+            batch = np.clip(np.round(batch / scale + zero), info.min, info.max).astype(inp['dtype'])
+        interp.set_tensor(inp['index'], batch)
+        interp.invoke()
+        result = interp.get_tensor(out['index'])
+        if out['dtype'] != np.float32:
+            scale, zero = out['quantization']
+            result = (result.astype('float32') - zero) * scale
+        return result